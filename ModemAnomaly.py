@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+#
+# ModemAnomaly.py - Spot channels straying from their own normal and
+#                   group it into incidents for ModemCheck.py.
+#
+# Copyright (c) 2020 Howard Holm
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+""" ModemAnomaly - online anomaly detection on the downstream channels.
+
+    For each frequency we keep an exponentially weighted moving mean and
+    variance (the channel's normal) of its SNR, its Power and its rate of
+    correctable and uncorrectable errors.  Each poll updates them in
+    constant time, so nothing ever has to look back through the history.
+
+    Single readings are noisy, errors especially so since they come in
+    bursts, so what's judged is a faster moving average of the readings
+    (an EWMA control chart.)  It's anomalous once it strays more than
+    threshold of its own standard deviations from normal the bad way
+    (lower SNR, Power either way, more errors.)  Error rates are per minute
+    and taken as log(1 + rate), so a line that always has some errors has
+    to get a lot worse, while one that never has them only needs a burst.
+    A reading outside the fixed SNR and Power limits is always anomalous.
+
+    Rather than warn on every anomalous poll, a run of them on one channel
+    and metric is an incident.  It's logged once when it opens, and once
+    when it closes after clear_after normal polls, with how long it lasted
+    and the worst reading.  Closed incidents are appended as json lines
+    [start, end, freq, metric, worst, polls] to <datafile>.incidents.
+
+    The baselines and open incidents are kept in <datafile>.anomaly, a
+    small json file rewritten atomically after each poll.
+"""
+import json
+import logging
+import math
+from datetime import timedelta
+from time import gmtime, strftime
+import ModemStore
+
+ANOMALY_SUFFIX = '.anomaly'
+INCIDENTS_SUFFIX = '.incidents'
+
+# (metric, key in the freqs channel dict or None for an error rate, name,
+#  unit, least standard deviation assumed.)  The floor keeps a channel
+#  that has been dead steady from alarming over the smallest change.
+METRICS = (
+    ('snr', 'SNR', 'SNR', 'dB', 0.5),
+    ('power', 'Power', 'Power', 'dBmV', 0.5),
+    ('correctable', None, 'Correctable Err', '/min', 0.5),
+    ('uncorrectable', None, 'Uncorrectable Err', '/min', 0.5),
+)
+NAMES = {metric: name for metric, _, name, _, _ in METRICS}
+UNITS = {metric: unit for metric, _, _, unit, _ in METRICS}
+FLOORS = {metric: floor for metric, _, _, _, floor in METRICS}
+COUNT, MEAN, VAR, LEVEL = range(4)
+
+logger = logging.getLogger(__name__)
+
+
+def anomaly_name(datafile_name):
+    return datafile_name + ANOMALY_SUFFIX
+
+
+def incidents_name(datafile_name):
+    return datafile_name + INCIDENTS_SUFFIX
+
+
+def ISO_time(epochtime):
+    """  Essentially shorthand for datetime.isoformat() without having to
+         import datetime or deal with the vagaries of datetime objects
+         when they're otherwise unneeded.
+    """
+    return strftime('%Y-%m-%dT%H:%M:%SZ', gmtime(epochtime))
+
+
+def badness(metric, value):
+    """ value turned so that bigger is worse """
+    if metric == 'snr':
+        return -value
+    if metric == 'power':
+        return abs(value)
+    return value
+
+
+class AnomalyDetector:
+    """ The baselines and open incidents of one data store.
+
+        alpha is the weight of each new poll in the baselines (0.02 is a
+        memory of roughly the last 50 polls, about four hours at the
+        default interval) and smoothing that of the average being judged.
+        No channel is judged against its own normal until it has warmup
+        polls behind it, though the fixed limits apply from the start.
+    """
+
+    def __init__(self, datafile_name, name='modem', threshold=4.0,
+                 alpha=0.02, smoothing=0.25, warmup=12, clear_after=3,
+                 min_snr=None, max_power=None):
+        self.datafile_name = datafile_name
+        self.name = name
+        self.threshold = threshold
+        self.alpha = alpha
+        self.smoothing = smoothing
+        # the standard deviation of the smoothed readings relative to that
+        # of the readings themselves
+        self.spread = math.sqrt(smoothing / (2 - smoothing))
+        self.warmup = warmup
+        self.clear_after = clear_after
+        self.min_snr = min_snr
+        self.max_power = max_power
+        try:
+            with open(anomaly_name(datafile_name)) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            state = {}
+        self.last_poll = state.get('last_poll')
+        # {freq: {metric: [count, mean, variance, smoothed level]}}
+        self.baselines = state.get('baselines', {})
+        # {"freq metric": {'start':, 'last':, 'worst':, 'polls':, 'calm':}}
+        self.incidents = state.get('incidents', {})
+
+    def out_of_limits(self, metric, value):
+        if metric == 'snr':
+            return self.min_snr is not None and value < self.min_snr
+        if metric == 'power':
+            return self.max_power is not None and abs(value) > self.max_power
+        return False
+
+    def strayed(self, metric, stats):
+        """ True if the smoothed level is threshold standard deviations
+            from the channel's normal the bad way
+        """
+        if stats[COUNT] < self.warmup:
+            return False
+        deviation = (stats[LEVEL] - stats[MEAN]) / (self.spread * math.sqrt(
+            stats[VAR] + FLOORS[metric] ** 2))
+        if metric == 'snr':
+            deviation = -deviation
+        elif metric == 'power':
+            deviation = abs(deviation)
+        return deviation > self.threshold
+
+    def learn(self, stats, value, damped):
+        """ Fold value into the moving mean and variance.  Until there are
+            enough polls for alpha it's just the mean and variance so far.
+        """
+        stats[COUNT] += 1
+        weight = max(self.alpha, 1 / stats[COUNT])
+        if damped:
+            weight /= 10
+        diff = value - stats[MEAN]
+        increment = weight * diff
+        stats[MEAN] += increment
+        stats[VAR] = (1 - weight) * (stats[VAR] + diff * increment)
+
+    def normal(self, metric, stats):
+        """ The channel's normal for the log """
+        if stats[COUNT] < self.warmup:
+            return ''
+        if UNITS[metric] == '/min':
+            return f' (normally {math.expm1(stats[MEAN]):.1f}/min)'
+        return (f' (normally {stats[MEAN]:.1f} +/- '
+                f'{math.sqrt(stats[VAR]):.1f}{UNITS[metric]})')
+
+    def open_incident(self, poll_time, freq, metric, value, stats):
+        self.incidents[f'{freq} {metric}'] = {
+            'start': poll_time, 'last': poll_time, 'worst': value,
+            'polls': 1, 'calm': 0}
+        logger.warning(f'{ISO_time(poll_time)}: {self.name}: Channel {freq}'
+                       f' {NAMES[metric]} anomaly: {value:g}{UNITS[metric]}'
+                       f'{self.normal(metric, stats)}')
+
+    def close_incident(self, key, poll_time, reason='back to normal'):
+        """ Log the end of an incident, returning its incidents line """
+        incident = self.incidents.pop(key)
+        freq, metric = key.rsplit(' ', 1)
+        duration = incident['last'] - incident['start']
+        logger.warning(f'{ISO_time(poll_time)}: {self.name}: Channel {freq}'
+                       f' {NAMES[metric]} {reason} after '
+                       f'{timedelta(seconds=duration)} ({incident["polls"]}'
+                       f' polls), worst {incident["worst"]:g}'
+                       f'{UNITS[metric]}')
+        return json.dumps((incident['start'], incident['last'], freq, metric,
+                           incident['worst'], incident['polls']),
+                          separators=(',', ':')) + '\n'
+
+    def readings(self, poll_time, freqs, new_data):
+        """ Generator yielding (freq, metric, value) of the poll """
+        minutes = None
+        if self.last_poll is not None and poll_time > self.last_poll:
+            minutes = (poll_time - self.last_poll) / 60
+        for freq, chan in freqs.items():
+            for metric, key, _, _, _ in METRICS:
+                if key is not None:
+                    yield (freq, metric, chan[key])
+                elif minutes is not None:
+                    correctable, uncorrectable = new_data.get(freq, (0, 0))
+                    count = (correctable if metric == 'correctable'
+                             else uncorrectable)
+                    yield (freq, metric, round(count / minutes, 2))
+
+    def add_poll(self, poll_time, freqs, new_data):
+        """ Add one poll: freqs is the fetch_stats freqs dict (for SNR and
+            Power) and new_data its new errors by frequency.  Returns the
+            number of bytes written.
+        """
+        closed = []
+        for freq, metric, value in self.readings(poll_time, freqs,
+                                                 new_data):
+            # judge error rates on a log scale
+            reading = math.log1p(value) if UNITS[metric] == '/min' else value
+            stats = self.baselines.setdefault(freq, {}).setdefault(
+                metric, [0, reading, 0.0, reading])
+            stats[LEVEL] += self.smoothing * (reading - stats[LEVEL])
+            strayed = self.strayed(metric, stats)
+            key = f'{freq} {metric}'
+            incident = self.incidents.get(key)
+            if strayed or self.out_of_limits(metric, value):
+                if incident is None:
+                    self.open_incident(poll_time, freq, metric, value, stats)
+                else:
+                    incident['last'] = poll_time
+                    incident['polls'] += 1
+                    incident['calm'] = 0
+                    if badness(metric, value) > badness(metric,
+                                                        incident['worst']):
+                        incident['worst'] = value
+            elif incident is not None:
+                incident['calm'] += 1
+                if incident['calm'] >= self.clear_after:
+                    closed.append(self.close_incident(key, poll_time))
+            # Strays only nudge the normal so it doesn't just follow a
+            # problem, but a lasting change is learned eventually.
+            self.learn(stats, reading, strayed)
+
+        # Channels the modem has dropped start afresh if they come back
+        for freq in [freq for freq in self.baselines if freq not in freqs]:
+            del self.baselines[freq]
+            for metric in NAMES:
+                if f'{freq} {metric}' in self.incidents:
+                    closed.append(self.close_incident(
+                        f'{freq} {metric}', poll_time, 'channel dropped'))
+        self.last_poll = poll_time
+
+        size = 0
+        if closed:
+            with open(incidents_name(self.datafile_name), 'a') as f:
+                size += f.write(''.join(closed))
+        size += ModemStore.atomic_write_json(
+            anomaly_name(self.datafile_name),
+            {'last_poll': self.last_poll, 'baselines': self.baselines,
+             'incidents': self.incidents})
+        return size
+
+    def in_trouble(self):
+        """ True while any incident is open """
+        return bool(self.incidents)
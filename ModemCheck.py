@@ -24,26 +24,56 @@
 # SOFTWARE.
 #
 import argparse
+import asyncio
 import getpass
 import json
 import logging
-import re
-import requests
+import ModemAnomaly
+import ModemMetrics
+import ModemParse
+import ModemRollup
+import ModemSchedule
+import ModemSession
+import ModemStore
+import ModemTelemetry
+import ModemTimings
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
-from pytimeparse.timeparse import timeparse
-from requests.auth import HTTPBasicAuth
-from time import gmtime, mktime, sleep, strftime, strptime
+from functools import partial
+from time import gmtime, sleep, strftime
 
 version = '1.0'
 
-prev_run = 0       # Global - retain data between runs to avoid disk read
-prev_boot = 0      # Global - retain data between runs to avoid disk read
-prev_uptime = 0    # Global - retain data between runs to avoid disk read
-running_data = {}  # Global - retain data between runs to avoid disk read
+MIN_SNR = 36.0      # dB, warn below this
+MAX_POWER = 7.0     # dBmV (either way), warn beyond this
+POLL_GRACE = 30.0   # seconds a fleet poll gets past its fetch budget
+
 logger = logging.getLogger(__name__)
 
 
+class ModemState:
+    """ Everything retained between runs for one modem (to avoid disk reads)
+    """
+
+    def __init__(self, name='modem'):
+        self.name = name        # how the modem is labelled in metrics
+        self.prev_run = 0       # holds the previous run version of freqs
+        self.prev_boot = 0
+        self.prev_uptime = 0
+        self.running_data = {}
+        self.journal_records = 0  # records in the journal since compaction
+        self.next_rollover = 0  # when to next roll running_data to archive
+        self.session = None     # reuse the modem connection between runs
+        self.telemetry = None   # ModemTelemetry.TelemetryWriter if in use
+        self.rollups = None     # ModemRollup.RollupWriter if in use
+        self.anomaly = None     # ModemAnomaly.AnomalyDetector if in use
+        self.trouble = False    # new uncorrectables or bad SNR/Power seen
+
+
+modem_state = ModemState()  # Global - state of the (single) modem
+
+
 def ISO_time(epochtime):
     """  Essentially shorthand for datetime.isoformat() without having to
          import datetime or deal with the vagaries of datetime objects
@@ -52,156 +82,162 @@ def ISO_time(epochtime):
     return strftime('%Y-%m-%dT%H:%M:%SZ', gmtime(epochtime))
 
 
-def fetch_stats(password, user='admin', datafile_name='modem_stats.json'):
+def fetch_stats(password, user='admin', datafile_name='modem_stats.json',
+                storage='json', compact_every=2016, retention_days=None,
+                timeout=30.0, url='http://192.168.100.1/', state=None,
+                telemetry=False, rollups=False, metrics=None, timings=None,
+                anomalies=False, threshold=4.0, budget=None):
     """ Function to call the modem and compare statistics to its current set.
         We can't just parse the HTML because for some unfathamable reason
         the data we need is in string arrays in the JavaScript functions.
+        storage is 'json' to rewrite the whole data file each run or
+        'journal' to append to a journal that gets compacted into the
+        data file every compact_every records (see ModemStore.)
+        If retention_days is set, running_data older than that many days
+        is rolled over into daily archive segments once a day.
+        Raises ModemUnreachable if the modem can't be reached in timeout
+        seconds (per request) after a few retries, or within budget seconds
+        all told if budget is set.
+        state is the ModemState of the modem at url, by default the global
+        modem_state.  If telemetry is set every poll's downstream channel
+        readings are also recorded (see ModemTelemetry) and if rollups is
+        set the hourly, daily and weekly summaries are kept up to date
+        (see ModemRollup.)  metrics is a ModemMetrics.MetricsServer to
+        publish each poll to, if any, and timings a ModemTimings.Timings
+        to add how long each phase of the poll took to.  If anomalies is
+        set, SNR, Power and error rates straying threshold standard
+        deviations from each channel's normal (or SNR and Power outside
+        the fixed limits) are logged as incidents when they start and end
+        (see ModemAnomaly) instead of warning on every poll.  In fleet mode
+        (any state but modem_state) the messages ModemImport reads back
+        are prefixed with the modem's name.
      """
 
-    global prev_run  # holds the previous run version of freqs
-    global prev_boot
-    global prev_uptime
-    global running_data
-
-    # A dictionary of dictionaries indexed by channel number of current
-    # downstream channel data in form {'status':, 'modulation':, 'channel ID':,
-    # 'Frequency':, 'Power':, 'SNR':, 'Correctable Err':, 'Uncorrectable Err':}
-    channels = {}
+    if state is None:
+        state = modem_state
+    tag = '' if state is modem_state else f'{state.name}: '
+    timer = ModemTimings.Timer('fetch_stats', state.name)
 
     # A dictionary of dictionaries indexed by frequecy of current downstream
     # data in form {'Channel ID':, 'Power':, 'SNR':, 'Correctable Err':,
     # 'Uncorrectable Err':}
     freqs = {}
+    # The same for just the locked channels, which have a signal to judge
+    locked = {}
 
     # get the page of data (and JavaScript) from the modem
-    while(1):
-        try:
-            # I usually wouldn't hard code URLs, but they're hard coded in the
-            # modem, so why not. The while loop is because if the modem is
-            # rebooting the script aborts unless we "keep trying" until page.ok
-            page = requests.get('http://192.168.100.1/',
-                                auth=HTTPBasicAuth(user, password))
-            jar = page.cookies
-            page = requests.get('http://192.168.100.1/DocsisStatus.htm',
-                                cookies=jar,
-                                auth=HTTPBasicAuth(user, password))
-        except Exception:
-            logger.error('Error(s) trying to access modem URL')
-            sleep(30)
-        if page.ok:
-            break
-
-    # scrape the page.content for the "interesting" downstream channel data
-    downstream = re.search(
-        b'InitDsTableTagValue.*var tagValueList = \'32[|]' +
-        b'(.*)\';.*function InitCmIpProvModeTag', page.content, re.DOTALL)
-    if downstream is not None:
-        downstream_data = downstream.group(1).split(b'|')
-        downstream_data.pop()  # remove extraneous end field
-        while downstream_data:
-            channel_num = int(downstream_data.pop(0))
-            channels[channel_num] = {}
-            channels[channel_num][
-                'Status'] = downstream_data.pop(0).decode('utf-8')
-            channels[channel_num][
-                'Modulation'] = downstream_data.pop(0).decode('utf-8')
-            channels[channel_num][
-                'Channel ID'] = int(downstream_data.pop(0))
-            channels[channel_num][
-                'Frequency'] = downstream_data.pop(0).decode('utf-8')
-            channels[channel_num][
-                'Power'] = float(downstream_data.pop(0).decode('utf-8'))
-            channels[channel_num][
-                'SNR'] = float(downstream_data.pop(0))
-            channels[channel_num][
-                'Correctable Err'] = int(downstream_data.pop(0))
-            channels[channel_num][
-                'Uncorrectable Err'] = int(downstream_data.pop(0))
-        logger.debug(f'Channels dict: {channels}')
-    else:
-        logger.error(
-            f'Web page contained bogus data: {page.content}')
-        raise ValueError('Web page contained bogus status data.')
-
-    # scrape the page.content for the current modem uptime
-    boot_data = re.search(
-        b'InitTagValue.*var tagValueList = \'(.*)\';.*function InitUpdateView',
-        page.content, re.DOTALL)
-    if boot_data is not None:
-        boot_list = boot_data.group(1).split(b'|')
-        # Convert the "Current System Time" to seconds since epoch
-        sys_time = int(mktime(strptime((boot_list[10].decode('utf-8')))))
-        # Convert the "Uptime" to seconds since epoch
-        uptime = timeparse(boot_list[14].decode('utf-8'))
-        boot_time = sys_time - uptime
-        logger.debug(f'SysTime::{ISO_time(sys_time)}  ' +
-                     f'Uptime::{timedelta(seconds=uptime)}')
-    else:
-        logger.error(f'Web page contained bogus data: {page.content}')
-        raise ValueError('Web page contained bogus time data.')
+    # The URLs are hard coded in the modem, so only the base url varies.
+    # The session keeps the connection and cookies between runs and
+    # retries (with backoff) while the modem is rebooting.
+    if state.session is None:
+        state.session = ModemSession.ModemSession(password, user, url,
+                                                  read_timeout=timeout,
+                                                  budget=budget)
+    try:
+        content = state.session.fetch('DocsisStatus.htm')
+    except ModemSession.ModemUnreachable:
+        if timings is not None:
+            timer.lap('fetch')
+            timer.count('retries', state.session.retry_count)
+            timer.count('unreachable')
+            timings.finish(timer)
+        if metrics is not None:
+            metrics.unreachable(state.name)
+        raise
+    timer.lap('fetch')
+    timer.count('bytes_fetched', len(content))
+    timer.count('retries', state.session.retry_count)
+
+    # parse the channel tables and the modem time out of the page
+    try:
+        status = ModemParse.parse_status(content)
+    except ValueError:
+        logger.error(f'{tag}Web page contained bogus data: {content}')
+        # Probably a login page from a silently expired session
+        state.session.logged_in = False
+        raise
+    timer.lap('parse')
+    logger.debug(f'Downstream channels: {status.downstream}')
+    sys_time = status.sys_time
+    uptime = status.uptime
+    boot_time = sys_time - uptime
+    logger.debug(f'SysTime::{ISO_time(sys_time)}  ' +
+                 f'Uptime::{timedelta(seconds=uptime)}')
 
     # Create a frequency vs. channel number based structure
     # We won't need to save everything we have for the channel
     # and we'll do some checks while we walk the channels
-    for chan_idx in channels:
-        chan_dict = channels[chan_idx]
-        chan_freq = chan_dict['Frequency']
-        freqs[chan_freq] = {}
-        freqs[chan_freq]['Channel ID'] = chan_dict['Channel ID']
-        freqs[chan_freq]['Power'] = chan_dict['Power']
-        freqs[chan_freq]['SNR'] = chan_dict['SNR']
-        freqs[chan_freq]['Correctable Err'] = chan_dict['Correctable Err']
-        freqs[chan_freq]['Uncorrectable Err'] = chan_dict['Uncorrectable Err']
+    state.trouble = False
+    for chan in status.downstream:
+        chan_freq = f'{chan.frequency} Hz'
+        freqs[chan_freq] = {'Channel ID': chan.channel_id,
+                            'Power': chan.power,
+                            'SNR': chan.snr,
+                            'Correctable Err': chan.correctable,
+                            'Uncorrectable Err': chan.uncorrectable}
+        if chan.status != 'Locked' or not chan.frequency:
+            # Unlocked channels read 0 Hz with no SNR or Power to judge
+            continue
+        locked[chan_freq] = freqs[chan_freq]
         # Check if SNR outside range
-        if chan_dict['SNR'] < 36.0:
-            logger.warning(f'{ISO_time(sys_time)}: Channel {chan_freq} ' +
-                           f'SNR too low: {chan_dict["SNR"]}')
+        if chan.snr < MIN_SNR:
+            state.trouble = True
+            if not anomalies:
+                logger.warning(f'{tag}{ISO_time(sys_time)}: '
+                               f'Channel {chan_freq} SNR too low: {chan.snr}')
         # Check if Power outside range
-        if abs(chan_dict['Power']) > 7.0:
-            logger.warning(f'{ISO_time(sys_time)}: Channel {chan_freq} ' +
-                           f' Power too high: {chan_dict["Power"]}')
+        if abs(chan.power) > MAX_POWER:
+            state.trouble = True
+            if not anomalies:
+                logger.warning(f'{tag}{ISO_time(sys_time)}: '
+                               f'Channel {chan_freq}  Power too high: '
+                               f'{chan.power}')
     logger.debug(f'Frequency dict: {freqs}')
+    timer.lap('channels')
 
     # prev_run is defined from the previous globals run then use it for
     # efficiency  otherwise, pull it from the data file, if no data file
     # then must be new installation
-    if not prev_run:
+    if not state.prev_run:
         try:
             # Check to see if we have saved stats stored on disk
-            with open(datafile_name) as f:
-                (prev_run, running_data, prev_boot, prev_uptime) = json.load(f)
-                logger.debug(f'Recovered Prev_run dict: {prev_run}')
-                logger.debug(f'Recovered Running dict: {running_data}')
-                logger.debug(f'Recovered Previous Boot: {prev_boot}')
-                logger.debug(f'Recovered Previous Uptime: {prev_uptime}')
+            (state.prev_run, state.running_data, state.prev_boot,
+             state.prev_uptime) = ModemStore.load_store(datafile_name)
+            state.journal_records = ModemStore.count_journal(datafile_name)
+            logger.debug(f'Recovered Prev_run dict: {state.prev_run}')
+            logger.debug('Recovered Running dict: %s', state.running_data)
+            logger.debug(f'Recovered Previous Boot: {state.prev_boot}')
+            logger.debug(f'Recovered Previous Uptime: {state.prev_uptime}')
         except IOError:
             # Assume the file doesn't exist
             # initialize prev_run so the compares don't traceback
-            prev_run = freqs
-            prev_boot = boot_time
-            prev_uptime = uptime
+            state.prev_run = freqs
+            state.prev_boot = boot_time
+            state.prev_uptime = uptime
             logger.debug(
                 'No existing prev_run. Setting prev_run to current data.')
+        timer.lap('load')
 
     # Sometimes on critical modem errors boot_time moves back a few seconds
     # and there seems to be a few second "jitter" in the uptime.
-    if boot_time > prev_boot + 60:
+    if boot_time > state.prev_boot + 60:
         # Error rates must have been reset to zero by a reboot,
         # so baseline every frequency as zero
-        prev_run = freqs
-        for channel in prev_run:
-            prev_run[channel]['Correctable Err'] = 0
-            prev_run[channel]['UnCorrectable Err'] = 0
-        logger.info(f'Modem Rebooted at {ISO_time(boot_time)} ' +
+        state.prev_run = freqs
+        for channel in state.prev_run:
+            state.prev_run[channel]['Correctable Err'] = 0
+            state.prev_run[channel]['UnCorrectable Err'] = 0
+        logger.info(f'{tag}Modem Rebooted at {ISO_time(boot_time)} ' +
                     f'Currently up {timedelta(seconds=uptime)}')
-        logger.info(f'Previous boot at {ISO_time(prev_boot)} ' +
-                    f'Last up {timedelta(seconds=prev_uptime)}')
+        logger.info(f'{tag}Previous boot at {ISO_time(state.prev_boot)} ' +
+                    f'Last up {timedelta(seconds=state.prev_uptime)}')
 
     # see if we have any new errors to report/keep track of
     # If the modem sees enough critial errors it will reset without
     # "rebooting" so uptime looks good, even though all the counters
     # have reset.  This is hard to detect, but we do our best.
     new_data = {}
+    prev_run = state.prev_run
     for chan_freq in prev_run:
         if chan_freq in list(freqs.keys()):
             new_correctable = freqs[chan_freq][
@@ -210,7 +246,7 @@ def fetch_stats(password, user='admin', datafile_name='modem_stats.json'):
                 'Uncorrectable Err'] - prev_run[chan_freq]['Uncorrectable Err']
             # if any channel goes bad, reset them all and break out
             if new_correctable < 0 or new_uncorrectable < 0:
-                logger.info(f'Channel: {chan_freq} Negative errors'
+                logger.info(f'{tag}Channel: {chan_freq} Negative errors'
                             ' - resetting previous counters')
                 for old_freq in prev_run:
                     prev_run[old_freq]['Correctable Err'] = 0
@@ -227,7 +263,7 @@ def fetch_stats(password, user='admin', datafile_name='modem_stats.json'):
                 new_data[chan_freq] = (new_correctable, new_uncorrectable)
         else:
             new_data[chan_freq] = (0, 0)
-            logger.info(f'Channel: {chan_freq} no longer utiltized')
+            logger.info(f'{tag}Channel: {chan_freq} no longer utiltized')
             logger.debug(f'Channel: {chan_freq} Freqs keys: ' +
                          f'{list(freqs.keys())}')
 
@@ -240,23 +276,175 @@ def fetch_stats(password, user='admin', datafile_name='modem_stats.json'):
                 new_data[chan_freq] = (new_correctable, new_uncorrectable)
 
     if new_data:
-        running_data[sys_time] = new_data
-        logger.info(f'New errors at {ISO_time(sys_time)}: {new_data}')
-    logger.debug(f'Running data now: {running_data}')
-
-    prev_run = freqs
-    prev_boot = boot_time
-    prev_uptime = uptime
-    with open(datafile_name, 'w') as f:
-        json.dump((prev_run, running_data, boot_time, uptime), f)
+        state.running_data[sys_time] = new_data
+        logger.info(f'{tag}New errors at {ISO_time(sys_time)}: {new_data}')
+        if any(uncorrectable for _, uncorrectable in new_data.values()):
+            state.trouble = True
+    # (formatted only if debugging, it's the whole history)
+    logger.debug('Running data now: %s', state.running_data)
+    timer.count('records', len(state.running_data))
+    timer.lap('delta')
+
+    state.prev_run = freqs
+    state.prev_boot = boot_time
+    state.prev_uptime = uptime
+    if retention_days and sys_time >= state.next_rollover:
+        # Archive whole days only, so check again at the next UTC midnight
+        state.next_rollover = (sys_time - sys_time % ModemStore.DAY +
+                               ModemStore.DAY)
+        if ModemStore.roll_over(datafile_name, state.running_data,
+                                sys_time - retention_days * ModemStore.DAY):
+            # Force the archived entries out of the snapshot and journal
+            state.journal_records = compact_every
+        timer.lap('rollover')
+    if storage == 'journal':
+        if new_data:
+            timer.count('bytes_written', ModemStore.append_journal(
+                datafile_name, sys_time, new_data))
+            state.journal_records += 1
+        if state.journal_records >= compact_every:
+            timer.count('bytes_written', ModemStore.compact_store(
+                datafile_name, state.prev_run, state.running_data,
+                boot_time, uptime))
+            state.journal_records = 0
+        else:
+            timer.count('bytes_written', ModemStore.save_checkpoint(
+                datafile_name, state.prev_run, boot_time, uptime))
+    else:
+        timer.count('bytes_written', ModemStore.save_store(
+            datafile_name, state.prev_run, state.running_data, boot_time,
+            uptime))
+    timer.lap('store')
+    if telemetry:
+        if state.telemetry is None:
+            state.telemetry = ModemTelemetry.TelemetryWriter(datafile_name)
+        timer.count('bytes_written', state.telemetry.append(
+            sys_time, status.downstream + status.ds_ofdm))
+        timer.lap('telemetry')
+    if rollups:
+        if state.rollups is None:
+            # (seeded with the errors before this poll)
+            state.rollups = ModemRollup.RollupWriter(datafile_name,
+                                                     sys_time - 1)
+        timer.count('bytes_written', state.rollups.add_poll(
+            sys_time, locked, new_data))
+        timer.lap('rollups')
+    if anomalies:
+        if state.anomaly is None:
+            state.anomaly = ModemAnomaly.AnomalyDetector(
+                datafile_name, state.name, threshold, min_snr=MIN_SNR,
+                max_power=MAX_POWER)
+        timer.count('bytes_written', state.anomaly.add_poll(
+            sys_time, locked, new_data))
+        if state.anomaly.in_trouble():
+            state.trouble = True
+        timer.lap('anomaly')
+    if timings is not None:
+        timings.finish(timer)
+    if metrics is not None:
+        metrics.publish(state.name, sys_time, boot_time, uptime, freqs,
+                        new_data)
     logger.debug(f'Data refreshed Boot Time ({boot_time}) ' +
                  f'{ISO_time(boot_time)}')
     logger.debug(f'Data refreshed Uptime ' +
                  f'({uptime}) {timedelta(seconds=uptime)}')
-    logger.info(f'Data refreshed System Time ({sys_time}) ' +
+    logger.info(f'{tag}Data refreshed System Time ({sys_time}) ' +
                 f'{ISO_time(sys_time)}')
 
 
+def load_fleet(config_name):
+    """ Read a fleet config file, a json list of modems like
+        [{"name": "home", "url": "http://192.168.100.1/", "user": "admin",
+          "passfile": "/usr/local/lib/ModemCheck/ModemPassword",
+          "datafile": "/var/log/ModemCheck/home.json", "timeout": 30,
+          "poll_timeout": 120}]
+        "password" can be given instead of "passfile".  "timeout" is per
+        request and "poll_timeout" for the whole fetch, retries and all.
+        Only "name" and "datafile" have no defaults.  Each modem gets its
+        own ModemState.
+    """
+    with open(config_name) as f:
+        modems = json.load(f)
+    for modem in modems:
+        modem.setdefault('url', 'http://192.168.100.1/')
+        modem.setdefault('user', 'admin')
+        modem.setdefault('timeout', 30.0)
+        modem.setdefault('poll_timeout', 120.0)
+        if 'passfile' in modem:
+            with open(modem['passfile']) as pf:
+                modem['password'] = pf.readline().rstrip('\n')
+        modem['state'] = ModemState(modem['name'])
+        modem['poll'] = None  # the poll in progress, if any
+    return modems
+
+
+async def poll_modem(modem, executor, **kwargs):
+    """ Poll one modem using the (shared) executor.  The fetch is given
+        the modem's poll_timeout, retries and all, so an unreachable modem
+        gives its thread back for the others.  The whole poll gets
+        POLL_GRACE more (a thread can't be cancelled, so a poll that runs
+        over is left to finish while the next one for that modem is skipped)
+    """
+    name = modem['name']
+    if modem['poll'] is not None and not modem['poll'].done():
+        logger.warning(f'{name}: previous poll still running, skipping')
+        return
+    loop = asyncio.get_running_loop()
+    modem['poll'] = loop.run_in_executor(executor, partial(
+        fetch_stats, password=modem['password'], user=modem['user'],
+        datafile_name=modem['datafile'], timeout=modem['timeout'],
+        url=modem['url'], state=modem['state'],
+        budget=modem['poll_timeout'], **kwargs))
+    deadline = modem['poll_timeout'] + POLL_GRACE
+    try:
+        await asyncio.wait_for(asyncio.shield(modem['poll']), deadline)
+    except asyncio.TimeoutError:
+        logger.error(f'{name}: poll took more than {deadline}s')
+        modem['poll'].add_done_callback(partial(late_poll_done, name))
+    except ModemSession.ModemUnreachable:
+        # Already logged, just try again at the next poll
+        pass
+    except Exception:
+        logger.exception(f'{name}: poll failed')
+
+
+def late_poll_done(name, poll):
+    """ Log how a poll that ran past its deadline finally ended """
+    if poll.cancelled():
+        return
+    err = poll.exception()
+    if err is None:
+        logger.info(f'{name}: late poll finished')
+    elif not isinstance(err, ModemSession.ModemUnreachable):
+        # (unreachable is already logged)
+        logger.error(f'{name}: late poll failed: {err!r}')
+
+
+async def run_modem(modem, executor, interval, fast_interval=None,
+                    calm_after=1800, **kwargs):
+    """ Poll one modem forever on its own ModemSchedule.PollSchedule """
+    schedule = ModemSchedule.PollSchedule(interval, fast_interval,
+                                          calm_after, modem['name'])
+    while (1):
+        await poll_modem(modem, executor, **kwargs)
+        poll = modem['poll']
+        if poll is not None and poll.done() and poll.exception() is None:
+            schedule.record(modem['state'].trouble)
+        await asyncio.sleep(schedule.delay())
+
+
+async def run_fleet(modems, concurrency, interval=300, fast_interval=None,
+                    calm_after=1800, **kwargs):
+    """ Poll every modem concurrently, each on its own schedule, with at
+        most concurrency polls (threads) running at once.  See
+        ModemSchedule for interval, fast_interval and calm_after.
+    """
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        await asyncio.gather(*(run_modem(modem, executor, interval,
+                                         fast_interval, calm_after, **kwargs)
+                               for modem in modems))
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description=('A script to monitor the signal quality of a Netgear'
@@ -274,10 +462,64 @@ if __name__ == "__main__":
                         default='ModemData.json')
     parser.add_argument('-p', '--passfile',
                         help='specify file to read modem password from')
+    parser.add_argument('-s', '--storage', choices=['json', 'journal'],
+                        default='json',
+                        help='rewrite the whole data store each poll (json)'
+                        ' or append to a journal (journal)')
+    parser.add_argument('--compact-every', type=int, default=2016,
+                        help='journal records between compactions')
+    parser.add_argument('-r', '--retention', type=int, default=None,
+                        help='days of data to keep in the data store before'
+                        ' rolling it over to the archive (default keep all)')
+    parser.add_argument('-t', '--timeout', type=float, default=30.0,
+                        help='seconds to wait for the modem to respond')
+    parser.add_argument('-T', '--telemetry', action='store_true',
+                        help='also record every poll\'s channel Power, SNR'
+                        ' and error counters')
+    parser.add_argument('-R', '--rollups', action='store_true',
+                        help='keep hourly, daily and weekly summaries for'
+                        ' long range displays')
+    parser.add_argument('-A', '--anomalies', action='store_true',
+                        help='log SNR, Power and error rate incidents'
+                        ' against each channel\'s own normal instead of'
+                        ' warning every poll while out of range')
+    parser.add_argument('--threshold', type=float, default=4.0,
+                        help='standard deviations from normal that start'
+                        ' an incident with --anomalies')
+    parser.add_argument('-f', '--fleet',
+                        help='json file listing modems to poll concurrently'
+                        ' (overrides --datafile and --passfile)')
+    parser.add_argument('-c', '--concurrency', type=int, default=8,
+                        help='maximum modems polled at once in fleet mode')
+    parser.add_argument('-i', '--interval', type=int, default=300,
+                        help='seconds between polls (on the clock, so 300'
+                        ' polls on every fifth minute)')
+    parser.add_argument('--fast-interval', type=int, default=None,
+                        help='seconds between polls while there are new'
+                        ' uncorrectable errors or SNR or Power is out of'
+                        ' range (default don\'t speed up)')
+    parser.add_argument('--calm-after', type=int, default=1800,
+                        help='seconds without trouble before going back to'
+                        ' the normal interval')
+    parser.add_argument('-m', '--metrics-port', type=int, default=None,
+                        help='serve the latest readings on this port at'
+                        ' /metrics (Prometheus) and /metrics.json')
+    parser.add_argument('--metrics-address', default='localhost',
+                        help='address to serve metrics on (\'\' for all)')
+    parser.add_argument('--stats-file',
+                        help='append how long each phase of every poll took'
+                        ' (and bytes fetched and written) to this json lines'
+                        ' file')
     args = parser.parse_args()
 
     # set up log destination and verbosity from the command line
-    logger.setLevel(logging.DEBUG)
+    # (our helper modules log through the same handlers)
+    loggers = (logger, ModemAnomaly.logger, ModemMetrics.logger,
+               ModemParse.logger, ModemRollup.logger, ModemSchedule.logger,
+               ModemSession.logger, ModemStore.logger, ModemTelemetry.logger,
+               ModemTimings.logger)
+    for each_logger in loggers:
+        each_logger.setLevel(logging.DEBUG)
     # create formatter
     stamped_formatter = logging.Formatter(
         '%(asctime)s::%(levelname)s::%(name)s::%(message)s')
@@ -293,7 +535,8 @@ if __name__ == "__main__":
             ch.setLevel(logging.WARNING)
         else:
             ch.setLevel(logging.CRITICAL)
-        logger.addHandler(ch)
+        for each_logger in loggers:
+            each_logger.addHandler(ch)
     elif args.quiet and args.verbose:
         parser.error('Can not have both verbose and quiet unless using a log' +
                      ' file (in which case the quiet applies to the console.)')
@@ -315,7 +558,28 @@ if __name__ == "__main__":
     elif args.verbose >= 3:
         # go for our current max of debug
         fh.setLevel(logging.DEBUG)
-    logger.addHandler(fh)
+    for each_logger in loggers:
+        each_logger.addHandler(fh)
+
+    timings = None
+    if args.stats_file or args.metrics_port is not None:
+        timings = ModemTimings.Timings(args.stats_file)
+    metrics = None
+    if args.metrics_port is not None:
+        metrics = ModemMetrics.MetricsServer(args.metrics_port,
+                                             args.metrics_address, timings)
+
+    if args.fleet:
+        asyncio.run(run_fleet(load_fleet(args.fleet), args.concurrency,
+                              args.interval, args.fast_interval,
+                              args.calm_after, storage=args.storage,
+                              compact_every=args.compact_every,
+                              retention_days=args.retention,
+                              telemetry=args.telemetry,
+                              rollups=args.rollups, metrics=metrics,
+                              timings=timings, anomalies=args.anomalies,
+                              threshold=args.threshold))
+        sys.exit(0)
 
     # Get the modem password
     if args.passfile:
@@ -325,6 +589,20 @@ if __name__ == "__main__":
         modem_password = getpass.getpass('Modem Password: ')
     logger.debug(f"Password argument set to {modem_password}")
 
+    schedule = ModemSchedule.PollSchedule(args.interval, args.fast_interval,
+                                          args.calm_after)
     while (1):
-        fetch_stats(password=modem_password, datafile_name=args.datafile)
-        sleep(300)
+        try:
+            fetch_stats(password=modem_password, datafile_name=args.datafile,
+                        storage=args.storage,
+                        compact_every=args.compact_every,
+                        retention_days=args.retention, timeout=args.timeout,
+                        telemetry=args.telemetry, rollups=args.rollups,
+                        metrics=metrics, timings=timings,
+                        anomalies=args.anomalies, threshold=args.threshold)
+            schedule.record(modem_state.trouble)
+        except (ModemSession.ModemUnreachable, ValueError):
+            # Already logged (a bogus or login page is a ValueError), just
+            # try again at the next poll
+            pass
+        sleep(schedule.delay())
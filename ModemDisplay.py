@@ -29,11 +29,24 @@
     ModemCheck data file and publish a scatter plot graph
 """
 import argparse
+import heapq
 import json
 import logging
 import math
-import plotly.graph_objects as go
-from time import gmtime, strftime
+import os
+import ModemRollup
+import ModemStore
+import ModemSvg
+import ModemTelemetry
+import ModemTimings
+import tempfile
+import webbrowser
+from operator import itemgetter
+from time import gmtime, strftime, time
+
+ERR_TYPES = ['Correctable', 'Uncorrectable']
+MERGE_STEP = 300    # seconds, the narrowest bucket when merging stores
+NORMALIZE = ['peak', 'share']
 
 logger = logging.getLogger(__name__)
 
@@ -47,32 +60,44 @@ def ISO_time(epochtime):
     return strftime('%Y-%m-%dT%H:%M:%SZ', gmtime(epochtime))
 
 
-def display_stats(datafile_name, outfile_name=None):
-    """ Read the modem stats from datafile and produce an HTML chart
+def snapshot_stamp(datafile_name):
+    """ (size, modification time) of the data store snapshot, which only
+        changes when it's rewritten
     """
+    try:
+        stat = os.stat(datafile_name)
+    except FileNotFoundError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
 
-    logger.debug(f'In display_stats: '
-                 f'datafile_name={datafile_name} '
-                 f'outfile_name={outfile_name}')
-    running_data = {}
 
-    # Get saved stats stored on disk
-    with open(datafile_name) as f:
-        (prev_run, running_data, prev_boot, prev_uptime) = json.load(f)
-        logger.debug(f'Recovered Prev_run dict: {prev_run}')
-        logger.debug(f'Recovered Running dict: {running_data}')
-        logger.debug(f'Recovered Previous Boot: {prev_boot}')
-        logger.debug(f'Recovered Previous Uptime: {prev_uptime}')
+def first_event(running_data):
+    return min((int(event_time) for event_time in running_data),
+               default=None)
+
+
+def load_display_cache(cache_name, datafile_name):
+    """ The cached traces for datafile_name, or None if there aren't any """
+    try:
+        with open(cache_name) as f:
+            cache = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    if cache.get('datafile') != os.path.abspath(datafile_name):
+        return None
+    return cache
 
-    fig = go.Figure()
 
+def add_events(traces, events):
+    """ Append the X (time), Y (frequency), S (marker size) and T (text)
+        of each error in events, a list of (event_time, data_points), to
+        the traces for its error type.  Returns the largest size added.
+    """
     max_size = 0
-    for index, err_type in enumerate(['Correctable', 'Uncorrectable']):
-        X = []  # X axis array for display
-        Y = []  # Y axis array for display
-        S = []  # size of data point arrary for display
-        T = []  # array of text descriptions of data points
-        for event_time, data_points in running_data.items():
+    for index, err_type in enumerate(ERR_TYPES):
+        X, Y, S, T = traces[err_type]
+        first_new = len(S)
+        for event_time, data_points in events:
             for freq in sorted(list(data_points.keys())):
                 if data_points[freq][index]:
                     X.append(ISO_time(int(event_time)))
@@ -80,10 +105,190 @@ def display_stats(datafile_name, outfile_name=None):
                     S.append(math.sqrt(data_points[freq][index]))
                     T.append(
                         f'{data_points[freq][index]} {err_type} Errors')
+        if len(S) > first_new:
+            max_size = max(max_size, max(S[first_new:]))
+    return max_size
+
+
+def window_start(days, since):
+    """ since, or if that's None the start of the last days (if any) """
+    if since is None and days is not None:
+        since = int(time()) - days * ModemStore.DAY
+    return since
+
+
+def rollup_tier(datafile_name, since, until, width):
+    """ (tier, since) of the ModemRollup tier to use to display since to
+        until (or everything) width pixels wide; tier is None if the raw
+        data should be used, as it is if there are no rollups or there's
+        data from before they start (ModemCheck wasn't always run with -R.)
+    """
+    end = int(time()) if until is None else until
+    first = ModemRollup.first_bucket(datafile_name)
+    if first is None:
+        logger.debug('No rollups, using the raw data')
+        return (None, since)
+    if since is None or since < first:
+        if next(ModemStore.iter_events(datafile_name, since, first - 1),
+                None) is not None:
+            logger.info('Rollups start after the data to display, using '
+                        'the raw data')
+            return (None, since)
+        if since is None:
+            since = first
+    tier = ModemRollup.choose_tier(end - since, width)
+    logger.debug(f'Rollup tier for {end - since}s in {width}px: {tier}')
+    return (tier, since)
+
+
+def read_rollup_errors(datafile_name, tier, since, until=None, freqs=None):
+    """ running_data style dict of the errors in the rollup tier """
+    running_data = {}
+    for start, buckets in ModemRollup.read_rollup(datafile_name, tier,
+                                                  since, until):
+        data_points = {freq: stats[:ModemRollup.UNCORRECTABLE + 1]
+                       for freq, stats in buckets.items()
+                       if (stats[ModemRollup.CORRECTABLE] or
+                           stats[ModemRollup.UNCORRECTABLE]) and
+                       (freqs is None or freq in freqs)}
+        if data_points:
+            running_data[start] = data_points
+    return running_data
+
+
+def display_stats(datafile_name, outfile_name=None, days=None,
+                  cache_name=None, width=None, since=None, until=None,
+                  freqs=None, timings=None, backend='plotly'):
+    """ Read the modem stats from datafile and produce an HTML chart
+        of the last days worth of data, reaching into the archive if
+        need be, or of everything in the data store if days is None.
+        since and until (seconds since epoch) and freqs (a set like
+        {'531000000 Hz'}) narrow it down further (see ModemStore.query.)
+        With a cache_name (and none of those) the traces built so far are
+        kept there and only events since the last run are added.
+        With a width (in pixels) the errors are summed into the coarsest
+        rollups (see ModemRollup) needed to fit it.
+        timings is a ModemTimings.Timings to add how long each step took to.
+        backend 'svg' draws a static chart with ModemSvg instead of plotly
+        (which isn't even imported then.)
+    """
+
+    timer = ModemTimings.Timer('display_stats',
+                               os.path.basename(datafile_name))
+    logger.debug(f'In display_stats: '
+                 f'datafile_name={datafile_name} '
+                 f'outfile_name={outfile_name} '
+                 f'days={days} '
+                 f'cache_name={cache_name} '
+                 f'width={width} '
+                 f'since={since} until={until} freqs={freqs}')
+    running_data = {}
+    since = window_start(days, since)
+    windowed = since is not None or until is not None or freqs is not None
+    tier = None
+    if width is not None:
+        (tier, since) = rollup_tier(datafile_name, since, until, width)
+    use_cache = cache_name is not None and not windowed and tier is None
+    cache = None
+    if use_cache:
+        cache = load_display_cache(cache_name, datafile_name)
+
+    if tier is not None:
+        running_data = read_rollup_errors(datafile_name, tier, since, until,
+                                          freqs)
+        logger.debug('Rollup dict: %s', running_data)
+    elif windowed:
+        running_data = ModemStore.query(datafile_name, since, until, freqs)
+        logger.debug('Query dict: %s', running_data)
+    elif cache is not None and cache['snapshot'] == snapshot_stamp(
+            datafile_name):
+        # The snapshot hasn't been rewritten, so anything new is in the
+        # journal (if there is one)
+        running_data = dict(ModemStore.read_journal(datafile_name))
+        logger.debug('Journal dict: %s', running_data)
+    else:
+        # Get saved stats stored on disk (snapshot plus any journal)
+        (prev_run, running_data, prev_boot,
+         prev_uptime) = ModemStore.load_store(datafile_name)
+        logger.debug(f'Recovered Prev_run dict: {prev_run}')
+        logger.debug('Recovered Running dict: %s', running_data)
+        logger.debug(f'Recovered Previous Boot: {prev_boot}')
+        logger.debug(f'Recovered Previous Uptime: {prev_uptime}')
+        if cache is not None and cache['first_time'] != first_event(
+                running_data):
+            # Data was rolled over or replaced, start over
+            logger.info(f'Display cache {cache_name} is stale')
+            cache = None
+    timer.count('records', len(running_data))
+    timer.lap('load')
+    if cache is None:
+        cache = {'datafile': os.path.abspath(datafile_name),
+                 'first_time': first_event(running_data),
+                 'last_time': -1,
+                 'max_size': 0,
+                 'traces': {err_type: [[], [], [], []]
+                            for err_type in ERR_TYPES}}
+    new_events = [(event_time, data_points)
+                  for event_time, data_points in running_data.items()
+                  if int(event_time) > cache['last_time']]
+    logger.debug(f'{len(new_events)} new events since {cache["last_time"]}')
+    cache['max_size'] = max(cache['max_size'],
+                            add_events(cache['traces'], new_events))
+    if new_events:
+        cache['last_time'] = max(int(event_time)
+                                 for event_time, _ in new_events)
+    timer.count('events', len(new_events))
+    timer.lap('traces')
+    if use_cache:
+        cache['snapshot'] = snapshot_stamp(datafile_name)
+        timer.count('bytes_cached',
+                    ModemStore.atomic_write_json(cache_name, cache))
+        timer.lap('cache')
+
+    write_errors(cache['traces'], cache['max_size'], outfile_name, backend,
+                 width, timer=timer)
+    if timings is not None:
+        if outfile_name is not None:
+            timer.count('bytes_written', os.path.getsize(outfile_name))
+        timings.finish(timer)
+
+
+def write_errors(traces, max_size, outfile_name=None, backend='plotly',
+                 width=None, title='CM1150V Packet Errors', timer=None,
+                 groups=None):
+    """ Draw the error traces (see add_events), whose largest marker is
+        max_size, with the backend ('plotly' or 'svg') and show them or
+        write them to outfile_name.  The figure and write phases are
+        lapped on timer, if given.  groups maps trace names to the legend
+        group (toggled together) they belong to, if any.
+    """
+    if timer is None:
+        timer = ModemTimings.Timer('write_errors')
+    if backend == 'svg':
+        svg = ModemSvg.error_chart(traces, title,
+                                   width=1200 if width is None else width)
+        timer.lap('figure')
+        if outfile_name is None:
+            with tempfile.NamedTemporaryFile('w', suffix='.html',
+                                             delete=False) as f:
+                outfile_name = f.name
+            ModemSvg.write_chart(svg, outfile_name)
+            webbrowser.open('file://' + outfile_name)
+        else:
+            ModemSvg.write_chart(svg, outfile_name)
+        timer.lap('write')
+        return
+
+    # plotly takes a while to import, so only when it's wanted
+    import plotly.graph_objects as go
+
+    fig = go.Figure()
+
+    for name, (X, Y, S, T) in traces.items():
         if (len(S) > 0):
             fig.add_trace(go.Scattergl(
-                x=X, y=Y, name=err_type, text=T, marker_size=S))
-            max_size = max(max_size, max(S))
+                x=X, y=Y, name=name, text=T, marker_size=S,
+                legendgroup=None if groups is None else groups[name]))
 
     fig.update_traces(
         mode='markers',
@@ -101,7 +306,290 @@ def display_stats(datafile_name, outfile_name=None):
                                   ),
                       xaxis=dict(type='date', title='Date/Time (in UTC)'),
                       yaxis_title='Frequency (in Hz)',
-                      title="CM1150V Packet Errors")
+                      title=title)
+    timer.lap('figure')
+    write_figure(fig, outfile_name)
+    timer.lap('write')
+
+
+def _tagged(index, events):
+    """ events, (event_time, data_points) pairs, as (event_time, index,
+        data_points) so the merge knows where each came from
+    """
+    for event_time, data_points in events:
+        yield (event_time, index, data_points)
+
+
+def _coarsen(buckets, width):
+    """ buckets summed into buckets width seconds wide """
+    coarse = {}
+    for start, data_points in buckets.items():
+        bucket = coarse.setdefault(start - start % width, {})
+        for freq, (correctable, uncorrectable) in data_points.items():
+            total = bucket.setdefault(freq, [0, 0])
+            total[0] += correctable
+            total[1] += uncorrectable
+    return coarse
+
+
+def merge_stores(datafile_names, columns, since=None, until=None,
+                 freqs=None, timer=None):
+    """ Merge the errors of every data store in datafile_names by time
+        (a k-way heap merge of their ModemStore.iter_events streams) and
+        sum them into buckets shared by all of them.  Buckets start
+        MERGE_STEP seconds wide and double whenever there would be more
+        than columns of them.  The archives are read a day at a time, but
+        each store's snapshot and journal are read whole, so memory only
+        goes with columns rather than the size of the stores when they
+        keep most of their history in the archive (ModemCheck -r.)
+        Returns (bucket width, [{bucket start:
+        {freq: [correctable, uncorrectable]}} for each store]).
+        records and buckets are counted on timer, if given.
+    """
+    streams = [_tagged(index, ModemStore.iter_events(datafile_name, since,
+                                                     until, freqs))
+               for index, datafile_name in enumerate(datafile_names)]
+    buckets = [{} for _ in datafile_names]
+    starts = []     # of the buckets so far, in any store
+    width = MERGE_STEP
+    records = 0
+    for event_time, index, data_points in heapq.merge(
+            *streams, key=itemgetter(0)):
+        records += 1
+        start = event_time - event_time % width
+        if not starts or starts[-1] != start:
+            starts.append(start)
+            if len(starts) > columns:
+                width *= 2
+                starts = sorted({start - start % width for start in starts})
+                buckets = [_coarsen(each, width) for each in buckets]
+                start = event_time - event_time % width
+                logger.debug(f'Merge buckets now {width}s wide')
+        bucket = buckets[index].setdefault(start, {})
+        for freq, (correctable, uncorrectable) in data_points.items():
+            total = bucket.setdefault(freq, [0, 0])
+            total[0] += correctable
+            total[1] += uncorrectable
+    if timer is not None:
+        timer.count('records', records)
+        timer.count('buckets', len(starts))
+    return (width, buckets)
+
+
+def display_merged(sources, outfile_name=None, days=None, columns=1000,
+                   since=None, until=None, freqs=None, normalize=None,
+                   timings=None, backend='plotly'):
+    """ Like display_stats, but of several data stores, sources being a
+        list of (name, datafile_name), on the one time axis.  Each gets
+        its own correctable and uncorrectable traces, with the errors
+        summed into at most columns time buckets (see merge_stores.)
+        normalize 'peak' scales each source so its largest bucket is 1,
+        and 'share' makes each bucket its share of the source's errors,
+        so busy and quiet modems can be compared.
+    """
+    timer = ModemTimings.Timer('display_merged', ','.join(
+        name for name, _ in sources))
+    logger.debug(f'In display_merged: sources={sources} '
+                 f'outfile_name={outfile_name} days={days} '
+                 f'columns={columns} since={since} until={until} '
+                 f'freqs={freqs} normalize={normalize}')
+    (width, buckets) = merge_stores(
+        [datafile_name for _, datafile_name in sources], columns,
+        window_start(days, since), until, freqs, timer)
+    timer.lap('merge')
+
+    traces = {}
+    groups = {}
+    max_size = 0
+    for (name, _), source in zip(sources, buckets):
+        for index, err_type in enumerate(ERR_TYPES):
+            counts = [data_points[freq][index]
+                      for data_points in source.values()
+                      for freq in data_points]
+            scale = 1
+            if normalize == 'peak':
+                scale = max(counts, default=0) or 1
+            elif normalize == 'share':
+                scale = sum(counts) or 1
+            trace_name = f'{name} {err_type}'
+            traces[trace_name] = X, Y, S, T = [], [], [], []
+            groups[trace_name] = name
+            for start in sorted(source):
+                for freq, errors in sorted(source[start].items()):
+                    if errors[index]:
+                        X.append(ISO_time(start))
+                        Y.append(int(freq.rstrip(' Hz')))
+                        S.append(math.sqrt(errors[index] / scale))
+                        T.append(f'{name}: {errors[index]} {err_type} '
+                                 f'Errors in {width // 60} minutes')
+            max_size = max(max_size, max(S, default=0))
+    timer.lap('traces')
+    write_errors(traces, max_size or 1, outfile_name, backend,
+                 title='CM1150V Packet Errors by Modem', timer=timer,
+                 groups=groups)
+    if timings is not None:
+        if outfile_name is not None:
+            timer.count('bytes_written', os.path.getsize(outfile_name))
+        timings.finish(timer)
+
+
+def display_heatmap(datafile_name, outfile_name=None, days=None,
+                    err_type='Uncorrectable', bins=500, since=None,
+                    until=None, freqs=None):
+    """ Like display_stats, but sum the errors of err_type (or 'Total' for
+        both) into at most bins time buckets per frequency and draw them
+        as a single heatmap, so the size of the chart doesn't depend on
+        the number of errors.  Needs NumPy.
+    """
+    import numpy as np
+    import plotly.graph_objects as go
+
+    logger.debug(f'In display_heatmap: '
+                 f'datafile_name={datafile_name} '
+                 f'outfile_name={outfile_name} '
+                 f'days={days} err_type={err_type} bins={bins} '
+                 f'since={since} until={until} freqs={freqs}')
+    running_data = ModemStore.query(datafile_name, window_start(days, since),
+                                    until, freqs)
+
+    # Flatten into one row per (time, frequency)
+    times = []
+    freq_hz = []
+    errors = []
+    for event_time, data_points in running_data.items():
+        for freq, counts in data_points.items():
+            times.append(int(event_time))
+            freq_hz.append(int(freq.rstrip(' Hz')))
+            errors.append(counts)
+    times = np.array(times, dtype=np.int64)
+    errors = np.array(errors, dtype=np.int64).reshape(-1, 2)
+    if err_type == 'Total':
+        errors = errors.sum(axis=1)
+    else:
+        errors = errors[:, ERR_TYPES.index(err_type)]
+
+    fig = go.Figure()
+    if len(times):
+        # Buckets are whole multiples of the 5 minute poll interval
+        start = times.min()
+        width = max(300, math.ceil((times.max() - start + 1) / bins / 300)
+                    * 300)
+        time_bins = (times - start) // width
+        n_bins = int(time_bins.max()) + 1
+        freq_list, freq_bins = np.unique(freq_hz, return_inverse=True)
+        z = np.bincount(freq_bins * n_bins + time_bins, weights=errors,
+                        minlength=len(freq_list) * n_bins).reshape(
+                            len(freq_list), n_bins)
+        z[z == 0] = np.nan  # leave empty buckets blank
+        fig.add_trace(go.Heatmap(
+            x=(start + np.arange(n_bins) * width).astype('datetime64[s]'),
+            y=freq_list, z=z, colorscale='Reds',
+            colorbar=dict(title=f'{err_type} Errors'),
+            hovertemplate='%{x}<br>%{y} Hz<br>%{z} Errors<extra></extra>'))
+        logger.debug(f'{len(times)} errors in {len(freq_list)}x{n_bins} '
+                     f'buckets of {width}s')
+
+    fig.update_layout(xaxis=dict(type='date', title='Date/Time (in UTC)'),
+                      yaxis_title='Frequency (in Hz)',
+                      title=f'CM1150V {err_type} Packet Errors')
+    write_figure(fig, outfile_name)
+
+
+def display_signal(datafile_name, outfile_name=None, days=None,
+                   metric='SNR', points=2000, width=None, since=None,
+                   until=None, freqs=None):
+    """ Read the channel telemetry from datafile and produce an HTML chart
+        of the SNR (or Power) of each frequency over the last days (or
+        everything.)  Each frequency is averaged down to at most points
+        points.  Needs NumPy.  With a width (in pixels) the mean and range
+        come from the coarsest rollups needed to fit it instead.
+    """
+    logger.debug(f'In display_signal: '
+                 f'datafile_name={datafile_name} '
+                 f'outfile_name={outfile_name} '
+                 f'days={days} metric={metric} width={width} '
+                 f'since={since} until={until} freqs={freqs}')
+    import plotly.graph_objects as go
+
+    fig = go.Figure()
+    units = 'dB' if metric == 'SNR' else 'dBmV'
+    fig.update_layout(xaxis=dict(type='date', title='Date/Time (in UTC)'),
+                      yaxis_title=f'{metric} (in {units})',
+                      title=f'CM1150V Downstream {metric}')
+    since = window_start(days, since)
+    if width is not None:
+        (tier, since) = rollup_tier(datafile_name, since, until, width)
+        if tier is not None:
+            add_rollup_signal(fig, datafile_name, tier, since, until, metric,
+                              freqs)
+            write_figure(fig, outfile_name)
+            return
+
+    import numpy as np
+
+    records = ModemTelemetry.read_telemetry(datafile_name, since or 0, until)
+    freq_list = ModemTelemetry.load_freqs(datafile_name)
+    logger.debug(f'{len(records)} telemetry records for '
+                 f'{len(freq_list)} freqs')
+
+    for freq_index in np.unique(records['freq_index']):
+        freq = freq_list[freq_index]
+        if not freq or (freqs is not None and f'{freq} Hz' not in freqs):
+            # (unlocked channels from before they were left out read 0 Hz)
+            continue
+        channel = records[records['freq_index'] == freq_index]
+        times = channel['time']
+        values = channel[metric.lower()]
+        step = math.ceil(len(channel) / points)
+        if step > 1:
+            # average each run of step polls (the last may be shorter)
+            # into one point
+            starts = np.arange(0, len(channel), step)
+            runs = np.diff(np.append(starts, len(channel)))
+            times = times[starts]
+            values = np.add.reduceat(values.astype(np.float64), starts) / runs
+        fig.add_trace(go.Scattergl(x=times.astype('datetime64[s]'),
+                                   y=values, mode='lines',
+                                   name=f'{freq} Hz'))
+    write_figure(fig, outfile_name)
+
+
+def add_rollup_signal(fig, datafile_name, tier, since, until, metric,
+                      freqs=None):
+    """ Add a trace per frequency of the mean SNR (or Power) of each
+        bucket of the rollup tier with its min to max as error bars.
+    """
+    import plotly.graph_objects as go
+
+    if metric == 'SNR':
+        low, total, high = (ModemRollup.SNR_MIN, ModemRollup.SNR_SUM,
+                            ModemRollup.SNR_MAX)
+    else:
+        low, total, high = (ModemRollup.POWER_MIN, ModemRollup.POWER_SUM,
+                            ModemRollup.POWER_MAX)
+    series = {}
+    for start, buckets in ModemRollup.read_rollup(datafile_name, tier, since,
+                                                  until):
+        for freq, stats in buckets.items():
+            samples = stats[ModemRollup.SAMPLES]
+            if samples and (freqs is None or freq in freqs):
+                X, Y, above, below = series.setdefault(freq,
+                                                       ([], [], [], []))
+                mean = stats[total] / samples
+                X.append(ISO_time(start))
+                Y.append(mean)
+                above.append(stats[high] - mean)
+                below.append(mean - stats[low])
+    for freq in sorted(series, key=lambda freq: int(freq.rstrip(' Hz'))):
+        X, Y, above, below = series[freq]
+        fig.add_trace(go.Scattergl(
+            x=X, y=Y, mode='lines', name=freq,
+            error_y=dict(type='data', symmetric=False, array=above,
+                         arrayminus=below)))
+
+
+def write_figure(fig, outfile_name=None):
+    """ Show the figure or write it as HTML to outfile_name """
     if outfile_name is None:
         fig.show()
     else:
@@ -120,14 +608,61 @@ if __name__ == "__main__":
                         version=f'{parser.prog} 1.0')
     parser.add_argument('-l', '--log',
                         help='optional log file (will be appended)')
-    parser.add_argument('-d', '--datafile', help='file name of data store',
-                        default='ModemData.json')
+    parser.add_argument('-d', '--datafile', action='append',
+                        help='file name of data store (default'
+                        ' ModemData.json), or NAME=FILE; repeat it to merge'
+                        ' several stores into one error chart')
+    parser.add_argument('-D', '--days', type=int, default=None,
+                        help='display only the last DAYS days, including any'
+                        ' archived data (default all data in the store)')
+    parser.add_argument('--since', type=ModemStore.parse_time,
+                        help='display only from SINCE on: seconds since'
+                        ' epoch, a UTC time like 2020-10-06T14:35 or a'
+                        ' time ago like 36h (overrides --days)')
+    parser.add_argument('--until', type=ModemStore.parse_time,
+                        help='display only up to UNTIL (same forms)')
+    parser.add_argument('-F', '--freq', type=int, action='append',
+                        help='display only this channel frequency in Hz'
+                        ' (may be repeated)')
+    parser.add_argument('-S', '--signal', choices=['SNR', 'Power'],
+                        help='display the channel SNR or Power history'
+                        ' (needs ModemCheck -T) instead of errors')
+    parser.add_argument('-H', '--heatmap',
+                        choices=ERR_TYPES + ['Total'],
+                        help='display a heatmap of the errors of this type'
+                        ' (needs NumPy) instead of each error')
+    parser.add_argument('-b', '--bins', type=int, default=500,
+                        help='maximum time buckets in the heatmap')
+    parser.add_argument('-w', '--width', type=int, default=None,
+                        help='chart width in pixels; use the hourly, daily'
+                        ' or weekly rollups (needs ModemCheck -R) that fit'
+                        ' (with several stores, the most time buckets,'
+                        ' default 1000)')
+    parser.add_argument('-N', '--normalize', choices=NORMALIZE,
+                        help='with several stores, scale each so its'
+                        ' largest bucket is 1 (peak) or to its share of'
+                        ' its errors (share)')
+    parser.add_argument('-i', '--incremental', action='store_true',
+                        help='keep the chart data in DATAFILE'
+                        f'{ModemStore.DISPLAY_CACHE_SUFFIX} and only add new'
+                        ' errors')
+    parser.add_argument('-B', '--backend', choices=['plotly', 'svg'],
+                        default='plotly',
+                        help='interactive plotly chart or a small static'
+                        ' SVG one (errors only, .svg outfile for bare SVG)')
     parser.add_argument('-o', '--outfile', nargs="*",
                         help='output file for HTML display')
+    parser.add_argument('--stats-file',
+                        help='append how long each step of the chart took'
+                        ' to this json lines file')
     args = parser.parse_args()
 
     # set up log destination and verbosity from the command line
-    logger.setLevel(logging.DEBUG)
+    # (our helper modules log through the same handlers)
+    loggers = (logger, ModemRollup.logger, ModemStore.logger,
+               ModemTelemetry.logger, ModemTimings.logger)
+    for each_logger in loggers:
+        each_logger.setLevel(logging.DEBUG)
     # create formatter
     stamped_formatter = logging.Formatter(
         '%(asctime)s::%(levelname)s::%(name)s::%(message)s')
@@ -143,7 +678,8 @@ if __name__ == "__main__":
             ch.setLevel(logging.WARNING)
         else:
             ch.setLevel(logging.CRITICAL)
-        logger.addHandler(ch)
+        for each_logger in loggers:
+            each_logger.addHandler(ch)
     elif args.quiet and args.verbose:
         parser.error('Can not have both verbose and quiet unless using a log' +
                      ' file (in which case the quiet applies to the console.)')
@@ -165,15 +701,52 @@ if __name__ == "__main__":
     elif args.verbose >= 3:
         # go for our current max of debug
         fh.setLevel(logging.DEBUG)
-    logger.addHandler(fh)
+    for each_logger in loggers:
+        each_logger.addHandler(fh)
 
     if args.outfile is None:
-        display_stats(args.datafile)
+        outfile_name = None
+    elif len(args.outfile) > 1:
+        parser.error('Only one output file is allowed.')
+    elif args.outfile == []:
+        # Use a default file
+        outfile_name = 'ModemDisplay.html'
     else:
-        if len(args.outfile) > 1:
-            parser.error('Only one output file is allowed.')
-        if args.outfile == []:
-            # Use a default file
-            display_stats(args.datafile, 'ModemDisplay.html')
-        else:
-            display_stats(args.datafile, args.outfile[0])
+        outfile_name = args.outfile[0]
+    freqs = None
+    if args.freq:
+        freqs = {f'{freq} Hz' for freq in args.freq}
+    window = {'since': args.since, 'until': args.until, 'freqs': freqs}
+    timings = None
+    if args.stats_file:
+        timings = ModemTimings.Timings(args.stats_file)
+    if args.backend == 'svg' and (args.signal or args.heatmap):
+        parser.error('The svg backend only draws the error chart.')
+    sources = []
+    for datafile in args.datafile or ['ModemData.json']:
+        (name, _, file_name) = datafile.rpartition('=')
+        sources.append((name or os.path.splitext(
+            os.path.basename(file_name))[0], file_name))
+    args.datafile = sources[0][1]
+    if len(sources) > 1:
+        if args.signal or args.heatmap or args.incremental:
+            parser.error('Several data stores can only be merged into the'
+                         ' error chart.')
+        display_merged(sources, outfile_name, args.days,
+                       args.width or 1000, normalize=args.normalize,
+                       timings=timings, backend=args.backend, **window)
+    elif args.signal:
+        display_signal(args.datafile, outfile_name, args.days, args.signal,
+                       width=args.width, **window)
+    elif args.heatmap:
+        display_heatmap(args.datafile, outfile_name, args.days, args.heatmap,
+                        args.bins, **window)
+    elif args.incremental:
+        display_stats(args.datafile, outfile_name, args.days,
+                      ModemStore.display_cache_name(args.datafile),
+                      args.width, timings=timings, backend=args.backend,
+                      **window)
+    else:
+        display_stats(args.datafile, outfile_name, args.days,
+                      width=args.width, timings=timings,
+                      backend=args.backend, **window)
@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+#
+# ModemExport.py - Export what ModemCheck.py has recorded for a Netgear
+#                  CM1150V Cable Modem as a table for offline analysis.
+#
+# Copyright (c) 2020 Howard Holm
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+""" ModemExport A script to write the ModemCheck data store out as one
+    tidy table, a row per poll (or error or rollup bucket) and frequency:
+
+        timestamp, frequency_hz, channel_id, correctable, uncorrectable,
+        snr, power
+
+    as Parquet or an Arrow IPC file (which need pyarrow) or CSV, ready for
+    pandas and friends.  The rows are streamed and written in batches so
+    the store is never all in memory.
+"""
+import argparse
+import csv
+import itertools
+import json
+import logging
+import os
+import ModemRollup
+import ModemStore
+import ModemTelemetry
+from operator import itemgetter
+from time import gmtime, strftime
+
+COLUMNS = ('timestamp', 'frequency_hz', 'channel_id', 'correctable',
+           'uncorrectable', 'snr', 'power')
+FORMATS = {'parquet': '.parquet', 'arrow': '.arrow', 'csv': '.csv'}
+SOURCES = ['auto', 'polls', 'errors'] + list(ModemRollup.TIERS)
+# a leading _ (or .) keeps pyarrow and pandas from reading it as a part
+STATE_NAME = '_export_state.json'
+BATCH = 65536
+
+logger = logging.getLogger(__name__)
+
+
+def error_rows(event_time, data_points, freqs=None):
+    """ Rows of the new errors of one running_data entry """
+    for freq, (correctable, uncorrectable) in data_points.items():
+        if freqs is None or freq in freqs:
+            yield (event_time, int(freq.rstrip(' Hz')), None, correctable,
+                   uncorrectable, None, None)
+
+
+def iter_errors(datafile_name, since=None, until=None, freqs=None):
+    """ Rows of the errors in the data store (no channel, SNR or Power) """
+    for event_time, data_points in ModemStore.iter_events(
+            datafile_name, since, until, freqs):
+        yield from error_rows(event_time, data_points)
+
+
+def iter_polls(datafile_name, since=None, until=None, freqs=None):
+    """ Rows of every poll's channels from the telemetry (see ModemCheck
+        -T) with that poll's new errors from the data store joined on.
+        Both are in time order, so they're merged as they're read.  Errors
+        from before there was telemetry (or on a frequency it doesn't
+        have) get rows of their own.
+    """
+    freq_list = ModemTelemetry.load_freqs(datafile_name)
+    events = ModemStore.iter_events(datafile_name, since, until, freqs)
+    pending = next(events, None)
+    for poll_time, records in itertools.groupby(
+            ModemTelemetry.iter_telemetry(datafile_name, since or 0, until),
+            key=itemgetter(0)):
+        while pending is not None and pending[0] < poll_time:
+            yield from error_rows(*pending)
+            pending = next(events, None)
+        data_points = {}
+        if pending is not None and pending[0] == poll_time:
+            data_points = dict(pending[1])
+            pending = next(events, None)
+        for (_, freq_index, channel_id, power, snr, _,
+             _) in records:
+            freq = freq_list[freq_index]
+            if not freq or (freqs is not None and f'{freq} Hz' not in freqs):
+                # (unlocked channels from before they were left out)
+                continue
+            (correctable, uncorrectable) = data_points.pop(f'{freq} Hz',
+                                                           (0, 0))
+            yield (poll_time, freq, channel_id, correctable, uncorrectable,
+                   round(snr, 2), round(power, 2))
+        yield from error_rows(poll_time, data_points)
+    while pending is not None:
+        yield from error_rows(*pending)
+        pending = next(events, None)
+
+
+def iter_rollups(datafile_name, tier, since=None, until=None, freqs=None,
+                 closed_only=False):
+    """ Rows of the rollup tier's buckets, with the error totals and the
+        mean SNR and Power.  closed_only leaves out the bucket still
+        being filled.
+    """
+    open_start = None
+    if closed_only:
+        try:
+            with open(os.path.join(ModemRollup.rollup_name(datafile_name),
+                                   ModemRollup.OPEN_NAME)) as f:
+                open_start = json.load(f).get(tier, (None, None))[0]
+        except FileNotFoundError:
+            pass
+    for start, buckets in ModemRollup.read_rollup(datafile_name, tier,
+                                                  since or 0, until):
+        # read_rollup includes the bucket since falls in
+        if start == open_start or start < (since or 0):
+            continue
+        for freq, stats in buckets.items():
+            if freqs is not None and freq not in freqs:
+                continue
+            samples = stats[ModemRollup.SAMPLES]
+            yield (start, int(freq.rstrip(' Hz')), None,
+                   stats[ModemRollup.CORRECTABLE],
+                   stats[ModemRollup.UNCORRECTABLE],
+                   round(stats[ModemRollup.SNR_SUM] / samples, 2)
+                   if samples else None,
+                   round(stats[ModemRollup.POWER_SUM] / samples, 2)
+                   if samples else None)
+
+
+def pick_source(datafile_name, source='auto'):
+    """ source, or for 'auto' 'polls' if there's telemetry and 'errors'
+        if there isn't
+    """
+    if source == 'auto':
+        source = 'polls' if os.path.exists(
+            ModemTelemetry.telemetry_name(datafile_name)) else 'errors'
+    return source
+
+
+def iter_rows(datafile_name, source='auto', since=None, until=None,
+              freqs=None, closed_only=False):
+    """ Rows (in COLUMNS order) of source, one of SOURCES (see
+        pick_source for 'auto'.)
+    """
+    source = pick_source(datafile_name, source)
+    logger.debug(f'Exporting {source} of {datafile_name}')
+    if source == 'polls':
+        return iter_polls(datafile_name, since, until, freqs)
+    if source == 'errors':
+        return iter_errors(datafile_name, since, until, freqs)
+    return iter_rollups(datafile_name, source, since, until, freqs,
+                        closed_only)
+
+
+class CsvWriter:
+    """ Writes batches of rows as CSV with ISO UTC timestamps """
+
+    def __init__(self, outfile_name):
+        self.file = open(outfile_name, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(COLUMNS)
+        self.stamps = {}
+
+    def write(self, rows):
+        stamps = self.stamps
+        for row in rows:
+            if row[0] not in stamps:
+                if len(stamps) > BATCH:
+                    stamps.clear()
+                stamps[row[0]] = strftime('%Y-%m-%dT%H:%M:%SZ',
+                                          gmtime(row[0]))
+        self.writer.writerows((stamps[row[0]],) + row[1:] for row in rows)
+
+    def close(self):
+        self.file.close()
+
+
+class ArrowWriter:
+    """ Writes batches of rows as Parquet (one row group each) or as
+        record batches of an Arrow IPC file.  Needs pyarrow.
+    """
+
+    def __init__(self, outfile_name, out_format='parquet'):
+        # pyarrow is only needed for these formats
+        import pyarrow as pa
+
+        self.pa = pa
+        self.schema = pa.schema([
+            ('timestamp', pa.timestamp('s', tz='UTC')),
+            ('frequency_hz', pa.int64()),
+            ('channel_id', pa.int16()),
+            ('correctable', pa.int64()),
+            ('uncorrectable', pa.int64()),
+            ('snr', pa.float32()),
+            ('power', pa.float32())])
+        if out_format == 'parquet':
+            import pyarrow.parquet as pq
+            self.sink = None
+            self.writer = pq.ParquetWriter(outfile_name, self.schema)
+        else:
+            self.sink = pa.OSFile(outfile_name, 'wb')
+            self.writer = pa.ipc.new_file(self.sink, self.schema)
+        self.parquet = out_format == 'parquet'
+
+    def write(self, rows):
+        pa = self.pa
+        batch = pa.RecordBatch.from_arrays(
+            [pa.array(column, type=field.type)
+             for column, field in zip(zip(*rows), self.schema)],
+            names=self.schema.names)
+        if self.parquet:
+            self.writer.write_table(pa.Table.from_batches([batch]))
+        else:
+            self.writer.write_batch(batch)
+
+    def close(self):
+        self.writer.close()
+        if self.sink is not None:
+            self.sink.close()
+
+
+def write_rows(rows, outfile_name, out_format='csv', batch=BATCH):
+    """ Write rows to outfile_name (via a temporary file, so a reader never
+        sees half of one) batch rows at a time.  Returns (rows written,
+        first timestamp, last timestamp); nothing is written if there are
+        no rows.
+    """
+    rows = iter(rows)
+    chunk = list(itertools.islice(rows, batch))
+    if not chunk:
+        return (0, None, None)
+    first = chunk[0][0]
+    (head, tail) = os.path.split(outfile_name)
+    tmp_name = os.path.join(head, '.' + tail + '.tmp')
+    if out_format == 'csv':
+        writer = CsvWriter(tmp_name)
+    else:
+        writer = ArrowWriter(tmp_name, out_format)
+    count = 0
+    try:
+        while chunk:
+            writer.write(chunk)
+            count += len(chunk)
+            last = chunk[-1][0]
+            chunk = list(itertools.islice(rows, batch))
+    finally:
+        writer.close()
+    os.replace(tmp_name, outfile_name)
+    return (count, first, last)
+
+
+def run_export(datafile_name, outfile_name, out_format='csv', source='auto',
+               since=None, until=None, freqs=None, incremental=False,
+               batch=BATCH):
+    """ Export source (see iter_rows) from since to until on freqs to
+        outfile_name in out_format.  If incremental, outfile_name is a
+        directory that gets a part-<first timestamp> file of just the rows
+        after those already exported (as recorded in its STATE_NAME.)
+        Returns the number of rows written.
+    """
+    logger.debug(f'In run_export: '
+                 f'datafile_name={datafile_name} '
+                 f'outfile_name={outfile_name} out_format={out_format} '
+                 f'source={source} since={since} until={until} '
+                 f'freqs={freqs} incremental={incremental}')
+    if not incremental:
+        (count, first, last) = write_rows(
+            iter_rows(datafile_name, source, since, until, freqs),
+            outfile_name, out_format, batch)
+        logger.info(f'Exported {count} rows to {outfile_name}')
+        return count
+
+    source = pick_source(datafile_name, source)
+    os.makedirs(outfile_name, exist_ok=True)
+    state_name = os.path.join(outfile_name, STATE_NAME)
+    try:
+        with open(state_name) as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        state = {}
+    if state and (state['source'], state['format']) != (
+            source, out_format):
+        raise ValueError(f'{outfile_name} holds a {state["format"]} export'
+                         f' of {state["source"]}')
+    if 'last_time' in state:
+        since = max(since or 0, state['last_time'] + 1)
+    part_name = os.path.join(outfile_name, 'part-{}' + FORMATS[out_format])
+    # The part is named for its first row once that's known, so a run
+    # repeated after a crash replaces the part rather than adding one.
+    rows = iter_rows(datafile_name, source, since, until, freqs,
+                     closed_only=True)
+    first_row = next(rows, None)
+    if first_row is None:
+        logger.info(f'Nothing new to export to {outfile_name}')
+        return 0
+    part_name = part_name.format(
+        strftime('%Y%m%dT%H%M%SZ', gmtime(first_row[0])))
+    (count, first, last) = write_rows(itertools.chain([first_row], rows),
+                                      part_name, out_format, batch)
+    state.update({'source': source, 'format': out_format, 'last_time': last})
+    ModemStore.atomic_write_json(state_name, state)
+    logger.info(f'Exported {count} new rows to {part_name}')
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Export the modem data store as a table",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        default=None, help='display only critical errors')
+    parser.add_argument('-v', '--verbose', action='count', default=None,
+                        help='optional multiple increases in logging')
+    parser.add_argument('-V', '--version', action='version',
+                        version=f'{parser.prog} 1.0')
+    parser.add_argument('-l', '--log',
+                        help='optional log file (will be appended)')
+    parser.add_argument('-d', '--datafile', help='file name of data store',
+                        default='ModemData.json')
+    parser.add_argument('-s', '--source', choices=SOURCES, default='auto',
+                        help='a row per poll and channel (polls, needs'
+                        ' ModemCheck -T), per error (errors) or per'
+                        ' rollup bucket (hour, day or week, needs'
+                        ' ModemCheck -R); auto is polls if there is'
+                        ' telemetry, otherwise errors')
+    parser.add_argument('--since', type=ModemStore.parse_time,
+                        help='only rows from SINCE on: seconds since'
+                        ' epoch, a UTC time like 2020-10-06T14:35 or a'
+                        ' time ago like 36h')
+    parser.add_argument('--until', type=ModemStore.parse_time,
+                        help='only rows up to UNTIL (same forms)')
+    parser.add_argument('-F', '--freq', type=int, action='append',
+                        help='only this channel frequency in Hz'
+                        ' (may be repeated)')
+    parser.add_argument('-f', '--format', choices=list(FORMATS),
+                        default='csv',
+                        help='output format; parquet and arrow need pyarrow')
+    parser.add_argument('-b', '--batch', type=int, default=BATCH,
+                        help='rows written at a time (and per Parquet row'
+                        ' group)')
+    parser.add_argument('-i', '--incremental', action='store_true',
+                        help='OUTFILE is a directory; add a part file of'
+                        ' just the rows since the last export to it')
+    parser.add_argument('-o', '--outfile',
+                        help='output file (or directory with -i), default'
+                        ' DATAFILE with the format\'s extension (or'
+                        ' .export)')
+    args = parser.parse_args()
+
+    # set up log destination and verbosity from the command line
+    # (our helper modules log through the same handlers)
+    loggers = (logger, ModemRollup.logger, ModemStore.logger,
+               ModemTelemetry.logger)
+    for each_logger in loggers:
+        each_logger.setLevel(logging.DEBUG)
+    # create formatter
+    stamped_formatter = logging.Formatter(
+        '%(asctime)s::%(levelname)s::%(name)s::%(message)s')
+    unstamped_formatter = logging.Formatter(
+        '%(levelname)s:%(name)s:%(message)s')
+    if args.log:
+        # set up a log file and stderr
+        fh = logging.FileHandler(args.log)
+        fh.setFormatter(stamped_formatter)
+        ch = logging.StreamHandler()
+        ch.setFormatter(unstamped_formatter)
+        if not args.quiet:
+            ch.setLevel(logging.WARNING)
+        else:
+            ch.setLevel(logging.CRITICAL)
+        for each_logger in loggers:
+            each_logger.addHandler(ch)
+    elif args.quiet and args.verbose:
+        parser.error('Can not have both verbose and quiet unless using a log' +
+                     ' file (in which case the quiet applies to the console.)')
+    else:
+        # file handler is stderr
+        fh = logging.StreamHandler()
+        fh.setFormatter(unstamped_formatter)
+    if args.quiet:
+        fh.setLevel(logging.CRITICAL)
+    if args.verbose is None:
+        # default of error
+        fh.setLevel(logging.ERROR)
+    elif args.verbose == 1:
+        # level up one to info
+        fh.setLevel(logging.WARNING)
+    elif args.verbose == 2:
+        # go for our current max of debug
+        fh.setLevel(logging.INFO)
+    elif args.verbose >= 3:
+        # go for our current max of debug
+        fh.setLevel(logging.DEBUG)
+    for each_logger in loggers:
+        each_logger.addHandler(fh)
+
+    outfile_name = args.outfile
+    if outfile_name is None:
+        outfile_name = os.path.splitext(args.datafile)[0] + (
+            '.export' if args.incremental else FORMATS[args.format])
+    freqs = None
+    if args.freq:
+        freqs = {f'{freq} Hz' for freq in args.freq}
+    if args.format != 'csv':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            parser.error(f'{args.format} output needs pyarrow'
+                         ' (pip install pyarrow)')
+    try:
+        run_export(args.datafile, outfile_name, args.format, args.source,
+                   args.since, args.until, freqs, args.incremental,
+                   args.batch)
+    except ValueError as err:
+        parser.error(str(err))
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+#
+# ModemImport.py - Rebuild (or fill gaps in) a ModemCheck.py data store from
+#                  the ModemCheck.py log files.
+#
+# Copyright (c) 2020 Howard Holm
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+""" ModemImport A script to read ModemCheck logs (including logrotate's
+    gzipped ones) and merge what they recorded back into the data store:
+
+    - "New errors at" records go into running_data like ModemCheck's own
+    - reboots, counter resets, channels dropping out and SNR or Power
+      warnings, which only ever went to the log, go into
+      <datafile>.events, one json line [time, kind, frequency, value] each
+
+    The logs are read oldest first (by logrotate's numbering or dates)
+    and streamed a line at a time, so memory doesn't grow with them.
+    Errors already in the data store, and events older than the last one
+    in the events file or already there, are skipped, so importing
+    overlapping logs twice changes nothing.  Stop ModemCheck while
+    importing, as it would overwrite the store.  A damaged data store is
+    moved aside (to <datafile>.damaged) and rebuilt from its journal,
+    archive and the logs.  A fleet's log has every modem's messages
+    prefixed with its name, so give the modem to import with --modem.
+"""
+import argparse
+import ast
+import calendar
+import gzip
+import json
+import logging
+import ModemStore
+import os
+import re
+
+EVENTS_SUFFIX = '.events'
+DAMAGED_SUFFIX = '.damaged'
+
+ISO_TIME = r'(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\dZ)'
+# (kind, pattern) of the log messages we want; the time is group 1
+MESSAGES = (
+    ('errors', re.compile(r'New errors at ' + ISO_TIME + r': (\{.*\})')),
+    ('snr_low', re.compile(
+        ISO_TIME + r': Channel (\d+ Hz) +SNR too low: (\S+)')),
+    ('power_high', re.compile(
+        ISO_TIME + r': Channel (\d+ Hz) +Power too high: (\S+)')),
+    ('reboot', re.compile(r'Modem Rebooted at ' + ISO_TIME)),
+)
+# messages without a time of their own; they get the poll's time
+UNTIMED = (
+    ('counter_reset', re.compile(r'Channel: (\d+ Hz) Negative errors')),
+    ('channel_unused', re.compile(r'Channel: (\d+ Hz) no longer util')),
+)
+REFRESHED = re.compile(r'Data refreshed System Time \((\d+)\)')
+# logrotate's rotated logs, name.N[.gz] (higher N older) or with dateext
+# name-YYYYMMDD[.gz]
+ROTATED = re.compile(r'([.-])(\d+)(\.gz)?$')
+
+logger = logging.getLogger(__name__)
+
+
+def events_name(datafile_name):
+    return datafile_name + EVENTS_SUFFIX
+
+
+def iso_epoch(iso_time):
+    """ Seconds since epoch of one of ModemCheck's ISO_TIME strings
+        (a lot quicker than strptime, which matters for years of logs)
+    """
+    return calendar.timegm((int(iso_time[0:4]), int(iso_time[5:7]),
+                            int(iso_time[8:10]), int(iso_time[11:13]),
+                            int(iso_time[14:16]), int(iso_time[17:19])))
+
+
+def log_age(log_name):
+    """ Sort key putting logrotate's logs oldest first, each live log
+        after its rotated ones
+    """
+    match = ROTATED.search(log_name)
+    if match is None:
+        return (log_name, 1, 0)
+    base = log_name[:match.start()]
+    if match.group(1) == '.':
+        return (base, 0, -int(match.group(2)))
+    return (base, 0, int(match.group(2)))
+
+
+def read_lines(log_names):
+    """ Generator of the lines of each log, gunzipping .gz ones """
+    for log_name in log_names:
+        opener = gzip.open if log_name.endswith('.gz') else open
+        logger.info(f'Reading {log_name}')
+        with opener(log_name, 'rt', errors='replace') as f:
+            yield from f
+
+
+def modem_lines(lines, modem):
+    """ Generator of the messages from a fleet log for the named modem
+        (see ModemCheck.fetch_stats), without the name
+    """
+    marker = f':{modem}: '
+    for line in lines:
+        start = line.find(marker)
+        if start >= 0:
+            yield line[start + len(marker):]
+
+
+def parse_records(lines, modem=None):
+    """ Generator of ('errors', time, new_data text) and (kind, time,
+        frequency, value) event records from log lines.  Untimed
+        messages wait for the poll's "Data refreshed" line for its time.
+        The new_data text is left for the caller to parse (with
+        ast.literal_eval) only if it's needed.  If modem is given only
+        that modem's lines of a fleet log are used.
+    """
+    if modem is not None:
+        lines = modem_lines(lines, modem)
+    pending = []
+    for line in lines:
+        if 'Data refreshed System Time' in line:
+            match = REFRESHED.search(line)
+            if match:
+                for kind, freq in pending:
+                    yield (kind, int(match.group(1)), freq, None)
+                pending = []
+            continue
+        if 'Channel: ' in line:
+            for kind, pattern in UNTIMED:
+                match = pattern.search(line)
+                if match:
+                    pending.append((kind, match.group(1)))
+                    break
+            continue
+        for kind, pattern in MESSAGES:
+            match = pattern.search(line)
+            if not match:
+                continue
+            try:
+                event_time = iso_epoch(match.group(1))
+                if kind == 'errors':
+                    yield (kind, event_time, match.group(2))
+                elif kind == 'reboot':
+                    yield (kind, event_time, None, None)
+                else:
+                    yield (kind, event_time, match.group(2),
+                           float(match.group(3)))
+            except ValueError:
+                logger.warning(f'Skipping unreadable log line: {line!r}')
+            break
+    # polls cut off by the end of the logs
+    for kind, freq in pending:
+        logger.debug(f'No poll time for {kind} {freq}')
+
+
+def load_or_recover(datafile_name):
+    """ (prev_run, running_data, boot_time, uptime) of the data store,
+        empty if there isn't one.  If the snapshot (or then the
+        checkpoint) can't be read it's moved aside so what's left (the
+        journal) can be rebuilt on.  Returns whether anything was moved
+        aside as well.
+    """
+    recovered = False
+    for damaged in (datafile_name, ModemStore.checkpoint_name(datafile_name),
+                    None):
+        try:
+            return ModemStore.load_store(datafile_name) + (recovered,)
+        except FileNotFoundError:
+            return ({}, {}, 0, 0, recovered)
+        except ValueError as err:
+            if damaged is None:
+                raise
+            if os.path.exists(damaged):
+                logger.error(f'Moving damaged {damaged} aside to '
+                             f'{damaged + DAMAGED_SUFFIX}: {err}')
+                os.replace(damaged, damaged + DAMAGED_SUFFIX)
+                recovered = True
+
+
+class ArchiveIndex:
+    """ Which event times are in the archive, reading one day's segment
+        at a time (logs are in time order, so that's once per day)
+    """
+
+    def __init__(self, datafile_name):
+        self.datafile_name = datafile_name
+        self.day_start = None
+        self.times = set()
+
+    def __contains__(self, event_time):
+        day_start = int(event_time) - int(event_time) % ModemStore.DAY
+        if day_start != self.day_start:
+            self.day_start = day_start
+            try:
+                with open(ModemStore.segment_name(self.datafile_name,
+                                                  day_start)) as f:
+                    self.times = set(json.load(f))
+            except FileNotFoundError:
+                self.times = set()
+        return str(event_time) in self.times
+
+
+def import_logs(datafile_name, log_names, modem=None):
+    """ Merge the records in log_names (of the named modem, if it's a
+        fleet's log) into the data store datafile_name (which need not
+        exist yet.)  Returns (errors added, events added.)
+    """
+    (prev_run, running_data, boot_time, uptime,
+     recovered) = load_or_recover(datafile_name)
+    archived = ArchiveIndex(datafile_name)
+    # Events come in time order, so rather than remember every one, skip
+    # those before the latest we have and the ones we have at its time
+    cursor = None
+    at_cursor = set()
+    try:
+        with open(events_name(datafile_name)) as f:
+            for line in f:
+                event = tuple(json.loads(line))
+                if cursor is None or event[0] > cursor:
+                    (cursor, at_cursor) = (event[0], set())
+                if event[0] == cursor:
+                    at_cursor.add(event)
+    except FileNotFoundError:
+        pass
+
+    added = 0
+    new_events = []
+    log_names = sorted(log_names, key=log_age)
+    for record in parse_records(read_lines(log_names), modem):
+        if record[0] == 'errors':
+            (_, event_time, text) = record
+            key = str(event_time)
+            if key in running_data or key in archived:
+                continue
+            try:
+                new_data = ast.literal_eval(text)
+            except (ValueError, SyntaxError):
+                logger.warning(f'Skipping unreadable errors at {key}: {text}')
+                continue
+            running_data[key] = {freq: list(counts)
+                                 for freq, counts in new_data.items()}
+            added += 1
+        else:
+            (kind, event_time, freq, value) = record
+            event = (event_time, kind, freq, value)
+            if cursor is not None and event_time < cursor:
+                continue
+            if event_time != cursor:
+                (cursor, at_cursor) = (event_time, set())
+            if event not in at_cursor:
+                at_cursor.add(event)
+                new_events.append(event)
+    if added or recovered:
+        ModemStore.save_store(datafile_name, prev_run, running_data,
+                              boot_time, uptime)
+    if added:
+        # Events may have gone in before the ones ModemDisplay -i has
+        # already drawn, so it has to start over
+        try:
+            os.remove(ModemStore.display_cache_name(datafile_name))
+        except FileNotFoundError:
+            pass
+    if new_events:
+        with open(events_name(datafile_name), 'a') as f:
+            for event in sorted(new_events, key=lambda event: event[0]):
+                f.write(json.dumps(event, separators=(',', ':')) + '\n')
+    return (added, len(new_events))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Rebuild a ModemCheck data store from its logs",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        default=None, help='display only critical errors')
+    parser.add_argument('-v', '--verbose', action='count', default=None,
+                        help='optional multiple increases in logging')
+    parser.add_argument('-V', '--version', action='version',
+                        version=f'{parser.prog} 1.0')
+    parser.add_argument('-l', '--log',
+                        help='optional log file (will be appended)')
+    parser.add_argument('-d', '--datafile', help='file name of data store',
+                        default='ModemData.json')
+    parser.add_argument('-m', '--modem',
+                        help='name of the modem to import from a fleet\'s'
+                        ' log')
+    parser.add_argument('logs', nargs='+',
+                        help='ModemCheck log files (.gz ones are unzipped)')
+    args = parser.parse_args()
+
+    # set up log destination and verbosity from the command line
+    # (our helper modules log through the same handlers)
+    loggers = (logger, ModemStore.logger)
+    for each_logger in loggers:
+        each_logger.setLevel(logging.DEBUG)
+    # create formatter
+    stamped_formatter = logging.Formatter(
+        '%(asctime)s::%(levelname)s::%(name)s::%(message)s')
+    unstamped_formatter = logging.Formatter(
+        '%(levelname)s:%(name)s:%(message)s')
+    if args.log:
+        # set up a log file and stderr
+        fh = logging.FileHandler(args.log)
+        fh.setFormatter(stamped_formatter)
+        ch = logging.StreamHandler()
+        ch.setFormatter(unstamped_formatter)
+        if not args.quiet:
+            ch.setLevel(logging.WARNING)
+        else:
+            ch.setLevel(logging.CRITICAL)
+        for each_logger in loggers:
+            each_logger.addHandler(ch)
+    elif args.quiet and args.verbose:
+        parser.error('Can not have both verbose and quiet unless using a log' +
+                     ' file (in which case the quiet applies to the console.)')
+    else:
+        # file handler is stderr
+        fh = logging.StreamHandler()
+        fh.setFormatter(unstamped_formatter)
+    if args.quiet:
+        fh.setLevel(logging.CRITICAL)
+    if args.verbose is None:
+        # default of error
+        fh.setLevel(logging.ERROR)
+    elif args.verbose == 1:
+        # level up one to info
+        fh.setLevel(logging.WARNING)
+    elif args.verbose == 2:
+        # go for our current max of debug
+        fh.setLevel(logging.INFO)
+    elif args.verbose >= 3:
+        # go for our current max of debug
+        fh.setLevel(logging.DEBUG)
+    for each_logger in loggers:
+        each_logger.addHandler(fh)
+
+    (added, events) = import_logs(args.datafile, args.logs,
+                                  args.modem)
+    logger.info(f'Added {added} error records and {events} events to '
+                f'{args.datafile}')
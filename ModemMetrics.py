@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+#
+# ModemMetrics.py - Serve the latest modem readings to scrapers over HTTP.
+#
+# Copyright (c) 2020 Howard Holm
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+""" ModemMetrics - serve the latest poll of each modem over HTTP.
+
+    A MetricsServer answers on its own (daemon) threads, so a slow or stuck
+    scraper never holds up a poll.  Each poll publishes its readings and
+    the pages are rendered right then, so a scrape only hands back bytes
+    already in memory:
+
+        /metrics        Prometheus text format
+        /metrics.json   the same as json
+
+    The error counts are the modem's own counters (since it booted) plus
+    the new errors recorded since this process started.
+"""
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# (name, type, help, key in the freqs channel dict)
+CHANNEL_METRICS = (
+    ('modem_channel_power_dbmv', 'gauge', 'Downstream channel power',
+     'Power'),
+    ('modem_channel_snr_db', 'gauge', 'Downstream channel SNR', 'SNR'),
+    ('modem_channel_correctable_errors', 'gauge',
+     'Correctable errors reported by the modem since it booted',
+     'Correctable Err'),
+    ('modem_channel_uncorrectable_errors', 'gauge',
+     'Uncorrectable errors reported by the modem since it booted',
+     'Uncorrectable Err'),
+)
+# (name, type, help, key in the modem dict)
+MODEM_METRICS = (
+    ('modem_up', 'gauge', '1 if the last poll reached the modem', 'up'),
+    ('modem_last_poll_time_seconds', 'gauge',
+     'Modem time of the last successful poll', 'time'),
+    ('modem_boot_time_seconds', 'gauge', 'When the modem last booted',
+     'boot_time'),
+    ('modem_uptime_seconds', 'gauge', 'Modem uptime at the last poll',
+     'uptime'),
+)
+RECORDED_METRICS = (
+    ('modem_recorded_correctable_errors_total', 'counter',
+     'New correctable errors recorded since ModemCheck started', 0),
+    ('modem_recorded_uncorrectable_errors_total', 'counter',
+     'New uncorrectable errors recorded since ModemCheck started', 1),
+)
+
+
+def label(value):
+    """ value escaped for a Prometheus label """
+    return (str(value).replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def render_prometheus(modems):
+    """ Prometheus text exposition of modems (see MetricsServer.publish) """
+    lines = []
+    for name, kind, text, key in MODEM_METRICS:
+        lines.append(f'# HELP {name} {text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for modem, data in modems.items():
+            if data.get(key) is not None:
+                lines.append(f'{name}{{modem="{label(modem)}"}} {data[key]}')
+    for name, kind, text, key in CHANNEL_METRICS:
+        lines.append(f'# HELP {name} {text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for modem, data in modems.items():
+            for freq, chan in data['freqs'].items():
+                lines.append(
+                    f'{name}{{modem="{label(modem)}",'
+                    f'frequency_hz="{freq.rstrip(" Hz")}",'
+                    f'channel="{chan["Channel ID"]}"}} {chan[key]}')
+    for name, kind, text, index in RECORDED_METRICS:
+        lines.append(f'# HELP {name} {text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for modem, data in modems.items():
+            for freq, counts in data['recorded'].items():
+                lines.append(
+                    f'{name}{{modem="{label(modem)}",'
+                    f'frequency_hz="{freq.rstrip(" Hz")}"}} {counts[index]}')
+    return ('\n'.join(lines) + '\n').encode()
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """ Hands back the pages the server last rendered """
+
+    def do_GET(self):
+        pages = self.server.pages
+        if self.path not in pages:
+            self.send_error(404)
+            return
+        (content_type, body) = pages[self.path]
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(f'{self.address_string()} {format % args}')
+
+
+class MetricsServer:
+    """ HTTP server on address:port for the modems' latest readings
+        (and the timings histograms, if given), running on background
+        threads until close()
+    """
+
+    def __init__(self, port, address='localhost', timings=None):
+        self.modems = {}
+        self.timings = timings  # ModemTimings.Timings to serve, if any
+        self.lock = threading.Lock()    # polls may publish concurrently
+        self.httpd = ThreadingHTTPServer((address, port), MetricsHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.pages = {}
+        self.render()
+        self.thread = threading.Thread(target=self.httpd.serve_forever,
+                                       name='ModemMetrics', daemon=True)
+        self.thread.start()
+        logger.info(f'Serving metrics on {address}:{port}')
+
+    def publish(self, modem, poll_time, boot_time, uptime, freqs, new_data):
+        """ Record a successful poll of modem: its freqs dict (as built by
+            ModemCheck.fetch_stats) and the new errors found
+        """
+        with self.lock:
+            data = self.modems.setdefault(modem, {'recorded': {}})
+            data.update(up=1, time=poll_time, boot_time=boot_time,
+                        uptime=uptime,
+                        freqs={freq: dict(chan)
+                               for freq, chan in freqs.items()})
+            recorded = data['recorded']
+            for freq, (correctable, uncorrectable) in new_data.items():
+                counts = recorded.setdefault(freq, [0, 0])
+                counts[0] += correctable
+                counts[1] += uncorrectable
+            self.render()
+
+    def unreachable(self, modem):
+        """ Record a failed poll of modem (its last readings are kept) """
+        with self.lock:
+            data = self.modems.setdefault(modem, {'recorded': {},
+                                                  'freqs': {}})
+            data['up'] = 0
+            self.render()
+
+    def render(self):
+        """ Build the pages once per poll rather than once per scrape """
+        text = render_prometheus(self.modems)
+        data = {'modems': self.modems}
+        if self.timings is not None:
+            text += ('\n'.join(self.timings.prometheus()) + '\n').encode()
+            data['timings'] = self.timings.summary()
+        # a fresh dict swapped in whole, so handlers never see a partial one
+        self.httpd.pages = {
+            '/metrics': ('text/plain; version=0.0.4; charset=utf-8', text),
+            '/metrics.json': ('application/json', json.dumps(data).encode()),
+        }
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+#
+# ModemParse.py - Parse the DocsisStatus.htm page of a Netgear CM1150V
+#                 Cable Modem for ModemCheck.py.
+#
+# Copyright (c) 2020 Howard Holm
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+""" ModemParse - turn DocsisStatus.htm into typed channel records.
+
+    The modem pushes its data as '|' separated strings assigned to
+    "var tagValueList" in a JavaScript function per table, e.g.
+    InitDsTableTagValue() for the downstream channels.  parse_status()
+    finds every such list in a single forward scan of the page and only
+    copies the lists themselves out of it.  Lists on commented out lines
+    (the JavaScript has examples) are skipped and, as with the original
+    regular expressions, if a function has more than one list the last
+    one wins.
+"""
+import logging
+from collections import namedtuple
+from pytimeparse.timeparse import timeparse
+from time import mktime, strptime
+
+logger = logging.getLogger(__name__)
+
+DsChannel = namedtuple('DsChannel', [
+    'channel', 'status', 'modulation', 'channel_id', 'frequency', 'power',
+    'snr', 'correctable', 'uncorrectable'])
+UsChannel = namedtuple('UsChannel', [
+    'channel', 'status', 'channel_type', 'channel_id', 'symbol_rate',
+    'frequency', 'power'])
+DsOfdmChannel = namedtuple('DsOfdmChannel', [
+    'channel', 'status', 'profiles', 'channel_id', 'frequency', 'power',
+    'snr', 'subcarriers', 'unerrored', 'correctable', 'uncorrectable'])
+UsOfdmaChannel = namedtuple('UsOfdmaChannel', [
+    'channel', 'status', 'profiles', 'channel_id', 'frequency', 'power'])
+ModemStatus = namedtuple('ModemStatus', [
+    'sys_time', 'uptime', 'downstream', 'upstream', 'ds_ofdm', 'us_ofdma'])
+
+_FUNCTION = b'function '
+_TAG_LIST = b"var tagValueList = '"
+_TAG_END = b"';"
+_COMMENT = b'//'
+
+# positions in the InitTagValue list
+_SYS_TIME = 10
+_UPTIME = 14
+
+
+def _text(field):
+    return field.decode('utf-8')
+
+
+def _number(field, kind=float):
+    """ Convert a field like b'40.4' or b'40.4 dB' (units are dropped) """
+    try:
+        return kind(field)
+    except ValueError:
+        return kind(field.partition(b' ')[0])
+
+
+def _frequency(field):
+    """ Frequency in Hz from b'531000000 Hz' """
+    return int(field.partition(b' ')[0])
+
+
+def _ds_channel(row):
+    return DsChannel(int(row[0]), _text(row[1]), _text(row[2]), int(row[3]),
+                     _frequency(row[4]), _number(row[5]), _number(row[6]),
+                     int(row[7]), int(row[8]))
+
+
+def _us_channel(row):
+    return UsChannel(int(row[0]), _text(row[1]), _text(row[2]), int(row[3]),
+                     _text(row[4]), _frequency(row[5]), _number(row[6]))
+
+
+def _ds_ofdm_channel(row):
+    return DsOfdmChannel(int(row[0]), _text(row[1]), _text(row[2]),
+                         int(row[3]), _frequency(row[4]), _number(row[5]),
+                         _number(row[6]), _text(row[7]), int(row[8]),
+                         int(row[9]), int(row[10]))
+
+
+def _us_ofdma_channel(row):
+    return UsOfdmaChannel(int(row[0]), _text(row[1]), _text(row[2]),
+                          int(row[3]), _frequency(row[4]), _number(row[5]))
+
+
+# function holding each channel table: (field name, fields per row, record)
+TABLES = {
+    b'InitDsTableTagValue': ('downstream', 9, _ds_channel),
+    b'InitUsTableTagValue': ('upstream', 7, _us_channel),
+    b'InitDsOfdmTableTagValue': ('ds_ofdm', 11, _ds_ofdm_channel),
+    b'InitUsOfdmaTableTagValue': ('us_ofdma', 6, _us_ofdma_channel),
+}
+
+
+def tag_lists(content):
+    """ Return {function name: memoryview of its tagValueList} for the page,
+        scanning it once from front to back.
+    """
+    view = memoryview(content)
+    lists = {}
+    function = None
+    pos = 0
+    while True:
+        tag = content.find(_TAG_LIST, pos)
+        if tag < 0:
+            break
+        func_start = content.rfind(_FUNCTION, pos, tag)
+        if func_start >= 0:
+            func_start += len(_FUNCTION)
+            function = bytes(view[func_start:content.find(
+                b'(', func_start, tag)]).strip()
+        start = tag + len(_TAG_LIST)
+        end = content.find(_TAG_END, start)
+        if end < 0:
+            break  # truncated page
+        commented = content.find(
+            _COMMENT, content.rfind(b'\n', pos, tag) + 1, tag) >= 0
+        if function is not None and not commented:
+            lists[function] = view[start:end]
+        pos = end + len(_TAG_END)
+    return lists
+
+
+def parse_table(tag_list, width, record):
+    """ Turn a 'count|field|field|...|' list into count records """
+    fields = tag_list.tobytes().split(b'|')
+    count = int(fields[0])
+    if len(fields) < 1 + count * width:
+        raise ValueError(f'Table of {count} channels has only '
+                         f'{len(fields) - 1} fields')
+    return [record(fields[i:i + width])
+            for i in range(1, 1 + count * width, width)]
+
+
+def parse_status(content):
+    """ Parse the bytes of DocsisStatus.htm into a ModemStatus.
+        Raises ValueError if the downstream channels or the modem time
+        can't be found (e.g. while the modem is rebooting.)  The other
+        tables are empty if they're missing or damaged.
+    """
+    lists = tag_lists(content)
+    tables = {}
+    for function, (name, width, record) in TABLES.items():
+        try:
+            tables[name] = parse_table(lists[function], width, record)
+        except (KeyError, ValueError, IndexError) as err:
+            if name == 'downstream':
+                raise ValueError('Web page contained bogus status data.')
+            logger.debug(f'No usable {name} table: {err!r}')
+            tables[name] = []
+    try:
+        boot_list = lists[b'InitTagValue'].tobytes().split(b'|')
+        # Convert the "Current System Time" to seconds since epoch
+        sys_time = int(mktime(strptime(_text(boot_list[_SYS_TIME]))))
+        uptime = timeparse(_text(boot_list[_UPTIME]))
+    except (KeyError, ValueError, IndexError):
+        raise ValueError('Web page contained bogus time data.')
+    if uptime is None:
+        raise ValueError('Web page contained bogus time data.')
+    return ModemStatus(sys_time, uptime, **tables)
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+#
+# ModemQuery.py - Pull a time range of the errors ModemCheck.py has recorded
+#                 for a Netgear CM1150V Cable Modem out of its data store.
+#
+# Copyright (c) 2020 Howard Holm
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+""" ModemQuery A simple script to pull a time range (and optionally just
+    some channels) of the ModemCheck data store out as CSV, JSON or a
+    ModemDisplay chart, reading only the parts of the store that cover it
+"""
+import argparse
+import csv
+import json
+import logging
+import ModemStore
+import sys
+from time import gmtime, strftime
+
+logger = logging.getLogger(__name__)
+
+
+def write_csv(running_data, out):
+    """ One row per event and frequency """
+    writer = csv.writer(out)
+    writer.writerow(['time', 'epoch', 'frequency_hz', 'correctable',
+                     'uncorrectable'])
+    for event_time, data_points in running_data.items():
+        stamp = strftime('%Y-%m-%dT%H:%M:%SZ', gmtime(event_time))
+        for freq, (correctable, uncorrectable) in data_points.items():
+            writer.writerow([stamp, event_time, int(freq.rstrip(' Hz')),
+                             correctable, uncorrectable])
+
+
+def run_query(datafile_name, since=None, until=None, freqs=None,
+              out_format='csv', outfile_name=None):
+    """ Write the errors from since to until on freqs to outfile (stdout if
+        None) in out_format, one of 'csv', 'json' or 'plot'
+    """
+    logger.debug(f'In run_query: '
+                 f'datafile_name={datafile_name} '
+                 f'since={since} until={until} freqs={freqs} '
+                 f'out_format={out_format} outfile_name={outfile_name}')
+    if out_format == 'plot':
+        # plotly is only needed for charts
+        import ModemDisplay
+        ModemDisplay.display_stats(datafile_name, outfile_name, since=since,
+                                   until=until, freqs=freqs)
+        return
+    running_data = ModemStore.query(datafile_name, since, until, freqs)
+    logger.info(f'{len(running_data)} events from {datafile_name}')
+    out = sys.stdout if outfile_name is None else open(outfile_name, 'w',
+                                                       newline='')
+    try:
+        if out_format == 'json':
+            json.dump(running_data, out)
+            out.write('\n')
+        else:
+            write_csv(running_data, out)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Pull a time range of modem errors out of the data store",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        default=None, help='display only critical errors')
+    parser.add_argument('-v', '--verbose', action='count', default=None,
+                        help='optional multiple increases in logging')
+    parser.add_argument('-V', '--version', action='version',
+                        version=f'{parser.prog} 1.0')
+    parser.add_argument('-l', '--log',
+                        help='optional log file (will be appended)')
+    parser.add_argument('-d', '--datafile', help='file name of data store',
+                        default='ModemData.json')
+    parser.add_argument('--since', type=ModemStore.parse_time,
+                        help='only errors from SINCE on: seconds since'
+                        ' epoch, a UTC time like 2020-10-06T14:35 or a'
+                        ' time ago like 36h')
+    parser.add_argument('--until', type=ModemStore.parse_time,
+                        help='only errors up to UNTIL (same forms)')
+    parser.add_argument('-F', '--freq', type=int, action='append',
+                        help='only this channel frequency in Hz'
+                        ' (may be repeated)')
+    parser.add_argument('-f', '--format', choices=['csv', 'json', 'plot'],
+                        default='csv',
+                        help='output format; plot is a ModemDisplay chart')
+    parser.add_argument('-o', '--outfile',
+                        help='output file (default stdout, or the browser'
+                        ' for a plot)')
+    args = parser.parse_args()
+
+    # set up log destination and verbosity from the command line
+    # (our helper modules log through the same handlers)
+    loggers = (logger, ModemStore.logger)
+    for each_logger in loggers:
+        each_logger.setLevel(logging.DEBUG)
+    # create formatter
+    stamped_formatter = logging.Formatter(
+        '%(asctime)s::%(levelname)s::%(name)s::%(message)s')
+    unstamped_formatter = logging.Formatter(
+        '%(levelname)s:%(name)s:%(message)s')
+    if args.log:
+        # set up a log file and stderr
+        fh = logging.FileHandler(args.log)
+        fh.setFormatter(stamped_formatter)
+        ch = logging.StreamHandler()
+        ch.setFormatter(unstamped_formatter)
+        if not args.quiet:
+            ch.setLevel(logging.WARNING)
+        else:
+            ch.setLevel(logging.CRITICAL)
+        for each_logger in loggers:
+            each_logger.addHandler(ch)
+    elif args.quiet and args.verbose:
+        parser.error('Can not have both verbose and quiet unless using a log' +
+                     ' file (in which case the quiet applies to the console.)')
+    else:
+        # file handler is stderr
+        fh = logging.StreamHandler()
+        fh.setFormatter(unstamped_formatter)
+    if args.quiet:
+        fh.setLevel(logging.CRITICAL)
+    if args.verbose is None:
+        # default of error
+        fh.setLevel(logging.ERROR)
+    elif args.verbose == 1:
+        # level up one to info
+        fh.setLevel(logging.WARNING)
+    elif args.verbose == 2:
+        # go for our current max of debug
+        fh.setLevel(logging.INFO)
+    elif args.verbose >= 3:
+        # go for our current max of debug
+        fh.setLevel(logging.DEBUG)
+    for each_logger in loggers:
+        each_logger.addHandler(fh)
+
+    freqs = None
+    if args.freq:
+        freqs = {f'{freq} Hz' for freq in args.freq}
+    run_query(args.datafile, args.since, args.until, freqs, args.format,
+              args.outfile)
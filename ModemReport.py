@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+#
+# ModemReport.py - Build a set of daily, weekly and monthly error charts
+#                  for one or more modems watched by ModemCheck.py.
+#
+# Copyright (c) 2020 Howard Holm
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+""" ModemReport A script to build a report set from ModemCheck data stores:
+    a chart of the errors for every day, week (starting Monday) and month
+    of every modem, plus an index page linking them all.
+
+    Each data store (and its archive) is read once and split into its
+    windows, and the charts are drawn on a pool of processes, one per
+    core.  A digest of each window's data is kept in the report
+    directory, so later runs only redraw the windows whose data changed
+    (usually just the current day, week and month.)
+"""
+import argparse
+import calendar
+import hashlib
+import html
+import json
+import logging
+import ModemDisplay
+import ModemRollup
+import ModemStore
+import os
+from concurrent.futures import ProcessPoolExecutor
+from time import gmtime, strftime, strptime
+
+MANIFEST_NAME = 'report-manifest.json'
+PERIODS = ('day', 'week', 'month')
+
+logger = logging.getLogger(__name__)
+
+
+def window_start(period, event_time):
+    """ Start (seconds since epoch) of the period holding event_time """
+    if period == 'day':
+        return event_time - event_time % ModemStore.DAY
+    if period == 'week':
+        return event_time - (event_time - ModemRollup.WEEK_OFFSET) % (
+            7 * ModemStore.DAY)
+    day = gmtime(event_time)
+    return (event_time - event_time % ModemStore.DAY -
+            (day.tm_mday - 1) * ModemStore.DAY)
+
+
+def page_name(modem, period, start):
+    """ Path of the page (relative to the report directory) """
+    form = '%Y-%m' if period == 'month' else '%Y-%m-%d'
+    return f'{modem}/{period}-{strftime(form, gmtime(start))}.html'
+
+
+def parse_page_name(name):
+    """ (modem, period, start) of a page_name """
+    (modem, _, base) = name.rpartition('/')
+    (period, _, date) = os.path.splitext(base)[0].partition('-')
+    form = '%Y-%m' if period == 'month' else '%Y-%m-%d'
+    return (modem, period, calendar.timegm(strptime(date, form)))
+
+
+def manifest_pages(report_dir, manifest):
+    """ {modem: {period: [(start, name)]}} of every page in the manifest
+        that's on disk, whichever run drew it
+    """
+    pages = {}
+    for name in manifest:
+        if not os.path.exists(os.path.join(report_dir, name)):
+            continue
+        try:
+            (modem, period, start) = parse_page_name(name)
+        except ValueError:
+            logger.warning(f'Unrecognized page {name} in the manifest')
+            continue
+        pages.setdefault(modem, {}).setdefault(period, []).append(
+            (start, name))
+    return pages
+
+
+def split_windows(running_data, periods=PERIODS):
+    """ {(period, start): running_data style dict} of the events in each
+        window of each period
+    """
+    windows = {}
+    for event_time, data_points in running_data.items():
+        for period in periods:
+            windows.setdefault((period, window_start(period, event_time)),
+                               {})[event_time] = data_points
+    return windows
+
+
+def digest(window_data, backend):
+    return hashlib.sha1(json.dumps(
+        [backend, window_data], separators=(',', ':')).encode()).hexdigest()
+
+
+def render_page(job):
+    """ Draw one window's chart (run in a worker process) """
+    (outfile_name, title, window_data, backend) = job
+    traces = {err_type: [[], [], [], []]
+              for err_type in ModemDisplay.ERR_TYPES}
+    max_size = ModemDisplay.add_events(traces, window_data.items())
+    os.makedirs(os.path.dirname(outfile_name), exist_ok=True)
+    ModemDisplay.write_errors(traces, max_size, outfile_name, backend,
+                              title=title)
+    return outfile_name
+
+
+def write_index(report_dir, pages):
+    """ index.html linking pages, {modem: {period: [(start, name)]}} """
+    lines = ['<!DOCTYPE html>', '<html><head><meta charset="utf-8">',
+             '<title>CM1150V Packet Errors</title></head><body>',
+             '<h1>CM1150V Packet Errors</h1>']
+    for modem, periods in sorted(pages.items()):
+        lines.append(f'<h2>{html.escape(modem)}</h2>')
+        for period in PERIODS:
+            if period not in periods:
+                continue
+            lines.append(f'<h3>By {period}</h3><p>')
+            form = '%Y-%m' if period == 'month' else '%Y-%m-%d'
+            lines.append(' '.join(
+                f'<a href="{html.escape(name)}">'
+                f'{strftime(form, gmtime(start))}</a>'
+                for start, name in sorted(periods[period], reverse=True)))
+            lines.append('</p>')
+    lines.append('</body></html>')
+    tmp_name = os.path.join(report_dir, 'index.html.tmp')
+    with open(tmp_name, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(tmp_name, os.path.join(report_dir, 'index.html'))
+
+
+def build_reports(modems, report_dir, periods=PERIODS, backend='plotly',
+                  workers=None, since=None):
+    """ Build (or bring up to date) the report set in report_dir for
+        modems, a list of (name, datafile), and return the number of
+        pages drawn.  workers defaults to the number of cores.  With since
+        only the windows since is in and later ones are drawn.
+    """
+    os.makedirs(report_dir, exist_ok=True)
+    manifest_name = os.path.join(report_dir, MANIFEST_NAME)
+    try:
+        with open(manifest_name) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        manifest = {}
+
+    # each period's first window is read from its start, so it's whole;
+    # earlier windows overlapping that read aren't, and are left alone
+    firsts = {period: None if since is None else window_start(period, since)
+              for period in periods}
+    query_since = None if since is None else min(firsts.values())
+    jobs = []
+    for modem, datafile_name in modems:
+        running_data = ModemStore.query(datafile_name, query_since)
+        logger.info(f'{modem}: {len(running_data)} events in '
+                    f'{datafile_name}')
+        for (period, start), window_data in split_windows(
+                running_data, periods).items():
+            if firsts[period] is not None and start < firsts[period]:
+                continue
+            name = page_name(modem, period, start)
+            window_digest = digest(window_data, backend)
+            outfile_name = os.path.join(report_dir, name)
+            if (manifest.get(name) == window_digest and
+                    os.path.exists(outfile_name)):
+                continue
+            manifest[name] = window_digest
+            title = (f'{modem} Packet Errors, {period} of '
+                     f'{strftime("%Y-%m-%d", gmtime(start))}')
+            jobs.append((outfile_name, title, window_data, backend))
+    logger.info(f'{len(jobs)} pages to draw')
+
+    if jobs:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for outfile_name in executor.map(render_page, jobs):
+                logger.debug(f'Wrote {outfile_name}')
+    # every page drawn so far, not just this run's periods and modems
+    write_index(report_dir, manifest_pages(report_dir, manifest))
+    # only once every page is drawn, so a failed run is redone next time
+    ModemStore.atomic_write_json(manifest_name, manifest)
+    return len(jobs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Build daily, weekly and monthly error charts",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        default=None, help='display only critical errors')
+    parser.add_argument('-v', '--verbose', action='count', default=None,
+                        help='optional multiple increases in logging')
+    parser.add_argument('-V', '--version', action='version',
+                        version=f'{parser.prog} 1.0')
+    parser.add_argument('-l', '--log',
+                        help='optional log file (will be appended)')
+    parser.add_argument('-d', '--datafile', action='append',
+                        help='data store to report on, as NAME=FILE or'
+                        ' just FILE (may be repeated)')
+    parser.add_argument('-f', '--fleet',
+                        help='ModemCheck fleet json file listing the modems')
+    parser.add_argument('-p', '--period', action='append', choices=PERIODS,
+                        help='only these periods (default all)')
+    parser.add_argument('--since', type=ModemStore.parse_time,
+                        help='only windows from SINCE on (see ModemQuery)')
+    parser.add_argument('-B', '--backend', choices=['plotly', 'svg'],
+                        default='plotly', help='chart backend')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='processes drawing charts (default one per'
+                        ' core)')
+    parser.add_argument('-o', '--outdir', default='ModemReport',
+                        help='report directory')
+    args = parser.parse_args()
+
+    # set up log destination and verbosity from the command line
+    # (our helper modules log through the same handlers)
+    loggers = (logger, ModemDisplay.logger, ModemStore.logger)
+    for each_logger in loggers:
+        each_logger.setLevel(logging.DEBUG)
+    # create formatter
+    stamped_formatter = logging.Formatter(
+        '%(asctime)s::%(levelname)s::%(name)s::%(message)s')
+    unstamped_formatter = logging.Formatter(
+        '%(levelname)s:%(name)s:%(message)s')
+    if args.log:
+        # set up a log file and stderr
+        fh = logging.FileHandler(args.log)
+        fh.setFormatter(stamped_formatter)
+        ch = logging.StreamHandler()
+        ch.setFormatter(unstamped_formatter)
+        if not args.quiet:
+            ch.setLevel(logging.WARNING)
+        else:
+            ch.setLevel(logging.CRITICAL)
+        for each_logger in loggers:
+            each_logger.addHandler(ch)
+    elif args.quiet and args.verbose:
+        parser.error('Can not have both verbose and quiet unless using a log' +
+                     ' file (in which case the quiet applies to the console.)')
+    else:
+        # file handler is stderr
+        fh = logging.StreamHandler()
+        fh.setFormatter(unstamped_formatter)
+    if args.quiet:
+        fh.setLevel(logging.CRITICAL)
+    if args.verbose is None:
+        # default of error
+        fh.setLevel(logging.ERROR)
+    elif args.verbose == 1:
+        # level up one to info
+        fh.setLevel(logging.WARNING)
+    elif args.verbose == 2:
+        # go for our current max of debug
+        fh.setLevel(logging.INFO)
+    elif args.verbose >= 3:
+        # go for our current max of debug
+        fh.setLevel(logging.DEBUG)
+    for each_logger in loggers:
+        each_logger.addHandler(fh)
+
+    modems = []
+    if args.fleet:
+        with open(args.fleet) as f:
+            modems += [(modem['name'], modem['datafile'])
+                       for modem in json.load(f)]
+    for datafile in args.datafile or []:
+        (name, _, file_name) = datafile.rpartition('=')
+        modems.append((name or os.path.splitext(
+            os.path.basename(file_name))[0], file_name))
+    if not modems:
+        parser.error('Give at least one --datafile or a --fleet.')
+    drawn = build_reports(modems, args.outdir, args.period or PERIODS,
+                          args.backend, args.jobs, args.since)
+    logger.info(f'Drew {drawn} pages in {args.outdir}')
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+#
+# ModemRollup.py - Hourly, daily and weekly per frequency summaries kept
+#                   up to date by ModemCheck.py as it polls.
+#
+# Copyright (c) 2020 Howard Holm
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+""" ModemRollup - pre-aggregated summaries of the modem data.
+
+    For each tier (hour, day and week) and each frequency we keep the sum
+    of the correctable and uncorrectable errors and the min/mean/max of
+    the SNR and Power seen during the bucket.  Buckets are updated as each
+    poll comes in.  When a poll lands in a new bucket the finished one is
+    appended as a json line to its partition in <datafile>.rollup/
+    (hour-YYYY-MM.jsonl, day-YYYY.jsonl or week.jsonl) and the buckets
+    still being filled are kept in <datafile>.rollup/open.json.
+
+    Each line is [bucket start, {freq: stats}] with stats as listed in
+    STATS.  The min/sum/max are over the samples polls, so the mean is
+    sum / samples.
+
+    New rollups are seeded with the errors already in the data store and
+    its archive, so charts of the rollups still reach back before -R was
+    turned on (those buckets have no SNR or Power samples.)
+"""
+import json
+import logging
+import os
+from time import gmtime, strftime
+import ModemStore
+
+ROLLUP_SUFFIX = '.rollup'
+OPEN_NAME = 'open.json'
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+WEEK = 7 * DAY
+# the epoch was a Thursday, so shift weeks to start on Monday
+WEEK_OFFSET = 4 * DAY
+TIERS = {'hour': HOUR, 'day': DAY, 'week': WEEK}
+POLL_INTERVAL = 300
+
+STATS = ('correctable', 'uncorrectable', 'snr_min', 'snr_sum', 'snr_max',
+         'power_min', 'power_sum', 'power_max', 'samples')
+CORRECTABLE, UNCORRECTABLE, SNR_MIN, SNR_SUM, SNR_MAX, \
+    POWER_MIN, POWER_SUM, POWER_MAX, SAMPLES = range(len(STATS))
+
+logger = logging.getLogger(__name__)
+
+
+def rollup_name(datafile_name):
+    return datafile_name + ROLLUP_SUFFIX
+
+
+def bucket_start(tier, poll_time):
+    offset = WEEK_OFFSET if tier == 'week' else 0
+    return poll_time - (poll_time - offset) % TIERS[tier]
+
+
+def partition_name(datafile_name, tier, start):
+    """ The file holding the tier's bucket starting at start """
+    if tier == 'hour':
+        part = strftime('hour-%Y-%m', gmtime(start))
+    elif tier == 'day':
+        part = strftime('day-%Y', gmtime(start))
+    else:
+        part = 'week'
+    return os.path.join(rollup_name(datafile_name), part + '.jsonl')
+
+
+def new_stats():
+    return [0, 0, None, 0.0, None, None, 0.0, None, 0]
+
+
+class RollupWriter:
+    """ Keeps the open buckets of one data store up to date.  If there are
+        no rollups yet they're seeded with the errors in the store (and
+        archive) up to seed_until.
+    """
+
+    def __init__(self, datafile_name, seed_until=None):
+        self.datafile_name = datafile_name
+        os.makedirs(rollup_name(datafile_name), exist_ok=True)
+        try:
+            with open(os.path.join(rollup_name(datafile_name),
+                                   OPEN_NAME)) as f:
+                self.open = json.load(f)
+        except FileNotFoundError:
+            self.open = {}
+            self.seed(seed_until)
+
+    def seed(self, until=None):
+        """ Add the errors in the data store (and archive) up to until,
+            a day of the archive at a time.  Returns the bytes written.
+        """
+        size = 0
+        events = 0
+        for event_time, new_data in ModemStore.iter_events(
+                self.datafile_name, until=until):
+            size += self.add(event_time, {}, new_data)
+            events += 1
+        if events:
+            logger.info(f'Seeded rollups with {events} error records')
+            size += self.save_open()
+        return size
+
+    def save_open(self):
+        return ModemStore.atomic_write_json(
+            os.path.join(rollup_name(self.datafile_name), OPEN_NAME),
+            self.open)
+
+    def close_bucket(self, tier):
+        start, freqs = self.open.pop(tier)
+        line = json.dumps((start, freqs), separators=(',', ':')) + '\n'
+        with open(partition_name(self.datafile_name, tier, start), 'a') as f:
+            f.write(line)
+        logger.debug(f'Closed {tier} bucket {start}')
+        return len(line)
+
+    def add_poll(self, poll_time, freqs, new_data):
+        """ Add one poll: freqs is the fetch_stats freqs dict (for SNR and
+            Power) and new_data its new errors by frequency.  Returns the
+            number of bytes written.
+        """
+        return self.add(poll_time, freqs, new_data) + self.save_open()
+
+    def add(self, poll_time, freqs, new_data):
+        """ add_poll without saving the open buckets """
+        size = 0
+        for tier in TIERS:
+            start = bucket_start(tier, poll_time)
+            if tier in self.open and self.open[tier][0] != start:
+                size += self.close_bucket(tier)
+            if tier not in self.open:
+                self.open[tier] = [start, {}]
+            buckets = self.open[tier][1]
+            for freq, chan in freqs.items():
+                stats = buckets.setdefault(freq, new_stats())
+                for value, low, total, high in (
+                        (chan['SNR'], SNR_MIN, SNR_SUM, SNR_MAX),
+                        (chan['Power'], POWER_MIN, POWER_SUM, POWER_MAX)):
+                    stats[low] = value if stats[low] is None else min(
+                        stats[low], value)
+                    stats[high] = value if stats[high] is None else max(
+                        stats[high], value)
+                    stats[total] += value
+                stats[SAMPLES] += 1
+            for freq, (correctable, uncorrectable) in new_data.items():
+                stats = buckets.setdefault(freq, new_stats())
+                stats[CORRECTABLE] += correctable
+                stats[UNCORRECTABLE] += uncorrectable
+        return size
+
+
+def read_rollup(datafile_name, tier, since=0, until=None):
+    """ List of (bucket start, {freq: stats}) of the tier's buckets that
+        overlap since..until in time order, including the open bucket.
+    """
+    first = partition_name(datafile_name, tier, bucket_start(tier, since))
+    last = None if until is None else partition_name(
+        datafile_name, tier, bucket_start(tier, until))
+    buckets = {}
+    try:
+        parts = sorted(os.listdir(rollup_name(datafile_name)))
+    except FileNotFoundError:
+        return []
+    for part in parts:
+        part = os.path.join(rollup_name(datafile_name), part)
+        if not (part.endswith('.jsonl') and
+                os.path.basename(part).startswith(tier) and first <= part and
+                (last is None or part <= last)):
+            continue
+        with open(part) as f:
+            for line in f:
+                try:
+                    start, freqs = json.loads(line)
+                except ValueError:
+                    continue  # torn line from a crash
+                buckets[start] = freqs  # a repeat (after a crash) wins
+    try:
+        with open(os.path.join(rollup_name(datafile_name), OPEN_NAME)) as f:
+            start, freqs = json.load(f).get(tier, (None, None))
+            if start is not None:
+                buckets[start] = freqs
+    except FileNotFoundError:
+        pass
+    low = bucket_start(tier, since)
+    return [(start, buckets[start]) for start in sorted(buckets)
+            if start >= low and (until is None or start <= until)]
+
+
+def first_bucket(datafile_name):
+    """ Start of the oldest weekly bucket, or None if there are none """
+    buckets = read_rollup(datafile_name, 'week')
+    return buckets[0][0] if buckets else None
+
+
+def choose_tier(span, width):
+    """ The finest tier with no more buckets over span seconds than width
+        pixels, None if the raw polls fit, or 'week' if nothing does.
+    """
+    if span / POLL_INTERVAL <= width:
+        return None
+    for tier, size in TIERS.items():
+        if span / size <= width:
+            return tier
+    return 'week'
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+#
+# ModemSchedule.py - Drift free (and adaptive) poll scheduling.
+#
+# Copyright (c) 2020 Howard Holm
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+""" ModemSchedule - when to poll next.
+
+    Polls are kept on a fixed grid of the monotonic clock, lined up with
+    the wall clock (every 300 seconds means on the hour, five past, and
+    so on.)  The next poll is always the next grid point, so neither the
+    time a poll takes nor its retries push later polls back, and if a
+    poll runs past grid points they're skipped rather than run late.
+
+    With a fast_interval the grid tightens to that while the line is in
+    trouble (see ModemCheck.fetch_stats) and relaxes again once it has
+    been clean for calm_after seconds.
+"""
+import logging
+import math
+from time import monotonic, time
+
+logger = logging.getLogger(__name__)
+
+
+class PollSchedule:
+    """ Adaptive fixed grid polling schedule """
+
+    def __init__(self, interval=300, fast_interval=None, calm_after=1800,
+                 name='modem'):
+        self.interval = interval
+        self.fast_interval = fast_interval
+        self.calm_after = calm_after
+        self.name = name
+        # the monotonic time of a wall clock multiple of interval
+        self.anchor = monotonic() - time() % interval
+        self.fast = False
+        self.last_trouble = None
+
+    def current_interval(self):
+        return self.fast_interval if self.fast else self.interval
+
+    def record(self, trouble):
+        """ Note whether the last poll found trouble, switching to the
+            fast grid or back to the normal one as needed
+        """
+        now = monotonic()
+        if trouble:
+            self.last_trouble = now
+            if self.fast_interval and not self.fast:
+                self.fast = True
+                logger.info(f'{self.name}: trouble on the line, polling '
+                            f'every {self.fast_interval}s')
+        elif self.fast and now - self.last_trouble >= self.calm_after:
+            self.fast = False
+            logger.info(f'{self.name}: line clean for {self.calm_after}s, '
+                        f'polling every {self.interval}s')
+
+    def delay(self):
+        """ Seconds until the next grid point """
+        step = self.current_interval()
+        now = monotonic()
+        ticks = math.floor((now - self.anchor) / step) + 1
+        return self.anchor + ticks * step - now
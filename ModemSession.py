@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+#
+# ModemSession.py - A long lived HTTP session to the modem web interface
+#                   used by ModemCheck.py.
+#
+# Copyright (c) 2020 Howard Holm
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+""" ModemSession - keep one HTTP session to the modem across polls.
+
+    The connection (keep-alive) and the login cookies are reused from
+    poll to poll; we only log in again when the modem rejects the session.
+    Every request has connect/read timeouts and failures are retried with
+    exponential backoff and jitter up to a limit, after which the modem
+    is reported as unreachable rather than retrying forever.  A budget
+    (in seconds) caps how long one fetch may take, retries and all.
+"""
+import logging
+import random
+import requests
+from requests.auth import HTTPBasicAuth
+from time import monotonic, sleep
+
+logger = logging.getLogger(__name__)
+
+
+class ModemUnreachable(Exception):
+    """ The modem didn't answer within the allowed retries """
+    pass
+
+
+class ModemSession:
+    """ A persistent session to a modem's web interface """
+
+    def __init__(self, password, user='admin', url='http://192.168.100.1/',
+                 connect_timeout=5.0, read_timeout=30.0, retries=6,
+                 backoff=2.0, max_backoff=120.0, budget=None):
+        self.url = url
+        self.auth = HTTPBasicAuth(user, password)
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.budget = budget      # seconds allowed per fetch, None no limit
+        self.deadline = None
+        self.session = requests.Session()
+        # The status pages want the Basic auth as well as the login cookie
+        self.session.auth = self.auth
+        self.logged_in = False
+        self.status = 'unknown'  # 'ok' or 'unreachable' after a fetch
+        self.retry_count = 0     # retries used by the last fetch
+
+    def login(self):
+        """ Authenticate to the modem to (re)populate the cookie jar """
+        logger.debug(f'Logging in to {self.url}')
+        page = self.session.get(self.url, timeout=self.request_timeout())
+        page.raise_for_status()
+        self.logged_in = True
+
+    def request_timeout(self):
+        """ The timeouts for the next request, cut down to what's left of
+            the budget
+        """
+        if self.deadline is None:
+            return self.timeout
+        left = max(0.1, self.deadline - monotonic())
+        return tuple(min(limit, left) for limit in self.timeout)
+
+    def delay(self, attempt):
+        """ Exponential backoff with jitter for the given retry attempt """
+        ceiling = min(self.max_backoff, self.backoff * 2 ** attempt)
+        return random.uniform(ceiling / 2, ceiling)
+
+    def fetch(self, page_name='DocsisStatus.htm'):
+        """ Return the content of page_name, logging in only if needed.
+            Raises ModemUnreachable once the retries are used up.
+        """
+        if self.budget is not None:
+            self.deadline = monotonic() + self.budget
+        for attempt in range(self.retries + 1):
+            self.retry_count = attempt
+            try:
+                if not self.logged_in:
+                    self.login()
+                page = self.session.get(self.url + page_name,
+                                        timeout=self.request_timeout())
+                if page.status_code in (401, 403):
+                    # Session expired (e.g. modem rebooted) so log in again
+                    logger.info(f'Modem rejected session for {page_name}')
+                    self.logged_in = False
+                    self.login()
+                    page = self.session.get(self.url + page_name,
+                                            timeout=self.request_timeout())
+                if page.ok:
+                    self.status = 'ok'
+                    return page.content
+                logger.error(f'Modem returned {page.status_code} '
+                             f'for {page_name}')
+            except requests.RequestException as err:
+                logger.error(f'Error trying to access modem URL: {err}')
+                self.logged_in = False
+            if attempt == self.retries:
+                break
+            pause = self.delay(attempt)
+            if (self.deadline is not None and
+                    monotonic() + pause >= self.deadline):
+                logger.error(f'Out of time to retry {page_name}')
+                break
+            sleep(pause)
+        self.status = 'unreachable'
+        logger.error(f'Modem at {self.url} unreachable after '
+                     f'{self.retry_count + 1} attempts')
+        raise ModemUnreachable(f'Modem at {self.url} unreachable')
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+#
+# ModemStore.py - The on disk data store shared by ModemCheck.py and
+#                 ModemDisplay.py.
+#
+# Copyright (c) 2020 Howard Holm
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+""" ModemStore - read and write the ModemCheck data store.
+
+    The data store comes in two flavors.  The original "json" store is a
+    single file holding the (prev_run, running_data, boot_time, uptime)
+    tuple which gets rewritten on every poll.  The "journal" store keeps
+    that same file as a snapshot, but each poll only appends its new
+    errors to <datafile>.journal and rewrites the small <datafile>.checkpoint
+    holding prev_run and the boot state.  Every so often the journal is
+    compacted (folded into the snapshot) so that it doesn't grow forever.
+    Either way the readers see the same (prev_run, running_data, boot_time,
+    uptime) tuple.
+
+    Optionally running_data only holds the most recent days.  Older entries
+    are rolled over into one immutable archive segment per UTC day in
+    <datafile>.archive/YYYY-MM-DD.json which are only read when asked for.
+
+    So that query() can read just the part of the store in a time range,
+    <datafile>.span holds the first and last event times in the snapshot
+    and <datafile>.journal.idx holds the (time, byte offset) of each
+    journal record as fixed width binary records.
+"""
+import bisect
+import calendar
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+from time import gmtime, strftime, strptime, time
+
+JOURNAL_SUFFIX = '.journal'
+JOURNAL_INDEX_SUFFIX = '.journal.idx'
+CHECKPOINT_SUFFIX = '.checkpoint'
+ARCHIVE_SUFFIX = '.archive'
+SPAN_SUFFIX = '.span'
+DISPLAY_CACHE_SUFFIX = '.displaycache'   # ModemDisplay -i's chart data
+DAY = 24 * 60 * 60
+INDEX_RECORD = struct.Struct('<IQ')
+
+logger = logging.getLogger(__name__)
+
+
+def journal_name(datafile_name):
+    return datafile_name + JOURNAL_SUFFIX
+
+
+def journal_index_name(datafile_name):
+    return datafile_name + JOURNAL_INDEX_SUFFIX
+
+
+def span_name(datafile_name):
+    return datafile_name + SPAN_SUFFIX
+
+
+def display_cache_name(datafile_name):
+    return datafile_name + DISPLAY_CACHE_SUFFIX
+
+
+def checkpoint_name(datafile_name):
+    return datafile_name + CHECKPOINT_SUFFIX
+
+
+def archive_name(datafile_name):
+    return datafile_name + ARCHIVE_SUFFIX
+
+
+def segment_name(datafile_name, day_start):
+    return os.path.join(archive_name(datafile_name),
+                        strftime('%Y-%m-%d', gmtime(day_start)) + '.json')
+
+
+def _fsync_dir(file_name):
+    """ Make sure a rename in the directory holding file_name is on disk.
+        Not all platforms (e.g. Windows) let you open a directory, so
+        this is best effort.
+    """
+    try:
+        dir_fd = os.open(os.path.dirname(os.path.abspath(file_name)),
+                         os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+
+def atomic_write_json(file_name, data):
+    """ Write data as json to a temporary file and rename it over file_name
+        so a crash mid-write never leaves a truncated file behind.
+        Returns the number of bytes written.
+    """
+    tmp_name = file_name + '.tmp'
+    with open(tmp_name, 'w') as f:
+        json.dump(data, f, separators=(',', ':'))
+        f.flush()
+        os.fsync(f.fileno())
+        size = f.tell()
+    os.replace(tmp_name, file_name)
+    _fsync_dir(file_name)
+    return size
+
+
+def read_journal(datafile_name, offset=0):
+    """ Generator yielding (event_time, new_data) from the journal starting
+        offset bytes in.  event_time is a string to match the keys json
+        gives us back from the snapshot.  A torn line (crash mid-append)
+        is skipped.
+    """
+    try:
+        with open(journal_name(datafile_name), 'rb') as f:
+            f.seek(offset)
+            for line_num, line in enumerate(f, 1):
+                try:
+                    event_time, new_data = json.loads(line)
+                except ValueError:
+                    logger.warning(f'Skipping damaged journal record '
+                                   f'{line_num} in '
+                                   f'{journal_name(datafile_name)}')
+                    continue
+                yield (str(event_time), new_data)
+    except FileNotFoundError:
+        return
+
+
+def count_journal(datafile_name):
+    """ Number of records currently in the journal """
+    return sum(1 for _ in read_journal(datafile_name))
+
+
+def load_store(datafile_name):
+    """ Load (prev_run, running_data, boot_time, uptime) from the snapshot
+        then apply the checkpoint and replay the journal on top of it.
+        Raises FileNotFoundError if there's no data store at all.
+    """
+    found = False
+    prev_run = {}
+    running_data = {}
+    prev_boot = 0
+    prev_uptime = 0
+    try:
+        with open(datafile_name) as f:
+            (prev_run, running_data, prev_boot, prev_uptime) = json.load(f)
+            found = True
+    except FileNotFoundError:
+        pass
+    try:
+        with open(checkpoint_name(datafile_name)) as f:
+            (prev_run, prev_boot, prev_uptime) = json.load(f)
+            found = True
+    except FileNotFoundError:
+        pass
+    for event_time, new_data in read_journal(datafile_name):
+        running_data[event_time] = new_data
+        found = True
+    if not found:
+        raise FileNotFoundError(f'No data store found at {datafile_name}')
+    return (prev_run, running_data, prev_boot, prev_uptime)
+
+
+def _remove(file_name):
+    try:
+        os.remove(file_name)
+    except FileNotFoundError:
+        pass
+
+
+def save_store(datafile_name, prev_run, running_data, boot_time, uptime):
+    """ Rewrite the whole (json style) data store atomically.  Any journal
+        and checkpoint are folded in by doing so, so they're removed.  The
+        snapshot is written first so a crash before they're removed just
+        means some records get replayed twice, which is harmless since
+        they're keyed by time.  Returns the number of bytes written.
+    """
+    # The span goes first; if we crash before the snapshot is replaced the
+    # old snapshot's events outside it have already been archived.
+    size = 0
+    event_times = [int(event_time) for event_time in running_data]
+    if event_times:
+        size += atomic_write_json(span_name(datafile_name),
+                                  (min(event_times), max(event_times)))
+    else:
+        _remove(span_name(datafile_name))
+    size += atomic_write_json(datafile_name,
+                              (prev_run, running_data, boot_time, uptime))
+    _remove(checkpoint_name(datafile_name))
+    _remove(journal_name(datafile_name))
+    _remove(journal_index_name(datafile_name))
+    return size
+
+
+def append_journal(datafile_name, event_time, new_data):
+    """ Append a single poll's new errors to the journal and fsync it.
+        If a crash tore the last record, start on a fresh line so only
+        the torn record is lost.  Returns the number of bytes written.
+    """
+    record = json.dumps((event_time, new_data), separators=(',', ':'))
+    with open(journal_name(datafile_name), 'ab+') as f:
+        offset = f.seek(0, os.SEEK_END)
+        if offset:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b'\n':
+                f.write(b'\n')
+                offset += 1
+        size = f.write(record.encode('utf-8') + b'\n')
+        f.flush()
+        os.fsync(f.fileno())
+    # The index is only a hint, so it isn't fsync'd
+    with open(journal_index_name(datafile_name), 'ab') as f:
+        size += f.write(INDEX_RECORD.pack(int(event_time), offset))
+    return size
+
+
+def save_checkpoint(datafile_name, prev_run, boot_time, uptime):
+    """ Atomically rewrite the checkpoint (prev_run and boot state).
+        Its size (returned) depends only on the number of channels.
+    """
+    return atomic_write_json(checkpoint_name(datafile_name),
+                             (prev_run, boot_time, uptime))
+
+
+def compact_store(datafile_name, prev_run, running_data, boot_time, uptime):
+    """ Fold the journal into the snapshot, returning the bytes written """
+    size = save_store(datafile_name, prev_run, running_data, boot_time,
+                      uptime)
+    logger.info(f'Compacted journal into {datafile_name}')
+    return size
+
+
+def roll_over(datafile_name, running_data, cutoff):
+    """ Move every running_data entry from UTC days entirely before cutoff
+        into that day's archive segment.  running_data is changed in place
+        and the number of entries archived is returned; the caller has to
+        save the store afterwards.  Segments are never rewritten; if one
+        already exists (a crash after archiving but before saving) the
+        entries are already in it and are simply dropped.
+    """
+    cutoff -= cutoff % DAY
+    days = {}
+    for event_time in list(running_data):
+        if int(event_time) < cutoff:
+            day_start = int(event_time) - int(event_time) % DAY
+            days.setdefault(day_start, {})[str(event_time)] = running_data.pop(
+                event_time)
+    if days:
+        os.makedirs(archive_name(datafile_name), exist_ok=True)
+    for day_start, day_data in sorted(days.items()):
+        segment = segment_name(datafile_name, day_start)
+        if os.path.exists(segment):
+            logger.debug(f'Archive segment {segment} already exists')
+            continue
+        atomic_write_json(segment, day_data)
+        logger.info(f'Archived {len(day_data)} entries to {segment}')
+    return sum(len(day_data) for day_data in days.values())
+
+
+def archive_segments(datafile_name, since=0, until=None):
+    """ The file names of the archive segments covering since..until
+        (seconds since epoch) in time order
+    """
+    try:
+        segments = sorted(os.listdir(archive_name(datafile_name)))
+    except FileNotFoundError:
+        return []
+    first = strftime('%Y-%m-%d', gmtime(since)) + '.json'
+    last = None if until is None else strftime(
+        '%Y-%m-%d', gmtime(until)) + '.json'
+    return [os.path.join(archive_name(datafile_name), segment)
+            for segment in segments
+            if segment.endswith('.json') and segment >= first and (
+                last is None or segment <= last)]
+
+
+def load_archive(datafile_name, since=0, until=None):
+    """ Read the archive segments covering since..until (seconds since epoch)
+        and return a running_data style dict of their entries in that range.
+    """
+    archived = {}
+    for segment in archive_segments(datafile_name, since, until):
+        with open(segment) as f:
+            for event_time, new_data in json.load(f).items():
+                if int(event_time) >= since and (
+                        until is None or int(event_time) <= until):
+                    archived[event_time] = new_data
+    return archived
+
+
+def journal_offset(datafile_name, since):
+    """ Byte offset in the journal of the first record at or after since
+        according to the journal index, or 0 if there is no usable index.
+    """
+    try:
+        f = open(journal_index_name(datafile_name), 'rb')
+    except FileNotFoundError:
+        return 0
+    with f:
+        count = os.fstat(f.fileno()).st_size // INDEX_RECORD.size
+        if not count:
+            return 0
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as index:
+            low, high = 0, count
+            while low < high:
+                mid = (low + high) // 2
+                if INDEX_RECORD.unpack_from(
+                        index, mid * INDEX_RECORD.size)[0] < since:
+                    low = mid + 1
+                else:
+                    high = mid
+            last_offset = INDEX_RECORD.unpack_from(
+                index, (count - 1) * INDEX_RECORD.size)[1]
+            if low == count:
+                offset = last_offset  # only the unindexed tail is left
+            else:
+                offset = INDEX_RECORD.unpack_from(
+                    index, low * INDEX_RECORD.size)[1]
+    try:
+        if last_offset >= os.path.getsize(journal_name(datafile_name)):
+            return 0  # the index doesn't belong to this journal
+    except FileNotFoundError:
+        return 0
+    return offset
+
+
+def _window(entries, since, until, freqs):
+    """ The entries (a running_data style dict) from since to until, in
+        time order with int times, keeping only the freqs (if given)
+    """
+    times = sorted((int(event_time), event_time) for event_time in entries)
+    first = bisect.bisect_left(times, (since, ''))
+    last = len(times) if until is None else bisect.bisect_right(
+        times, (until, chr(0x10ffff)))
+    window = {}
+    for event_time, key in times[first:last]:
+        data_points = entries[key]
+        if freqs is not None:
+            data_points = {freq: counts for freq, counts in data_points.items()
+                           if freq in freqs}
+            if not data_points:
+                continue
+        window[event_time] = data_points
+    return window
+
+
+def _load_live(datafile_name, since, until, entries):
+    """ Add the snapshot (if it can hold events in since..until) and the
+        journal records from since on to entries
+    """
+    try:
+        with open(span_name(datafile_name)) as f:
+            (first, last) = json.load(f)
+        in_snapshot = last >= since and (until is None or first <= until)
+    except FileNotFoundError:
+        in_snapshot = True  # no span, so we have to look
+    if in_snapshot:
+        try:
+            with open(datafile_name) as f:
+                entries.update(json.load(f)[1])
+        except FileNotFoundError:
+            pass
+    for event_time, new_data in read_journal(
+            datafile_name, journal_offset(datafile_name, since)):
+        if until is not None and int(event_time) > until:
+            break
+        entries[event_time] = new_data
+    return entries
+
+
+def query(datafile_name, since=None, until=None, freqs=None):
+    """ running_data style dict, keyed by int time in time order, of the
+        errors from since to until (seconds since epoch, inclusive) on the
+        frequencies freqs (e.g. {'531000000 Hz'}, all if None.)  Only the
+        archive segments, snapshot and journal records that can hold events
+        in range are read.
+    """
+    since = 0 if since is None else since
+    entries = _load_live(datafile_name, since, until,
+                         load_archive(datafile_name, since, until))
+    return _window(entries, since, until, freqs)
+
+
+def iter_events(datafile_name, since=None, until=None, freqs=None):
+    """ Generator yielding the (event_time, data_points) query() would
+        return, in time order, reading the archive a day at a time so that
+        no more than a day of it and the snapshot and journal are in memory
+        at once.
+    """
+    since = 0 if since is None else since
+    last = -1
+    for segment in archive_segments(datafile_name, since, until):
+        with open(segment) as f:
+            window = _window(json.load(f), since, until, freqs)
+        for event_time, data_points in window.items():
+            last = event_time
+            yield (event_time, data_points)
+    # After a crash mid roll over the last day can be in both
+    window = _window(_load_live(datafile_name, since, until, {}),
+                     max(since, last + 1), until, freqs)
+    yield from window.items()
+
+
+def parse_time(text, now=None):
+    """ Seconds since epoch from either seconds since epoch, a UTC time like
+        2020-10-06, 2020-10-06T14:35 or 2020-10-06T14:35:08Z, or a time
+        ago like 90m, 24h, 7d or 2w.
+    """
+    text = text.strip()
+    if text.isdigit():
+        return int(text)
+    ago = re.fullmatch(r'(\d+)([smhdw])', text)
+    if ago:
+        seconds = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': DAY, 'w': 7 * DAY}
+        return int(now if now is not None else time()) - int(
+            ago.group(1)) * seconds[ago.group(2)]
+    for form in ('%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M', '%Y-%m-%d'):
+        try:
+            return calendar.timegm(strptime(text.rstrip('Z'), form))
+        except ValueError:
+            pass
+    raise ValueError(f'Unrecognized time: {text}')
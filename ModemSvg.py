@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+#
+# ModemSvg.py - A plotly free SVG version of the ModemDisplay error chart.
+#
+# Copyright (c) 2020 Howard Holm
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+""" ModemSvg - draw the ModemDisplay error chart as plain SVG.
+
+    No plotly (or anything else outside the standard library) is needed
+    and the page stands alone, with no plotly.min.js beside it.  The
+    errors are summed into one marker per few pixel wide column and
+    frequency for each error type, so the size of the page depends on the
+    size of the chart rather than the number of errors.  Each marker's
+    tooltip gives its total.
+"""
+import html
+import math
+from datetime import datetime
+from time import gmtime, strftime
+
+COLORS = {'Correctable': '#636efa', 'Uncorrectable': '#ef553b'}
+# for any other traces (e.g. several merged modems), as plotly cycles them
+PALETTE = ('#636efa', '#ef553b', '#00cc96', '#ab63fa', '#ffa15a', '#19d3f3',
+           '#ff6692', '#b6e880', '#ff97ff', '#fecb52')
+MARGIN = (70, 30, 50, 90)   # top, right, bottom, left
+MAX_RADIUS = 25
+COLUMN = 4      # pixels summed into each marker
+
+
+def _epoch(iso_time):
+    return datetime.fromisoformat(
+        iso_time.replace('Z', '+00:00')).timestamp()
+
+
+def _color(traces, err_type):
+    if err_type in COLORS:
+        return COLORS[err_type]
+    return PALETTE[list(traces).index(err_type) % len(PALETTE)]
+
+
+def _ticks(low, high, count):
+    """ About count evenly spaced values from low to high """
+    if high <= low:
+        return [low]
+    step = (high - low) / count
+    return [low + step * i for i in range(count + 1)]
+
+
+def _count(count):
+    """ count as the whole number of errors it was, or to 3 significant
+        figures if it's been normalized (display_merged -N)
+    """
+    if count >= 1 and abs(count - round(count)) < 1e-6:
+        return f'{round(count)}'
+    return f'{count:.3g}'
+
+
+def error_chart(traces, title='CM1150V Packet Errors', width=1200,
+                height=600):
+    """ SVG text of traces, {err_type: [X, Y, S, T]} as ModemDisplay
+        builds them (X ISO times, Y frequencies, S square root of counts)
+    """
+    (top, right, bottom, left) = MARGIN
+    plot_width = width - left - right
+    plot_height = height - top - bottom
+    times = {}
+    points = []
+    for err_type, (X, Y, S, T) in traces.items():
+        for x, y, s in zip(X, Y, S):
+            if x not in times:
+                times[x] = _epoch(x)
+            points.append((err_type, times[x], y, s * s))
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" '
+             f'height="{height}" font-family="sans-serif" font-size="12">',
+             f'<rect width="{width}" height="{height}" fill="white"/>',
+             f'<text x="{left}" y="30" font-size="17">'
+             f'{html.escape(title)}</text>']
+    if points:
+        t_low = min(point[1] for point in points)
+        t_high = max(point[1] for point in points)
+        f_low = min(point[2] for point in points)
+        f_high = max(point[2] for point in points)
+    else:
+        t_low = t_high = f_low = f_high = 0
+    t_span = (t_high - t_low) or 1
+    f_span = (f_high - f_low) or 1
+
+    def x_pos(epoch):
+        return left + (epoch - t_low) / t_span * plot_width
+
+    def y_pos(freq):
+        return top + plot_height - (freq - f_low) / f_span * plot_height
+
+    # Sum into columns
+    cells = {}
+    for err_type, epoch, freq, count in points:
+        column = int(x_pos(epoch) - left) // COLUMN * COLUMN + left
+        cells[(err_type, column, freq)] = cells.get(
+            (err_type, column, freq), 0) + count
+    largest = max(cells.values(), default=1)
+
+    # Grid and axes
+    parts.append('<g stroke="#e5ecf6">')
+    for epoch in _ticks(t_low, t_high, 6):
+        x = x_pos(epoch)
+        parts.append(f'<line x1="{x:.1f}" y1="{top}" x2="{x:.1f}" '
+                     f'y2="{top + plot_height}"/>')
+    for freq in _ticks(f_low, f_high, 8):
+        y = y_pos(freq)
+        parts.append(f'<line x1="{left}" y1="{y:.1f}" '
+                     f'x2="{left + plot_width}" y2="{y:.1f}"/>')
+    parts.append('</g>')
+    for epoch in _ticks(t_low, t_high, 6):
+        parts.append(f'<text x="{x_pos(epoch):.1f}" '
+                     f'y="{top + plot_height + 18}" text-anchor="middle">'
+                     f'{strftime("%Y-%m-%d %H:%M", gmtime(epoch))}</text>')
+    for freq in _ticks(f_low, f_high, 8):
+        parts.append(f'<text x="{left - 8}" y="{y_pos(freq) + 4:.1f}" '
+                     f'text-anchor="end">{freq / 1e6:.0f} MHz</text>')
+    parts.append(f'<text x="{left + plot_width / 2}" y="{height - 10}" '
+                 f'text-anchor="middle">Date/Time (in UTC)</text>')
+
+    # Legend, then the markers (largest first so small ones stay visible)
+    legend_x = width - right
+    for err_type in reversed(list(traces)):
+        color = _color(traces, err_type)
+        parts.append(f'<text x="{legend_x}" y="{top - 14}" '
+                     f'text-anchor="end">{html.escape(err_type)}</text>')
+        legend_x -= 8 + 7 * len(err_type)
+        parts.append(f'<circle cx="{legend_x}" cy="{top - 18}" r="5" '
+                     f'fill="{color}"/>')
+        legend_x -= 20
+    for err_type in traces:
+        parts.append(f'<g fill="{_color(traces, err_type)}" '
+                     f'fill-opacity="0.7">'
+                     f'<title>{html.escape(err_type)}</title>')
+        for (each_type, column, freq), count in sorted(
+                cells.items(), key=lambda cell: -cell[1]):
+            if each_type != err_type:
+                continue
+            # marker area goes as the square root of the errors, like plotly
+            radius = max(1.5, MAX_RADIUS * math.sqrt(math.sqrt(
+                count / largest)))
+            parts.append(f'<circle cx="{column + COLUMN / 2:g}" '
+                         f'cy="{y_pos(freq):.0f}" r="{radius:.1f}">'
+                         f'<title>{_count(count)}</title></circle>')
+        parts.append('</g>')
+    parts.append('</svg>')
+    return '\n'.join(parts)
+
+
+def write_chart(svg, outfile_name):
+    """ Write svg as is to a .svg outfile_name, or as an HTML page """
+    with open(outfile_name, 'w') as f:
+        if outfile_name.endswith('.svg'):
+            f.write(svg)
+        else:
+            f.write('<!DOCTYPE html>\n<html><head><meta charset="utf-8">'
+                    '<title>CM1150V Packet Errors</title></head><body>\n')
+            f.write(svg)
+            f.write('\n</body></html>\n')
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+#
+# ModemTelemetry.py - Per poll channel telemetry (Power, SNR and error
+#                     counters) in a fixed width binary file.
+#
+# Copyright (c) 2020 Howard Holm
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+""" ModemTelemetry - record every poll's downstream channel readings.
+
+    Each poll appends one fixed width record per downstream channel to
+    <datafile>.telemetry:
+
+        time           uint32   poll time (seconds since epoch)
+        freq_index     uint16   index into <datafile>.telemetry.freqs
+        channel_id     uint16
+        power          float32  dBmV
+        snr            float32  dB
+        correctable    uint32   counter as reported by the modem
+        uncorrectable  uint32   counter as reported by the modem
+
+    <datafile>.telemetry.freqs is a json list of the frequencies (in Hz)
+    seen so far.  Only locked channels are recorded.  Records are in time
+    order so a time range is found by bisecting, and the file can be
+    memory mapped as a NumPy structured array (see DTYPE and
+    read_telemetry) without parsing anything.
+"""
+import json
+import logging
+import mmap
+import os
+import struct
+import ModemStore
+
+TELEMETRY_SUFFIX = '.telemetry'
+FREQS_SUFFIX = '.telemetry.freqs'
+
+RECORD = struct.Struct('<IHHffII')
+COUNTER_MAX = 0xFFFFFFFF
+FIELDS = ('time', 'freq_index', 'channel_id', 'power', 'snr',
+          'correctable', 'uncorrectable')
+# the same layout as a NumPy dtype description
+DTYPE = [('time', '<u4'), ('freq_index', '<u2'), ('channel_id', '<u2'),
+         ('power', '<f4'), ('snr', '<f4'), ('correctable', '<u4'),
+         ('uncorrectable', '<u4')]
+
+logger = logging.getLogger(__name__)
+
+
+def telemetry_name(datafile_name):
+    return datafile_name + TELEMETRY_SUFFIX
+
+
+def freqs_name(datafile_name):
+    return datafile_name + FREQS_SUFFIX
+
+
+def load_freqs(datafile_name):
+    """ List of the frequencies (in Hz) by freq_index """
+    try:
+        with open(freqs_name(datafile_name)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+
+class TelemetryWriter:
+    """ Appends poll records to the telemetry file of one data store """
+
+    def __init__(self, datafile_name):
+        self.datafile_name = datafile_name
+        self.freqs = load_freqs(datafile_name)
+        self.index = {freq: i for i, freq in enumerate(self.freqs)}
+        self.file = open(telemetry_name(datafile_name), 'ab')
+        # drop any partial record left by a crash mid-write
+        size = self.file.seek(0, os.SEEK_END)
+        if size % RECORD.size:
+            logger.warning(f'Dropping partial telemetry record in '
+                           f'{telemetry_name(datafile_name)}')
+            self.file.truncate(size - size % RECORD.size)
+
+    def freq_index(self, freq):
+        if freq not in self.index:
+            self.index[freq] = len(self.freqs)
+            self.freqs.append(freq)
+            ModemStore.atomic_write_json(freqs_name(self.datafile_name),
+                                         self.freqs)
+        return self.index[freq]
+
+    def append(self, poll_time, channels):
+        """ Append one record per channel (anything with status, frequency,
+            channel_id, power, snr, correctable and uncorrectable like the
+            ModemParse records) for the poll at poll_time.  Channels that
+            aren't locked (which read as 0 Hz) are left out.
+        """
+        records = bytearray()
+        for chan in channels:
+            if chan.status != 'Locked' or not chan.frequency:
+                continue
+            records += RECORD.pack(
+                poll_time, self.freq_index(chan.frequency), chan.channel_id,
+                chan.power, chan.snr, min(chan.correctable, COUNTER_MAX),
+                min(chan.uncorrectable, COUNTER_MAX))
+        self.file.write(records)
+        self.file.flush()
+        return len(records)
+
+    def close(self):
+        self.file.close()
+
+
+def _bisect_time(view, count, poll_time):
+    """ First record index in view with a time >= poll_time """
+    low, high = 0, count
+    while low < high:
+        mid = (low + high) // 2
+        if RECORD.unpack_from(view, mid * RECORD.size)[0] < poll_time:
+            low = mid + 1
+        else:
+            high = mid
+    return low
+
+
+def iter_telemetry(datafile_name, since=0, until=None):
+    """ Generator of record tuples (in FIELDS order) from since to until
+        without NumPy.  Only the records in range are unpacked.
+    """
+    try:
+        f = open(telemetry_name(datafile_name), 'rb')
+    except FileNotFoundError:
+        return
+    with f:
+        count = os.fstat(f.fileno()).st_size // RECORD.size
+        if not count:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            first = _bisect_time(view, count, since)
+            last = count if until is None else _bisect_time(
+                view, count, until + 1)
+            for i in range(first, last):
+                yield RECORD.unpack_from(view, i * RECORD.size)
+
+
+def read_telemetry(datafile_name, since=0, until=None):
+    """ NumPy structured array (a memory map, nothing is read until it's
+        used) of the records from since to until.
+    """
+    import numpy as np
+
+    name = telemetry_name(datafile_name)
+    try:
+        count = os.path.getsize(name) // RECORD.size
+    except FileNotFoundError:
+        count = 0
+    if not count:
+        return np.zeros(0, dtype=DTYPE)
+    records = np.memmap(name, dtype=DTYPE, mode='r', shape=(count,))
+    first, last = np.searchsorted(
+        records['time'], [since, np.iinfo(np.uint32).max if until is None
+                          else until + 1])
+    return records[first:last]
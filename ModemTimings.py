@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+#
+# ModemTimings.py - Per phase timings and counts of each poll and display.
+#
+# Copyright (c) 2020 Howard Holm
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+""" ModemTimings - where the time goes in each poll (and display.)
+
+    A Timer times the phases of one run of fetch_stats or display_stats
+    by lap: each lap(phase) charges the time since the previous lap to
+    that phase, so the code being timed doesn't have to be restructured.
+    Counts such as bytes fetched or written go in with count().
+
+    Timings.finish() keeps a histogram of every phase duration and count,
+    by operation and modem, and appends the run as one json line to the
+    stats file, if any:
+
+        {"time": 1602000000.0, "op": "fetch_stats", "modem": "modem",
+         "seconds": {"fetch": 0.41, "parse": 0.002, ...},
+         "counts": {"bytes_fetched": 43125, "retries": 0, ...}}
+
+    The histograms are also served by ModemMetrics.
+"""
+import bisect
+import json
+import logging
+import threading
+from collections import deque
+from time import perf_counter, time
+
+logger = logging.getLogger(__name__)
+
+INF = float('inf')
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                   0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, INF)
+BYTES_BUCKETS = tuple(1 << shift for shift in range(10, 32, 2)) + (INF,)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 100, 1000, 10000, 100000, 1000000, INF)
+WINDOW = 288    # recent samples kept for percentiles (a day of polls)
+
+
+class Histogram:
+    """ Cumulative bucket counts (Prometheus style) of everything observed
+        plus the last WINDOW values for recent percentiles
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.count = 0
+        self.recent = deque(maxlen=WINDOW)
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+        self.recent.append(value)
+
+    def percentile(self, fraction):
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def summary(self):
+        return {'count': self.count, 'sum': self.total,
+                'p50': self.percentile(0.5), 'p95': self.percentile(0.95),
+                'max': max(self.recent)}
+
+    def cumulative(self):
+        """ (le, count of values <= le) for each bucket """
+        running = 0
+        for le, count in zip(self.buckets, self.counts):
+            running += count
+            yield (le, running)
+
+
+class Timer:
+    """ Phase timings and counts for one run of op """
+
+    def __init__(self, op, modem=''):
+        self.op = op
+        self.modem = modem
+        self.seconds = {}
+        self.counts = {}
+        self.last = perf_counter()
+
+    def lap(self, phase):
+        """ Charge the time since the last lap (or start) to phase """
+        now = perf_counter()
+        self.seconds[phase] = self.seconds.get(phase, 0.0) + now - self.last
+        self.last = now
+
+    def count(self, name, amount=1):
+        self.counts[name] = self.counts.get(name, 0) + amount
+
+
+class Timings:
+    """ Histograms of the Timers finished so far, appended to
+        stats_file_name (json lines) if it's given
+    """
+
+    def __init__(self, stats_file_name=None):
+        self.stats_file_name = stats_file_name
+        self.histograms = {}  # (op, modem, kind, name) -> Histogram
+        self.lock = threading.Lock()    # fleet polls finish concurrently
+
+    def finish(self, timer):
+        """ Add a finished Timer to the histograms and the stats file """
+        record = {'time': round(time(), 3), 'op': timer.op,
+                  'modem': timer.modem, 'seconds': timer.seconds,
+                  'counts': timer.counts}
+        logger.debug(f'Timings: {record}')
+        with self.lock:
+            for name, value in timer.seconds.items():
+                self.observe((timer.op, timer.modem, 'seconds', name),
+                             SECONDS_BUCKETS, value)
+            for name, value in timer.counts.items():
+                buckets = (BYTES_BUCKETS if name.startswith('bytes')
+                           else COUNT_BUCKETS)
+                self.observe((timer.op, timer.modem, 'counts', name),
+                             buckets, value)
+            if self.stats_file_name is not None:
+                with open(self.stats_file_name, 'a') as f:
+                    f.write(json.dumps(record, separators=(',', ':')))
+                    f.write('\n')
+
+    def observe(self, key, buckets, value):
+        if key not in self.histograms:
+            self.histograms[key] = Histogram(buckets)
+        self.histograms[key].observe(value)
+
+    def summary(self):
+        """ {op: {modem: {kind: {name: Histogram.summary()}}}} """
+        result = {}
+        with self.lock:
+            for (op, modem, kind, name), histogram in self.histograms.items():
+                result.setdefault(op, {}).setdefault(modem, {}).setdefault(
+                    kind, {})[name] = histogram.summary()
+        return result
+
+    def prometheus(self):
+        """ Lines of Prometheus histograms of the phase durations (as
+            modem_phase_seconds) and counts (as modem_run_count)
+        """
+        lines = []
+        with self.lock:
+            for kind, name, label, text in (
+                    ('seconds', 'modem_phase_seconds', 'phase',
+                     'Duration of each phase'),
+                    ('counts', 'modem_run_count', 'count',
+                     'Counts (e.g. bytes) per run')):
+                lines.append(f'# HELP {name} {text}')
+                lines.append(f'# TYPE {name} histogram')
+                for (op, modem, each_kind, each), histogram in sorted(
+                        self.histograms.items()):
+                    if each_kind != kind:
+                        continue
+                    labels = f'op="{op}",modem="{modem}",{label}="{each}"'
+                    for le, count in histogram.cumulative():
+                        le = '+Inf' if le == INF else le
+                        lines.append(
+                            f'{name}_bucket{{{labels},le="{le}"}} {count}')
+                    lines.append(f'{name}_sum{{{labels}}} {histogram.total}')
+                    lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+        return lines
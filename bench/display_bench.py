@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+#
+# display_bench.py - Benchmark ModemDisplay on synthetic data stores.
+#
+# Copyright (c) 2020 Howard Holm
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+""" display_bench - time ModemDisplay.display_stats end to end on
+    make_dataset.py data stores of each size: loading the store, building
+    the traces and writing the HTML.  Reports the time, the peak memory
+    allocated and the size of the page written (without plotly.min.js.)
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, os.pardir))
+import ModemDisplay  # noqa: E402
+import make_dataset  # noqa: E402
+
+
+def bench_display(days, repeat=3, seed=0, trace_memory=True, **kwargs):
+    """ Return (best seconds, peak bytes, page bytes) of display_stats on
+        a days long store, kwargs going to display_stats
+    """
+    with tempfile.TemporaryDirectory() as work_dir:
+        datafile_name = os.path.join(work_dir, 'ModemData.json')
+        outfile_name = os.path.join(work_dir, 'ModemData.html')
+        make_dataset.write_dataset(datafile_name, days, seed=seed)
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            ModemDisplay.display_stats(datafile_name, outfile_name, **kwargs)
+            times.append(time.perf_counter() - start)
+        peak = 0
+        if trace_memory:
+            tracemalloc.start()
+            ModemDisplay.display_stats(datafile_name, outfile_name, **kwargs)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        return (min(times), peak, os.path.getsize(outfile_name))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Benchmark ModemDisplay charts of synthetic data stores',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('-D', '--days', type=int, nargs='+',
+                        default=[30, 365, 1826],
+                        help='sizes of data store to chart')
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help='runs to take the best time of')
+    parser.add_argument('-w', '--width', type=int, default=None,
+                        help='chart width (uses rollups, if any)')
+    parser.add_argument('-B', '--backend', choices=['plotly', 'svg'],
+                        default='plotly')
+    parser.add_argument('--no-memory', action='store_true',
+                        help='skip the (slow) memory tracing run')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    print(f'{"days":>5} {"seconds":>8} {"peak MiB":>9} {"page KiB":>9}')
+    for days in args.days:
+        (seconds, peak, size) = bench_display(
+            days, args.repeat, args.seed, not args.no_memory,
+            width=args.width, backend=args.backend)
+        print(f'{days:5d} {seconds:8.2f} {peak / 1024 / 1024:9.1f} '
+              f'{size / 1024:9.0f}')
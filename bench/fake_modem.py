@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+#
+# fake_modem.py - A local stand-in for a CM1150V's web interface.
+#
+# Copyright (c) 2020 Howard Holm
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+""" fake_modem - a stand-in for a CM1150V's web interface to poll.
+
+    Serves / (HTTP Basic auth, which sets a session cookie) and
+    /DocsisStatus.htm (needs the auth and the cookie, like the real one)
+    built from pages/cm1150v-normal.htm with the time, uptime and
+    downstream channels of a simulated modem.
+    Every status page moves the simulated clock on by --step seconds so a
+    benchmark doesn't have to wait for real polls, and the modem can be
+    made to reboot (answering 503 for a while and then with reset
+    counters), reset its counters without rebooting, move channels to new
+    frequencies and answer slowly.  Everything random comes from --seed.
+
+    Run it on its own to point ModemCheck.py at, or use FakeModem from a
+    benchmark (see poll_bench.py.)
+"""
+import argparse
+import base64
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         'pages')
+TEMPLATE = os.path.join(PAGES_DIR, 'cm1150v-normal.htm')
+COOKIE = 'XSRF_TOKEN'
+FIRST_FREQ = 477000000
+FREQ_STEP = 6000000
+_LIST = re.compile(rb"^( *var tagValueList = ')[^']*(';)$", re.M)
+
+
+class SimModem:
+    """ The state of the simulated modem (time, uptime and channels) """
+
+    def __init__(self, channels=32, step=300, seed=0, start=None,
+                 error_rate=0.3, reboot_chance=0.0, reset_chance=0.0,
+                 churn_chance=0.0, reboot_polls=3):
+        self.random = random.Random(seed)
+        self.step = step
+        self.error_rate = error_rate
+        self.reboot_chance = reboot_chance
+        self.reset_chance = reset_chance
+        self.churn_chance = churn_chance
+        self.reboot_polls = reboot_polls
+        self.time = int(time.time()) if start is None else start
+        self.uptime = 12 * 24 * 60 * 60
+        self.rebooting = 0  # polls left answering 503
+        self.lock = threading.Lock()
+        self.channels = [
+            {'id': i + 1, 'freq': FIRST_FREQ + i * FREQ_STEP,
+             'power': round(self.random.uniform(-3.0, 4.0), 1),
+             'snr': round(self.random.uniform(37.0, 41.0), 1),
+             'correctable': 0, 'uncorrectable': 0}
+            for i in range(channels)]
+
+    def reset_counters(self):
+        for chan in self.channels:
+            chan['correctable'] = chan['uncorrectable'] = 0
+
+    def advance(self):
+        """ Move the clock on one step; False while rebooting """
+        rand = self.random
+        self.time += self.step
+        if self.rebooting:
+            self.rebooting -= 1
+            if not self.rebooting:
+                self.uptime = self.step
+                self.reset_counters()
+            return False
+        self.uptime += self.step
+        if rand.random() < self.reboot_chance:
+            self.rebooting = self.reboot_polls
+            return False
+        if rand.random() < self.reset_chance:
+            self.reset_counters()
+        for chan in self.channels:
+            if rand.random() < self.churn_chance:
+                # move to a frequency no other channel is on
+                used = {other['freq'] for other in self.channels}
+                chan['freq'] = rand.choice(
+                    [FIRST_FREQ + i * FREQ_STEP
+                     for i in range(len(self.channels) * 2)
+                     if FIRST_FREQ + i * FREQ_STEP not in used])
+                chan['correctable'] = chan['uncorrectable'] = 0
+            chan['snr'] = round(min(43.0, max(30.0, chan['snr'] +
+                                              rand.gauss(0, 0.2))), 1)
+            chan['power'] = round(min(9.0, max(-9.0, chan['power'] +
+                                               rand.gauss(0, 0.1))), 1)
+            if rand.random() < self.error_rate:
+                chan['correctable'] += int(rand.expovariate(1 / 200))
+                chan['uncorrectable'] += int(rand.expovariate(1 / 10))
+        return True
+
+    def tag_values(self):
+        """ The InitTagValue and InitDsTableTagValue lists """
+        sys_time = time.strftime('%a %b %d %H:%M:%S %Y',
+                                 time.localtime(self.time))
+        days, rest = divmod(self.uptime, 24 * 60 * 60)
+        uptime = (f'{days} days {rest // 3600:02d}:{rest % 3600 // 60:02d}:'
+                  f'{rest % 60:02d}')
+        boot = ['579000000', 'Locked', 'OK', 'Operational', 'OK',
+                'Operational', '&nbsp;', '&nbsp;', 'Enabled', 'BPI+',
+                sys_time, '1', '0', '0', uptime, '']
+        ds = [str(len(self.channels))]
+        for chan in self.channels:
+            ds += [str(chan['id']), 'Locked', 'QAM256', str(chan['id'] + 8),
+                   f'{chan["freq"]} Hz', str(chan['power']),
+                   str(chan['snr']), str(chan['correctable']),
+                   str(chan['uncorrectable'])]
+        return ('|'.join(boot), '|'.join(ds) + '|')
+
+    def status_page(self, template):
+        """ template with our lists, or None while rebooting """
+        with self.lock:
+            if not self.advance():
+                return None
+            (boot, ds) = self.tag_values()
+        lists = iter((boot, ds))
+        count = [0]
+
+        def substitute(match):
+            # InitTagValue and InitDsTableTagValue are the first two
+            count[0] += 1
+            if count[0] > 2:
+                return match.group(0)
+            return (match.group(1) + next(lists).encode() + match.group(2))
+        return _LIST.sub(substitute, template)
+
+
+class FakeModemHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'   # keep-alive like the real thing
+
+    def do_GET(self):
+        server = self.server
+        if server.delay:
+            time.sleep(server.random.uniform(0, server.delay))
+        if self.path == '/':
+            if self.headers.get('Authorization') != server.auth:
+                self.reply(401, b'Unauthorized')
+            else:
+                self.reply(200, b'<html></html>', cookie=True)
+        elif self.path == '/DocsisStatus.htm':
+            if (self.headers.get('Authorization') != server.auth or
+                    f'{COOKIE}=' not in (self.headers.get('Cookie') or '')):
+                self.reply(401, b'Unauthorized')
+                return
+            page = server.modem.status_page(server.template)
+            if page is None:
+                self.reply(503, b'Rebooting')
+            else:
+                self.reply(200, page)
+        else:
+            self.reply(404, b'Not Found')
+
+    def reply(self, code, body, cookie=False):
+        self.send_response(code)
+        if code == 401:
+            self.send_header('WWW-Authenticate', 'Basic realm="CM1150V"')
+        if cookie:
+            self.send_header('Set-Cookie', f'{COOKIE}=1; Path=/')
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class FakeModem:
+    """ A SimModem served on address:port (port 0 picks a free one) until
+        close().  url is where to point ModemCheck.
+    """
+
+    def __init__(self, modem=None, port=0, address='127.0.0.1',
+                 user='admin', password='password', delay=0.0,
+                 verbose=False):
+        self.modem = SimModem() if modem is None else modem
+        self.httpd = ThreadingHTTPServer((address, port), FakeModemHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.modem = self.modem
+        self.httpd.auth = 'Basic ' + base64.b64encode(
+            f'{user}:{password}'.encode()).decode()
+        self.httpd.delay = delay
+        self.httpd.random = random.Random(self.modem.random.random())
+        self.httpd.verbose = verbose
+        with open(TEMPLATE, 'rb') as f:
+            self.httpd.template = f.read()
+        (host, port) = self.httpd.server_address[:2]
+        self.url = f'http://{host}:{port}/'
+        self.thread = threading.Thread(target=self.httpd.serve_forever,
+                                       daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Serve a simulated CM1150V for ModemCheck to poll',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('-p', '--port', type=int, default=8080)
+    parser.add_argument('-a', '--address', default='127.0.0.1')
+    parser.add_argument('--password', default='password')
+    parser.add_argument('--channels', type=int, default=32)
+    parser.add_argument('--step', type=int, default=300,
+                        help='simulated seconds per status page')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--error-rate', type=float, default=0.3,
+                        help='chance a channel gets new errors each step')
+    parser.add_argument('--reboot-chance', type=float, default=0.0,
+                        help='chance of a reboot each step')
+    parser.add_argument('--reset-chance', type=float, default=0.0,
+                        help='chance the counters reset without a reboot')
+    parser.add_argument('--churn-chance', type=float, default=0.0,
+                        help='chance a channel moves frequency each step')
+    parser.add_argument('--delay', type=float, default=0.0,
+                        help='answer after up to this many seconds')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='log every request')
+    args = parser.parse_args()
+
+    fake = FakeModem(SimModem(args.channels, args.step, args.seed,
+                              error_rate=args.error_rate,
+                              reboot_chance=args.reboot_chance,
+                              reset_chance=args.reset_chance,
+                              churn_chance=args.churn_chance),
+                     args.port, args.address, password=args.password,
+                     delay=args.delay, verbose=args.verbose)
+    print(f'Fake CM1150V at {fake.url} (user admin)')
+    try:
+        fake.thread.join()
+    except KeyboardInterrupt:
+        fake.close()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+#
+# make_dataset.py - Synthetic multi-year ModemCheck data stores.
+#
+# Copyright (c) 2020 Howard Holm
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+""" make_dataset - write a synthetic ModemCheck data store covering
+    anything from a month to years of five minute polls, for the
+    benchmarks (or ModemDisplay) to chew on.  The same --seed always gives
+    the same data.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+import ModemStore  # noqa: E402
+
+FIRST_FREQ = 477000000
+FREQ_STEP = 6000000
+POLL = 300
+
+
+def make_running_data(days, end=None, channels=32, event_rate=0.2, seed=0):
+    """ (prev_run, running_data, boot_time, uptime) like fetch_stats keeps
+        for days of polls up to end (default now.)  event_rate is the
+        chance a poll saw new errors (on one to four channels, with the
+        occasional burst on all of them.)
+    """
+    rand = random.Random(seed)
+    end = int(time.time()) if end is None else end
+    freqs = [f'{FIRST_FREQ + i * FREQ_STEP} Hz' for i in range(channels)]
+    running_data = {}
+    for poll_time in range(end - days * ModemStore.DAY, end, POLL):
+        if rand.random() >= event_rate:
+            continue
+        if rand.random() < 0.01:
+            hit = freqs
+        else:
+            hit = rand.sample(freqs, rand.randint(1, 4))
+        running_data[str(poll_time)] = {
+            freq: [int(rand.expovariate(1 / 200)) + 1,
+                   int(rand.expovariate(1 / 10))] for freq in hit}
+    uptime = rand.randrange(ModemStore.DAY, 30 * ModemStore.DAY)
+    prev_run = {freq: {'Channel ID': i + 1, 'Power': 2.0, 'SNR': 39.0,
+                       'Correctable Err': rand.randrange(100000),
+                       'Uncorrectable Err': rand.randrange(1000)}
+                for i, freq in enumerate(freqs)}
+    return (prev_run, running_data, end - uptime, uptime)
+
+
+def write_dataset(datafile_name, days, storage='json', journal_records=0,
+                  retention_days=None, end=None, **kwargs):
+    """ Write a synthetic store to datafile_name (see make_running_data),
+        with the last journal_records events in the journal for storage
+        'journal', and days before retention_days rolled into the archive
+    """
+    end = int(time.time()) if end is None else end
+    (prev_run, running_data, boot_time,
+     uptime) = make_running_data(days, end, **kwargs)
+    if retention_days is not None:
+        ModemStore.roll_over(datafile_name, running_data,
+                             end - retention_days * ModemStore.DAY)
+    journal = []
+    if storage == 'journal' and journal_records:
+        journal = sorted(running_data, key=int)[-journal_records:]
+    in_journal = set(journal)
+    snapshot = {event_time: new_data
+                for event_time, new_data in running_data.items()
+                if event_time not in in_journal}
+    ModemStore.save_store(datafile_name, prev_run, snapshot, boot_time,
+                          uptime)
+    for event_time in journal:
+        ModemStore.append_journal(datafile_name, int(event_time),
+                                  running_data[event_time])
+    if storage == 'journal':
+        ModemStore.save_checkpoint(datafile_name, prev_run, boot_time,
+                                   uptime)
+    return len(running_data)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Write a synthetic ModemCheck data store',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('datafile', help='data store to write')
+    parser.add_argument('-D', '--days', type=int, default=365,
+                        help='days of polls (30 to 1826 or so)')
+    parser.add_argument('--channels', type=int, default=32)
+    parser.add_argument('--event-rate', type=float, default=0.2,
+                        help='chance a poll saw new errors')
+    parser.add_argument('-s', '--storage', choices=['json', 'journal'],
+                        default='json')
+    parser.add_argument('--journal-records', type=int, default=500,
+                        help='events left in the journal (journal storage)')
+    parser.add_argument('-r', '--retention', type=int, default=None,
+                        help='days to keep in the store, the rest are'
+                        ' archived')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    events = write_dataset(args.datafile, args.days, args.storage,
+                           args.journal_records, args.retention,
+                           channels=args.channels,
+                           event_rate=args.event_rate, seed=args.seed)
+    print(f'{events} events over {args.days} days written to '
+          f'{args.datafile} ({os.path.getsize(args.datafile)} bytes) in '
+          f'{time.perf_counter() - start:.1f}s')
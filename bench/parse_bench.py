@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+#
+# parse_bench.py - Micro-benchmark ModemParse against the saved pages.
+#
+# Copyright (c) 2020 Howard Holm
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+""" parse_bench - time ModemParse.parse_status on every page in pages/
+    and count what it allocates.  Pages named bad-*.htm (login pages,
+    rebooting modems, truncated downloads) must raise ValueError, the
+    rest must parse; the exit status is non-zero if one doesn't.
+"""
+import argparse
+import glob
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+import ModemParse  # noqa: E402
+
+
+def parse_or_none(content):
+    try:
+        return ModemParse.parse_status(content)
+    except ValueError:
+        return None
+
+
+def bench_page(page_name, number):
+    """ Return (status, usec per parse, bytes allocated, blocks allocated) """
+    with open(page_name, 'rb') as f:
+        content = f.read()
+    status = parse_or_none(content)
+    usec = min(timeit.repeat(lambda: parse_or_none(content),
+                             number=number, repeat=3)) / number * 1e6
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    kept = parse_or_none(content)  # noqa: F841 keep it alive to count it
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = after.compare_to(before, 'filename')
+    return (status, usec, sum(stat.size_diff for stat in stats),
+            sum(stat.count_diff for stat in stats))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Benchmark parsing the saved modem pages',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('-n', '--number', type=int, default=1000,
+                        help='parses per timing run')
+    parser.add_argument('pages', nargs='*', help='pages to parse',
+                        default=sorted(glob.glob(os.path.join(
+                            os.path.dirname(os.path.abspath(__file__)),
+                            'pages', '*.htm'))))
+    args = parser.parse_args()
+
+    failures = 0
+    print(f'{"page":32} {"result":>10} {"usec":>8} {"bytes":>8} '
+          f'{"blocks":>6}')
+    for page_name in args.pages:
+        status, usec, size, count = bench_page(page_name, args.number)
+        base_name = os.path.basename(page_name)
+        if status is None:
+            result = 'bogus'
+        else:
+            result = (f'{len(status.downstream)}/{len(status.upstream)}/'
+                      f'{len(status.ds_ofdm)}/{len(status.us_ofdma)}')
+        if (status is None) != base_name.startswith('bad-'):
+            result += ' !!'
+            failures += 1
+        print(f'{base_name:32} {result:>10} {usec:8.1f} {size:8d} '
+              f'{count:6d}')
+    sys.exit(1 if failures else 0)
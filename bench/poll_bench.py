@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+#
+# poll_bench.py - Benchmark ModemCheck polls against fake_modem.py.
+#
+# Copyright (c) 2020 Howard Holm
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+""" poll_bench - time ModemCheck.fetch_stats poll by poll against
+    fake_modem.py with a make_dataset.py data store of each size, for each
+    storage mode.  Reports the first (cold, store loading) poll, the mean,
+    median, 95th percentile and worst of the rest, the peak memory
+    allocated during a poll and the size of the store on disk afterwards.
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, os.pardir))
+import ModemCheck  # noqa: E402
+import fake_modem  # noqa: E402
+import make_dataset  # noqa: E402
+
+
+def store_size(datafile_name):
+    """ Bytes on disk of the store's snapshot, journal and sidecars """
+    directory = os.path.dirname(datafile_name)
+    base = os.path.basename(datafile_name)
+    return sum(os.path.getsize(os.path.join(directory, name))
+               for name in os.listdir(directory)
+               if name.startswith(base) and
+               os.path.isfile(os.path.join(directory, name)))
+
+
+def bench_store(days, storage, polls, seed=0, **kwargs):
+    """ Return (cold ms, [warm ms], peak bytes, store bytes) for polls
+        polls of a days long store
+    """
+    with tempfile.TemporaryDirectory() as work_dir:
+        datafile_name = os.path.join(work_dir, 'ModemData.json')
+        end = int(time.time())
+        make_dataset.write_dataset(datafile_name, days, storage,
+                                   journal_records=500, end=end, seed=seed)
+        modem = fake_modem.FakeModem(fake_modem.SimModem(seed=seed,
+                                                         start=end))
+        state = ModemCheck.ModemState()
+        try:
+            def poll():
+                start = time.perf_counter()
+                ModemCheck.fetch_stats('password', url=modem.url,
+                                       datafile_name=datafile_name,
+                                       storage=storage, state=state,
+                                       **kwargs)
+                return (time.perf_counter() - start) * 1000
+            cold = poll()
+            warm = [poll() for _ in range(polls)]
+            # the largest peak of a few polls (traced one at a time rather
+            # than with tracemalloc.reset_peak, which needs Python 3.9)
+            peak = 0
+            for _ in range(min(polls, 5)):
+                tracemalloc.start()
+                poll()
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+        finally:
+            state.session.close()
+            modem.close()
+        return (cold, warm, peak, store_size(datafile_name))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Benchmark ModemCheck polls against a fake modem',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('-D', '--days', type=int, nargs='+',
+                        default=[30, 365, 1826],
+                        help='sizes of data store to poll into')
+    parser.add_argument('-s', '--storage', nargs='+',
+                        choices=['json', 'journal'],
+                        default=['json', 'journal'])
+    parser.add_argument('-n', '--polls', type=int, default=50,
+                        help='polls to time after the first')
+    parser.add_argument('-T', '--telemetry', action='store_true',
+                        help='record telemetry too')
+    parser.add_argument('-R', '--rollups', action='store_true',
+                        help='keep rollups too')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)  # the fake modem's SNR can wander
+    print(f'{"days":>5} {"storage":8} {"cold ms":>8} {"mean ms":>8} '
+          f'{"p50 ms":>8} {"p95 ms":>8} {"max ms":>8} {"peak KiB":>9} '
+          f'{"store KiB":>10}')
+    for days in args.days:
+        for storage in args.storage:
+            (cold, warm, peak, size) = bench_store(
+                days, storage, args.polls, args.seed,
+                telemetry=args.telemetry, rollups=args.rollups)
+            warm.sort()
+            print(f'{days:5d} {storage:8} {cold:8.1f} '
+                  f'{statistics.mean(warm):8.2f} '
+                  f'{statistics.median(warm):8.2f} '
+                  f'{warm[int(len(warm) * 0.95) - 1]:8.2f} {warm[-1]:8.2f} '
+                  f'{peak / 1024:9.0f} {size / 1024:10.0f}')
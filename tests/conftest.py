@@ -0,0 +1,30 @@
+# The Modem*.py scripts live at the top of the repository rather than in a
+# package, so make them (and the bench helpers) importable from the tests.
+import os
+import pytest
+import sys
+
+TOP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [TOP, os.path.join(TOP, 'bench')]
+
+PAGES_DIR = os.path.join(TOP, 'bench', 'pages')
+
+
+class PageSession:
+    """ A ModemSession that always returns the one captured page """
+    retry_count = 0
+
+    def __init__(self, name):
+        with open(os.path.join(PAGES_DIR, name), 'rb') as f:
+            self.page = f.read()
+
+    def fetch(self, page_name):
+        return self.page
+
+
+@pytest.fixture
+def page_session():
+    """ PageSession for a page in bench/pages, to set as a ModemState's
+        session
+    """
+    return PageSession
@@ -0,0 +1,75 @@
+""" ModemAnomaly incidents opening and closing, and what ModemCheck feeds it
+"""
+import json
+import pytest
+import ModemAnomaly
+
+FREQ = '477000000 Hz'
+
+
+def channel(snr=39.0, power=2.0):
+    return {FREQ: {'SNR': snr, 'Power': power}}
+
+
+def test_incident_opens_and_closes(tmp_path):
+    datafile_name = str(tmp_path / 'ModemData.json')
+    detector = ModemAnomaly.AnomalyDetector(datafile_name, min_snr=36.0,
+                                            max_power=7.0, clear_after=3)
+    poll_time = 1600000000
+    for snr in [39.0, 39.2, 38.9, 39.1] * 10:
+        poll_time += 300
+        detector.add_poll(poll_time, channel(snr), {})
+    assert not detector.in_trouble()
+
+    # the SNR falls away from its normal (and below the limit)
+    for snr in (34.0, 33.5, 34.5):
+        poll_time += 300
+        detector.add_poll(poll_time, channel(snr), {})
+        assert detector.in_trouble()
+    assert list(detector.incidents) == [f'{FREQ} snr']
+
+    # and it lasts until clear_after clean polls
+    for poll in range(10):
+        poll_time += 300
+        detector.add_poll(poll_time, channel(39.0), {})
+        if not detector.in_trouble():
+            break
+    assert not detector.in_trouble()
+    with open(ModemAnomaly.incidents_name(datafile_name)) as f:
+        incidents = [json.loads(line) for line in f]
+    assert len(incidents) == 1
+    (start, end, freq, metric, worst, polls) = incidents[0]
+    assert (freq, metric, worst) == (FREQ, 'snr', 33.5)
+    assert polls >= 3 and start < end
+
+    # the baselines and open incidents carry over to the next run
+    again = ModemAnomaly.AnomalyDetector(datafile_name)
+    assert again.baselines == detector.baselines
+
+
+def test_dropped_channel_closes_its_incident(tmp_path):
+    datafile_name = str(tmp_path / 'ModemData.json')
+    detector = ModemAnomaly.AnomalyDetector(datafile_name, max_power=7.0)
+    detector.add_poll(1600000000, channel(power=9.0), {})
+    assert detector.in_trouble()
+    detector.add_poll(1600000300, {}, {})
+    assert not detector.in_trouble()
+
+
+def test_partial_lock_is_not_an_anomaly(tmp_path, page_session):
+    pytest.importorskip('requests')
+    pytest.importorskip('pytimeparse')
+    import ModemCheck
+    import ModemRollup
+
+    datafile_name = str(tmp_path / 'ModemData.json')
+    state = ModemCheck.ModemState()
+    state.session = page_session('cm1150v-partial-lock.htm')
+    for _ in range(3):
+        ModemCheck.fetch_stats('password', datafile_name=datafile_name,
+                               state=state, anomalies=True, rollups=True)
+        assert not state.anomaly.in_trouble()
+        assert not state.trouble
+    assert '0 Hz' not in state.anomaly.baselines
+    for _, buckets in ModemRollup.read_rollup(datafile_name, 'hour'):
+        assert '0 Hz' not in buckets
@@ -0,0 +1,82 @@
+""" ModemDisplay's charts (drawn with the svg backend, which needs no
+    plotly)
+"""
+import subprocess
+import sys
+import pytest
+import ModemDisplay
+import ModemStore
+import make_dataset
+from conftest import TOP
+
+END = 1600000000
+
+
+def render(datafile_name, outfile_name, cache_name=None):
+    ModemDisplay.display_stats(datafile_name, outfile_name,
+                               cache_name=cache_name, backend='svg')
+    with open(outfile_name) as f:
+        return f.read()
+
+
+def test_incremental_matches_full(tmp_path):
+    datafile_name = str(tmp_path / 'ModemData.json')
+    cache_name = ModemStore.display_cache_name(datafile_name)
+    out_name = str(tmp_path / 'chart.html')
+    make_dataset.write_dataset(datafile_name, 3, storage='journal',
+                               journal_records=20, end=END)
+    first = render(datafile_name, out_name, cache_name)
+    assert first == render(datafile_name, out_name)
+
+    # new polls go into the journal
+    for i in range(1, 4):
+        ModemStore.append_journal(datafile_name, END + 300 * i,
+                                  {'477000000 Hz': [i * 10, i]})
+    incremental = render(datafile_name, out_name, cache_name)
+    assert incremental != first
+    assert incremental == render(datafile_name, out_name)
+
+    # and then get compacted into the snapshot
+    (prev_run, running_data, boot_time,
+     uptime) = ModemStore.load_store(datafile_name)
+    running_data[str(END + 1200)] = {'483000000 Hz': [7, 0]}
+    ModemStore.compact_store(datafile_name, prev_run, running_data,
+                             boot_time, uptime)
+    incremental = render(datafile_name, out_name, cache_name)
+    assert incremental == render(datafile_name, out_name)
+    assert '<title>7</title>' in incremental
+
+
+def test_svg_without_plotly(tmp_path):
+    datafile_name = str(tmp_path / 'ModemData.json')
+    make_dataset.write_dataset(datafile_name, 1, end=END)
+    # in a fresh interpreter, since another test may have imported plotly
+    script = (f'import sys; sys.path.insert(0, {TOP!r}); '
+              f'import ModemDisplay; '
+              f'ModemDisplay.display_stats({datafile_name!r}, '
+              f'{str(tmp_path / "chart.svg")!r}, backend="svg"); '
+              f'print("plotly" in sys.modules)')
+    result = subprocess.run([sys.executable, '-c', script],
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == 'False'
+    with open(tmp_path / 'chart.svg') as f:
+        assert f.read().startswith('<svg ')
+
+
+def test_heatmap_sums(tmp_path, monkeypatch):
+    np = pytest.importorskip('numpy')
+    pytest.importorskip('plotly')
+    datafile_name = str(tmp_path / 'ModemData.json')
+    make_dataset.write_dataset(datafile_name, 3, end=END)
+    figures = []
+    monkeypatch.setattr(ModemDisplay, 'write_figure',
+                        lambda fig, outfile_name: figures.append(fig))
+    ModemDisplay.display_heatmap(datafile_name, err_type='Total', bins=50)
+
+    (heatmap,) = figures[0].data
+    z = np.array(heatmap.z, dtype=float)
+    assert z.shape[1] <= 50
+    assert len(heatmap.y) == z.shape[0]
+    assert np.nansum(z) == sum(
+        sum(counts) for data_points in ModemStore.query(
+            datafile_name).values() for counts in data_points.values())
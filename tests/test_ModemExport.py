@@ -0,0 +1,79 @@
+""" ModemExport to CSV (the formats that need pyarrow aren't tested) """
+import csv
+import os
+import pytest
+import ModemExport
+import ModemStore
+import ModemTelemetry
+import make_dataset
+
+END = 1600000000
+
+
+def read_rows(file_names):
+    rows = []
+    for file_name in file_names:
+        with open(file_name, newline='') as f:
+            reader = csv.reader(f)
+            assert tuple(next(reader)) == ModemExport.COLUMNS
+            rows.extend(tuple(row) for row in reader)
+    return rows
+
+
+def parts(export_dir):
+    return sorted(os.path.join(export_dir, name)
+                  for name in os.listdir(export_dir)
+                  if name.startswith('part-'))
+
+
+def test_incremental_no_duplicates(tmp_path):
+    datafile_name = str(tmp_path / 'ModemData.json')
+    export_dir = str(tmp_path / 'export')
+    make_dataset.write_dataset(datafile_name, 2, storage='journal',
+                               journal_records=20, end=END)
+    first = ModemExport.run_export(datafile_name, export_dir,
+                                   incremental=True)
+    assert first
+    assert ModemExport.run_export(datafile_name, export_dir,
+                                  incremental=True) == 0
+
+    for i in range(1, 4):
+        ModemStore.append_journal(datafile_name, END + 300 * i,
+                                  {'477000000 Hz': [i * 10, i],
+                                   '483000000 Hz': [0, i]})
+    assert ModemExport.run_export(datafile_name, export_dir,
+                                  incremental=True) == 6
+    assert len(parts(export_dir)) == 2
+
+    exported = read_rows(parts(export_dir))
+    assert len(exported) == first + 6
+    assert len({row[:2] for row in exported}) == len(exported)
+    full_name = str(tmp_path / 'full.csv')
+    assert ModemExport.run_export(datafile_name, full_name) == len(exported)
+    assert read_rows([full_name]) == exported
+
+
+def test_polls_join_errors(tmp_path, page_session):
+    pytest.importorskip('pytimeparse')
+    import ModemParse
+    datafile_name = str(tmp_path / 'ModemData.json')
+    downstream = ModemParse.parse_status(
+        page_session('cm1150v-partial-lock.htm').page).downstream
+    writer = ModemTelemetry.TelemetryWriter(datafile_name)
+    for i in range(3):
+        writer.append(END + 300 * i, downstream)
+    writer.close()
+    # errors from before the telemetry and on one of its polls
+    ModemStore.save_store(datafile_name, {}, {
+        str(END - 300): {'477000000 Hz': [4, 0]},
+        str(END + 300): {'477000000 Hz': [9, 2]}}, 0, 0)
+
+    rows = list(ModemExport.iter_rows(datafile_name))
+    locked = sum(chan.status == 'Locked' for chan in downstream)
+    assert len(rows) == 1 + 3 * locked
+    assert len({row[:2] for row in rows}) == len(rows)
+    assert rows[0] == (END - 300, 477000000, None, 4, 0, None, None)
+    channel_id = next(chan.channel_id for chan in downstream
+                      if chan.frequency == 477000000)
+    assert [row[:5] for row in rows[1:] if row[3] or row[4]] == [
+        (END + 300, 477000000, channel_id, 9, 2)]
@@ -0,0 +1,142 @@
+""" ModemImport round trips through logs written by ModemCheck polling
+    bench/fake_modem.py
+"""
+import gzip
+import logging
+import pytest
+
+pytest.importorskip('requests')
+pytest.importorskip('pytimeparse')
+import fake_modem  # noqa: E402
+import ModemCheck  # noqa: E402
+import ModemImport  # noqa: E402
+import ModemStore  # noqa: E402
+
+POLLS = 30
+
+
+@pytest.fixture
+def modem_log(tmp_path):
+    """ Log ModemCheck's messages to a file like ModemCheck -l does """
+    log_name = str(tmp_path / 'ModemCheck.log')
+    handler = logging.FileHandler(log_name)
+    handler.setFormatter(logging.Formatter(
+        '%(asctime)s::%(levelname)s::%(name)s::%(message)s'))
+    level = ModemCheck.logger.level
+    ModemCheck.logger.addHandler(handler)
+    ModemCheck.logger.setLevel(logging.INFO)
+    yield log_name
+    ModemCheck.logger.removeHandler(handler)
+    ModemCheck.logger.setLevel(level)
+    handler.close()
+
+
+def poll(datafile_name, polls, state=None, seed=0, step=1800, **kwargs):
+    """ Poll a fake modem (that resets its counters and moves channels
+        now and then) polls times, step seconds apart
+    """
+    modem = fake_modem.FakeModem(fake_modem.SimModem(
+        step=step, seed=seed, reset_chance=0.1, churn_chance=0.02))
+    try:
+        for _ in range(polls):
+            ModemCheck.fetch_stats('password', datafile_name=datafile_name,
+                                   url=modem.url, state=state, **kwargs)
+    finally:
+        (state or ModemCheck.modem_state).session.close()
+        modem.close()
+
+
+def test_import_rebuilds_store(tmp_path, modem_log, monkeypatch):
+    monkeypatch.setattr(ModemCheck, 'modem_state', ModemCheck.ModemState())
+    datafile_name = str(tmp_path / 'ModemData.json')
+    poll(datafile_name, POLLS)
+    polled = ModemStore.query(datafile_name)
+    assert polled
+
+    rebuilt_name = str(tmp_path / 'Rebuilt.json')
+    (added, events) = ModemImport.import_logs(rebuilt_name, [modem_log])
+    assert added == len(polled)
+    assert ModemStore.query(rebuilt_name) == polled
+    # importing the same log again adds nothing
+    assert ModemImport.import_logs(rebuilt_name, [modem_log]) == (0, 0)
+
+
+def test_import_skips_archived(tmp_path, modem_log, monkeypatch):
+    monkeypatch.setattr(ModemCheck, 'modem_state', ModemCheck.ModemState())
+    datafile_name = str(tmp_path / 'ModemData.json')
+    poll(datafile_name, POLLS, step=4 * 3600, storage='journal',
+         compact_every=10, retention_days=1)
+    everything = ModemStore.query(datafile_name)
+    assert ModemStore.archive_segments(datafile_name)
+    assert ModemImport.import_logs(datafile_name, [modem_log])[0] == 0
+    assert ModemStore.query(datafile_name) == everything
+
+
+def test_import_recovers_damaged_store(tmp_path, modem_log, monkeypatch):
+    monkeypatch.setattr(ModemCheck, 'modem_state', ModemCheck.ModemState())
+    datafile_name = str(tmp_path / 'ModemData.json')
+    poll(datafile_name, POLLS)
+    polled = ModemStore.query(datafile_name)
+    with open(datafile_name) as f:
+        text = f.read()
+    with open(datafile_name, 'w') as f:
+        f.write(text[:len(text) // 2])
+    with open(datafile_name + '.displaycache', 'w') as f:
+        f.write('{}')
+
+    ModemImport.import_logs(datafile_name, [modem_log])
+    assert ModemStore.query(datafile_name) == polled
+    assert (tmp_path / ('ModemData.json' + ModemImport.DAMAGED_SUFFIX)
+            ).exists()
+    assert not (tmp_path / 'ModemData.json.displaycache').exists()
+
+
+def test_import_one_modem_of_fleet(tmp_path, modem_log):
+    stores = {}
+    for seed, name in enumerate(('home', 'office')):
+        stores[name] = str(tmp_path / f'{name}.json')
+        poll(stores[name], POLLS, ModemCheck.ModemState(name), seed)
+    for name, datafile_name in stores.items():
+        rebuilt_name = str(tmp_path / f'{name}-rebuilt.json')
+        ModemImport.import_logs(rebuilt_name, [modem_log], name)
+        assert ModemStore.query(rebuilt_name) == ModemStore.query(
+            datafile_name)
+
+
+def test_log_age():
+    assert sorted(['ModemCheck.log', 'ModemCheck.log.1',
+                   'ModemCheck.log.10.gz', 'ModemCheck.log.2.gz'],
+                  key=ModemImport.log_age) == [
+        'ModemCheck.log.10.gz', 'ModemCheck.log.2.gz', 'ModemCheck.log.1',
+        'ModemCheck.log']
+    assert sorted(['ModemCheck.log', 'ModemCheck.log-20200902.gz',
+                   'ModemCheck.log-20200901.gz'],
+                  key=ModemImport.log_age) == [
+        'ModemCheck.log-20200901.gz', 'ModemCheck.log-20200902.gz',
+        'ModemCheck.log']
+
+
+def test_import_rotated_logs(tmp_path, modem_log, monkeypatch):
+    monkeypatch.setattr(ModemCheck, 'modem_state', ModemCheck.ModemState())
+    poll(str(tmp_path / 'ModemData.json'), POLLS)
+    whole_name = str(tmp_path / 'Whole.json')
+    (_, events) = ModemImport.import_logs(whole_name, [modem_log])
+    assert events
+
+    # rotate the log between an untimed message and its poll's time
+    with open(modem_log) as f:
+        lines = f.readlines()
+    split = next(number for number, line in enumerate(lines)
+                 if 'Negative errors' in line) + 1
+    with gzip.open(modem_log + '.1.gz', 'wt') as f:
+        f.writelines(lines[:split])
+    with open(modem_log, 'w') as f:
+        f.writelines(lines[split:])
+    rotated_name = str(tmp_path / 'Rotated.json')
+    # in the shell's glob order
+    logs = [modem_log, modem_log + '.1.gz']
+    assert ModemImport.import_logs(rotated_name, logs)[1] == events
+    with open(ModemImport.events_name(whole_name)) as whole, open(
+            ModemImport.events_name(rotated_name)) as rotated:
+        assert whole.read() == rotated.read()
+    assert ModemImport.import_logs(rotated_name, logs) == (0, 0)
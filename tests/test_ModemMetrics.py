@@ -0,0 +1,92 @@
+""" ModemMetrics pages, scraped over HTTP """
+import json
+import re
+import urllib.error
+import urllib.request
+import pytest
+import ModemMetrics
+
+SAMPLE = re.compile(r'^([a-z_]+)\{([a-z_]+="(?:[^"\\]|\\.)*"'
+                    r'(?:,[a-z_]+="(?:[^"\\]|\\.)*")*)\} (-?[0-9.e+-]+)$')
+FREQS = {
+    '477000000 Hz': {'Channel ID': 1, 'Power': 2.5, 'SNR': 40.1,
+                     'Correctable Err': 120, 'Uncorrectable Err': 3},
+    '483000000 Hz': {'Channel ID': 2, 'Power': -1.0, 'SNR': 38.9,
+                     'Correctable Err': 0, 'Uncorrectable Err': 0},
+}
+
+
+@pytest.fixture
+def server():
+    server = ModemMetrics.MetricsServer(0)
+    yield server
+    server.close()
+
+
+def scrape(server, path):
+    (host, port) = server.httpd.server_address[:2]
+    with urllib.request.urlopen(f'http://{host}:{port}{path}') as page:
+        return (page.headers['Content-Type'], page.read().decode())
+
+
+def parse(text):
+    """ {(name, labels): value} of the samples, checking each metric has
+        its HELP and TYPE first
+    """
+    samples = {}
+    described = {}
+    for line in text.splitlines():
+        if line.startswith('# '):
+            (_, keyword, name, rest) = line.split(' ', 3)
+            described.setdefault(name, {})[keyword] = rest
+            continue
+        match = SAMPLE.match(line)
+        assert match, line
+        (name, labels, value) = match.groups()
+        assert set(described[name]) == {'HELP', 'TYPE'}
+        if described[name]['TYPE'] == 'counter':
+            assert name.endswith('_total')
+        samples[(name, labels)] = float(value)
+    return samples
+
+
+def test_prometheus_text(server):
+    server.publish('home "1"', 1600000000, 1599000000, 1000000, FREQS,
+                   {'477000000 Hz': [20, 1]})
+    server.publish('home "1"', 1600000300, 1599000000, 1000300, FREQS,
+                   {'477000000 Hz': [5, 0]})
+    (content_type, text) = scrape(server, '/metrics')
+    assert content_type.startswith('text/plain; version=0.0.4')
+    samples = parse(text)
+    modem = 'modem="home \\"1\\""'
+    assert samples[('modem_up', modem)] == 1
+    assert samples[('modem_last_poll_time_seconds', modem)] == 1600000300
+    assert samples[('modem_channel_snr_db',
+                    modem + ',frequency_hz="477000000",channel="1"')] == 40.1
+    assert samples[('modem_recorded_correctable_errors_total',
+                    modem + ',frequency_hz="477000000"')] == 25
+    assert samples[('modem_recorded_uncorrectable_errors_total',
+                    modem + ',frequency_hz="477000000"')] == 1
+
+    server.unreachable('home "1"')
+    server.unreachable('office')
+    samples = parse(scrape(server, '/metrics')[1])
+    assert samples[('modem_up', modem)] == 0
+    assert samples[('modem_up', 'modem="office"')] == 0
+    # the last readings are kept
+    assert samples[('modem_uptime_seconds', modem)] == 1000300
+
+
+def test_json(server):
+    server.publish('home', 1600000000, 1599000000, 1000000, FREQS, {})
+    (content_type, text) = scrape(server, '/metrics.json')
+    assert content_type == 'application/json'
+    modem = json.loads(text)['modems']['home']
+    assert modem['up'] == 1
+    assert modem['freqs'] == FREQS
+
+
+def test_unknown_path(server):
+    with pytest.raises(urllib.error.HTTPError) as err:
+        scrape(server, '/other')
+    assert err.value.code == 404
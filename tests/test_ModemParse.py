@@ -0,0 +1,48 @@
+""" ModemParse against the captured pages in bench/pages """
+import os
+import pytest
+
+pytest.importorskip('pytimeparse')
+import ModemParse  # noqa: E402
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'bench', 'pages')
+
+
+def read_page(name):
+    with open(os.path.join(PAGES_DIR, name), 'rb') as f:
+        return f.read()
+
+
+# page: (downstream, locked downstream, upstream, OFDM, OFDMA, uptime)
+EXPECTED = {
+    'cm1150v-normal.htm': (32, 32, 8, 2, 2, 1047845),
+    'cm1150v-partial-lock.htm': (32, 24, 8, 2, 2, 250),
+    'cm1150v-no-ofdm.htm': (32, 32, 8, 0, 0, 134055),
+}
+
+
+@pytest.mark.parametrize('name', sorted(EXPECTED))
+def test_good_pages(name):
+    status = ModemParse.parse_status(read_page(name))
+    assert (len(status.downstream),
+            sum(chan.status == 'Locked' for chan in status.downstream),
+            len(status.upstream), len(status.ds_ofdm), len(status.us_ofdma),
+            status.uptime) == EXPECTED[name]
+    for chan in status.downstream:
+        if chan.status == 'Locked':
+            assert chan.frequency > 0
+            assert chan.correctable >= 0 and chan.uncorrectable >= 0
+
+
+def test_pages_in_corpus_are_covered():
+    pages = {name for name in os.listdir(PAGES_DIR) if name.endswith('.htm')}
+    assert {name for name in pages if not name.startswith('bad-')} == set(
+        EXPECTED)
+
+
+@pytest.mark.parametrize('name', sorted(
+    name for name in os.listdir(PAGES_DIR) if name.startswith('bad-')))
+def test_bad_pages_rejected(name):
+    with pytest.raises(ValueError):
+        ModemParse.parse_status(read_page(name))
@@ -0,0 +1,55 @@
+""" ModemReport builds, rebuilds only what changed, and keeps its index """
+import os
+import make_dataset
+import ModemReport
+import ModemStore
+
+END = 1600000000 - 1600000000 % ModemStore.DAY
+
+
+def read_pages(report_dir):
+    pages = {}
+    for modem in os.listdir(report_dir):
+        if os.path.isdir(os.path.join(report_dir, modem)):
+            for page in os.listdir(os.path.join(report_dir, modem)):
+                with open(os.path.join(report_dir, modem, page)) as f:
+                    pages[f'{modem}/{page}'] = f.read()
+    return pages
+
+
+def test_reports_since_and_periods(tmp_path):
+    datafile_name = str(tmp_path / 'ModemData.json')
+    make_dataset.write_dataset(datafile_name, 45, end=END)
+    report_dir = str(tmp_path / 'reports')
+    modems = [('home', datafile_name)]
+
+    drawn = ModemReport.build_reports(modems, report_dir, backend='svg',
+                                      workers=1)
+    pages = read_pages(report_dir)
+    assert drawn == len(pages)
+    assert sum(name.startswith('home/day-') for name in pages) == 45
+    assert {name for name in pages if name.startswith('home/month-')} == {
+        'home/month-2020-07.html', 'home/month-2020-08.html',
+        'home/month-2020-09.html'}
+
+    # nothing has changed, so nothing is redrawn, and the pages since
+    # started in are left whole
+    assert ModemReport.build_reports(
+        modems, report_dir, backend='svg', workers=1,
+        since=END - 2 * ModemStore.DAY) == 0
+    assert read_pages(report_dir) == pages
+
+    # new errors only redraw the windows they're in
+    ModemStore.append_journal(datafile_name, END + 60,
+                              {'477000000 Hz': [5, 1]})
+    assert ModemReport.build_reports(
+        modems, report_dir, backend='svg', workers=1,
+        since=END - 2 * ModemStore.DAY) == 3
+
+    # and the index keeps every period's pages after a day only run
+    ModemReport.build_reports(modems, report_dir, ['day'], backend='svg',
+                              workers=1)
+    with open(os.path.join(report_dir, 'index.html')) as f:
+        index = f.read()
+    for name in pages:
+        assert f'href="{name}"' in index
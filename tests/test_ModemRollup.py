@@ -0,0 +1,130 @@
+""" ModemRollup: buckets against the raw polls, seeding, and ModemDisplay
+    falling back to the raw data when the rollups don't cover a chart
+"""
+import random
+import make_dataset
+import ModemDisplay
+import ModemRollup
+import ModemStore
+
+END = 1600000000 - 1600000000 % ModemStore.DAY
+FREQS = [f'{477000000 + i * 6000000} Hz' for i in range(4)]
+
+
+def make_polls(count=2000, seed=1):
+    """ [(poll_time, freqs, new_data)] five minutes apart (about a week) """
+    rand = random.Random(seed)
+    polls = []
+    for poll in range(count):
+        freqs = {freq: {'SNR': round(rand.uniform(33, 41), 1),
+                        'Power': round(rand.uniform(-8, 8), 1)}
+                 for freq in FREQS}
+        new_data = {freq: (rand.randrange(100), rand.randrange(5))
+                    for freq in rand.sample(FREQS, rand.randrange(3))}
+        polls.append((END + 11 + poll * 300, freqs, new_data))
+    return polls
+
+
+def test_buckets_match_raw_polls(tmp_path):
+    datafile_name = str(tmp_path / 'ModemData.json')
+    polls = make_polls()
+    writer = ModemRollup.RollupWriter(datafile_name)
+    for poll in polls:
+        writer.add_poll(*poll)
+    for tier in ModemRollup.TIERS:
+        expected = {}
+        for poll_time, freqs, new_data in polls:
+            start = ModemRollup.bucket_start(tier, poll_time)
+            for freq, chan in freqs.items():
+                stats = expected.setdefault((start, freq), [
+                    0, 0, [], []])
+                stats[2].append(chan['SNR'])
+                stats[3].append(chan['Power'])
+            for freq, (correctable, uncorrectable) in new_data.items():
+                expected[start, freq][0] += correctable
+                expected[start, freq][1] += uncorrectable
+        found = {(start, freq): stats
+                 for start, buckets in ModemRollup.read_rollup(
+                     datafile_name, tier)
+                 for freq, stats in buckets.items()}
+        assert set(found) == set(expected)
+        for key, (correctable, uncorrectable, snrs,
+                  powers) in expected.items():
+            stats = found[key]
+            assert stats[ModemRollup.CORRECTABLE] == correctable
+            assert stats[ModemRollup.UNCORRECTABLE] == uncorrectable
+            assert stats[ModemRollup.SAMPLES] == len(snrs)
+            assert stats[ModemRollup.SNR_MIN] == min(snrs)
+            assert stats[ModemRollup.SNR_MAX] == max(snrs)
+            assert abs(stats[ModemRollup.SNR_SUM] - sum(snrs)) < 1e-6
+            assert stats[ModemRollup.POWER_MIN] == min(powers)
+            assert stats[ModemRollup.POWER_MAX] == max(powers)
+
+
+def raw_totals(datafile_name):
+    totals = [0, 0]
+    for _, data_points in ModemStore.iter_events(datafile_name):
+        for correctable, uncorrectable in data_points.values():
+            totals[0] += correctable
+            totals[1] += uncorrectable
+    return totals
+
+
+def rollup_totals(datafile_name, tier):
+    totals = [0, 0]
+    for _, buckets in ModemRollup.read_rollup(datafile_name, tier):
+        for stats in buckets.values():
+            totals[0] += stats[ModemRollup.CORRECTABLE]
+            totals[1] += stats[ModemRollup.UNCORRECTABLE]
+    return totals
+
+
+def test_seeded_from_store_and_archive(tmp_path):
+    datafile_name = str(tmp_path / 'ModemData.json')
+    make_dataset.write_dataset(datafile_name, 60, retention_days=20,
+                               end=END)
+    ModemRollup.RollupWriter(datafile_name, END)
+    for tier in ModemRollup.TIERS:
+        assert rollup_totals(datafile_name, tier) == raw_totals(
+            datafile_name)
+    first = next(ModemStore.iter_events(datafile_name))[0]
+    assert ModemRollup.first_bucket(datafile_name) == (
+        ModemRollup.bucket_start('week', first))
+
+
+def test_display_without_rollups_uses_raw_data(tmp_path):
+    datafile_name = str(tmp_path / 'ModemData.json')
+    make_dataset.write_dataset(datafile_name, 365, end=END)
+    since = END - 200 * ModemStore.DAY
+    assert ModemDisplay.rollup_tier(datafile_name, since, END, 800) == (
+        None, since)
+    assert ModemDisplay.rollup_tier(datafile_name, None, END, 800) == (
+        None, None)
+
+
+def test_display_with_late_rollups_uses_raw_data(tmp_path):
+    datafile_name = str(tmp_path / 'ModemData.json')
+    # rollups begun on an empty store, so nothing was seeded into them
+    writer = ModemRollup.RollupWriter(datafile_name)
+    make_dataset.write_dataset(datafile_name, 365, end=END)
+    writer.add_poll(END, {}, {FREQS[0]: (1, 1)})
+    since = END - 200 * ModemStore.DAY
+    assert ModemDisplay.rollup_tier(datafile_name, since, END, 800) == (
+        None, since)
+    # but the rollups cover the last day
+    (tier, _) = ModemDisplay.rollup_tier(datafile_name, END - 3600, END, 1)
+    assert tier is not None
+
+
+def test_display_with_seeded_rollups_uses_them(tmp_path):
+    datafile_name = str(tmp_path / 'ModemData.json')
+    make_dataset.write_dataset(datafile_name, 365, end=END)
+    ModemRollup.RollupWriter(datafile_name, END)
+    since = END - 200 * ModemStore.DAY
+    assert ModemDisplay.rollup_tier(datafile_name, since, END, 800) == (
+        'day', since)
+    outfile_name = str(tmp_path / 'chart.svg')
+    ModemDisplay.display_stats(datafile_name, outfile_name, since=since,
+                               until=END, width=800, backend='svg')
+    with open(outfile_name) as f:
+        assert f.read().count('<circle') > 100
@@ -0,0 +1,73 @@
+""" ModemSchedule's polling grid and switching between the normal and fast
+    intervals, and what ModemCheck counts as trouble
+"""
+import pytest
+import ModemSchedule
+
+
+class Clock:
+    """ Stands in for both time.time and time.monotonic """
+
+    def __init__(self, wall, mono):
+        self.wall = wall
+        self.mono = mono
+
+    def advance(self, seconds):
+        self.wall += seconds
+        self.mono += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock(1000.0, 50.0)
+    monkeypatch.setattr(ModemSchedule, 'time', lambda: clock.wall)
+    monkeypatch.setattr(ModemSchedule, 'monotonic', lambda: clock.mono)
+    return clock
+
+
+def test_polls_on_the_wall_clock_grid(clock):
+    schedule = ModemSchedule.PollSchedule(300)
+    assert schedule.delay() == pytest.approx(200)   # at 1200
+    clock.advance(200 + 7)      # the poll took 7 seconds
+    assert schedule.delay() == pytest.approx(293)   # still at 1500
+    clock.advance(293 + 400)    # a poll that ran past a grid point
+    assert clock.wall + schedule.delay() == pytest.approx(2100)
+
+
+def test_fast_while_in_trouble_then_calms_down(clock):
+    schedule = ModemSchedule.PollSchedule(300, 15, calm_after=60)
+    schedule.record(False)
+    assert schedule.current_interval() == 300
+    schedule.record(True)
+    assert schedule.current_interval() == 15
+    assert (clock.wall + schedule.delay()) % 15 == pytest.approx(0)
+    for _ in range(3):
+        clock.advance(15)
+        schedule.record(False)
+        assert schedule.current_interval() == 15
+    clock.advance(15)
+    schedule.record(False)
+    assert schedule.current_interval() == 300
+    clock.advance(300)
+    schedule.record(False)
+    assert schedule.current_interval() == 300
+
+
+def test_no_fast_interval_never_speeds_up(clock):
+    schedule = ModemSchedule.PollSchedule(300)
+    schedule.record(True)
+    assert schedule.current_interval() == 300
+
+
+@pytest.mark.parametrize('page', ['cm1150v-normal.htm',
+                                  'cm1150v-partial-lock.htm'])
+def test_unlocked_channels_are_not_trouble(tmp_path, page_session, page):
+    pytest.importorskip('requests')
+    pytest.importorskip('pytimeparse')
+    import ModemCheck
+
+    state = ModemCheck.ModemState()
+    state.session = page_session(page)
+    ModemCheck.fetch_stats('password', datafile_name=str(
+        tmp_path / 'ModemData.json'), state=state)
+    assert not state.trouble
@@ -0,0 +1,55 @@
+""" ModemSession against bench/fake_modem.py """
+import logging
+import pytest
+
+pytest.importorskip('requests')
+pytest.importorskip('pytimeparse')
+import fake_modem  # noqa: E402
+import ModemCheck  # noqa: E402
+import ModemSession  # noqa: E402
+
+
+@pytest.fixture
+def modem():
+    modem = fake_modem.FakeModem()
+    yield modem
+    modem.close()
+
+
+def test_relogin_after_401(modem, caplog):
+    caplog.set_level(logging.INFO, logger='ModemSession')
+    session = ModemSession.ModemSession('password', url=modem.url,
+                                        retries=0)
+    try:
+        assert b'dsTable' in session.fetch()
+        assert session.logged_in
+        # the modem forgets the session (as on a reboot) and answers 401
+        session.session.cookies.clear()
+        assert b'dsTable' in session.fetch()
+        assert 'Modem rejected session' in caplog.text
+        assert session.retry_count == 0
+        assert session.status == 'ok'
+    finally:
+        session.close()
+
+
+def test_wrong_password_unreachable(modem):
+    session = ModemSession.ModemSession('wrong', url=modem.url, retries=1,
+                                        backoff=0.01)
+    try:
+        with pytest.raises(ModemSession.ModemUnreachable):
+            session.fetch()
+        assert session.status == 'unreachable'
+    finally:
+        session.close()
+
+
+def test_login_page_logs_out(tmp_path, page_session):
+    state = ModemCheck.ModemState()
+    state.session = page_session('bad-login.htm')
+    state.session.logged_in = True
+    with pytest.raises(ValueError):
+        ModemCheck.fetch_stats('password', state=state,
+                               datafile_name=str(tmp_path / 'Data.json'))
+    # so the next poll logs in again
+    assert not state.session.logged_in
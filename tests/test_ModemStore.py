@@ -0,0 +1,159 @@
+""" ModemStore: json and journal storage, retention and queries """
+import random
+import pytest
+import ModemStore
+
+START = 1600000000 - 1600000000 % ModemStore.DAY
+FREQS = [f'{477000000 + i * 6000000} Hz' for i in range(8)]
+
+
+def make_events(count=600, seed=1):
+    """ [(event_time, new_data)] of count polls with errors, a few an hour
+        (so about a week of them)
+    """
+    rand = random.Random(seed)
+    events = []
+    event_time = START + 17
+    for _ in range(count):
+        event_time += rand.randrange(300, 3600, 300)
+        events.append((event_time, {
+            freq: [rand.randrange(500), rand.randrange(20)]
+            for freq in rand.sample(FREQS, rand.randrange(1, 4))}))
+    return events
+
+
+def write_store(datafile_name, events, storage, compact_every=50,
+                retention_days=None):
+    """ Save events like ModemCheck.fetch_stats would, poll by poll """
+    prev_run = {'477000000 Hz': {'Correctable Err': 1}}
+    running_data = {}
+    records = 0
+    next_rollover = 0
+    for poll, (event_time, new_data) in enumerate(events):
+        running_data[event_time] = new_data
+        if retention_days and event_time >= next_rollover:
+            next_rollover = (event_time - event_time % ModemStore.DAY +
+                             ModemStore.DAY)
+            if ModemStore.roll_over(datafile_name, running_data,
+                                    event_time -
+                                    retention_days * ModemStore.DAY):
+                records = compact_every
+        if storage == 'journal':
+            ModemStore.append_journal(datafile_name, event_time, new_data)
+            records += 1
+            if records >= compact_every:
+                ModemStore.compact_store(datafile_name, prev_run,
+                                         running_data, poll, event_time)
+                records = 0
+            else:
+                ModemStore.save_checkpoint(datafile_name, prev_run, poll,
+                                           event_time)
+        else:
+            ModemStore.save_store(datafile_name, prev_run, running_data,
+                                  poll, event_time)
+    return running_data
+
+
+def naive(events, since=None, until=None, freqs=None):
+    """ What query should give, the slow way """
+    result = {}
+    for event_time, new_data in events:
+        if since is not None and event_time < since:
+            continue
+        if until is not None and event_time > until:
+            continue
+        data_points = {freq: counts for freq, counts in new_data.items()
+                       if freqs is None or freq in freqs}
+        if data_points:
+            result[event_time] = data_points
+    return result
+
+
+def test_json_and_journal_load_the_same(tmp_path):
+    events = make_events()
+    as_json = str(tmp_path / 'json.json')
+    as_journal = str(tmp_path / 'journal.json')
+    write_store(as_json, events, 'json')
+    write_store(as_journal, events, 'journal')
+    assert ModemStore.count_journal(as_journal) == len(events) % 50
+    json_store = ModemStore.load_store(as_json)
+    journal_store = ModemStore.load_store(as_journal)
+    assert json_store == journal_store
+    assert json_store[1] == {str(event_time): new_data
+                             for event_time, new_data in events}
+    assert json_store[2:] == (len(events) - 1, events[-1][0])
+
+
+def test_load_store_missing(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        ModemStore.load_store(str(tmp_path / 'nothing.json'))
+
+
+def test_torn_journal_record_skipped(tmp_path):
+    events = make_events(10)
+    datafile_name = str(tmp_path / 'torn.json')
+    write_store(datafile_name, events, 'journal')
+    with open(ModemStore.journal_name(datafile_name), 'a') as f:
+        f.write('[1600999999,{"477000')
+    assert ModemStore.load_store(datafile_name)[1] == {
+        str(event_time): new_data for event_time, new_data in events}
+    # and the next record starts on a line of its own
+    ModemStore.append_journal(datafile_name, 1601000000,
+                              {FREQS[0]: [1, 2]})
+    assert ModemStore.load_store(datafile_name)[1]['1601000000'] == {
+        FREQS[0]: [1, 2]}
+
+
+def test_roll_over_archives_whole_days(tmp_path):
+    events = make_events()
+    datafile_name = str(tmp_path / 'retained.json')
+    running_data = write_store(datafile_name, events, 'journal',
+                               retention_days=2)
+    last_day = events[-1][0] - events[-1][0] % ModemStore.DAY
+    cutoff = last_day - 2 * ModemStore.DAY
+    live = ModemStore.load_store(datafile_name)[1]
+    archived = ModemStore.load_archive(datafile_name)
+    # every event is in exactly one of them, split at a day boundary
+    assert set(live) == {str(event_time) for event_time in running_data}
+    assert not set(live) & set(archived)
+    assert len(live) + len(archived) == len(events)
+    assert all(int(event_time) < cutoff for event_time in archived)
+    assert all(int(event_time) >= cutoff - ModemStore.DAY
+               for event_time in live)
+    segments = ModemStore.archive_segments(datafile_name)
+    assert len(segments) == (cutoff - START) // ModemStore.DAY
+    # rolling the same days over again (a crash before the store was
+    # saved) leaves the segments as they were
+    again = {str(event_time): new_data for event_time, new_data in events
+             if event_time < cutoff}
+    assert ModemStore.roll_over(datafile_name, again, cutoff) == len(archived)
+    assert not again
+    assert ModemStore.load_archive(datafile_name) == archived
+
+
+@pytest.mark.parametrize('storage', ['json', 'journal'])
+@pytest.mark.parametrize('retention_days', [None, 2])
+def test_query_and_iter_events_match_naive(tmp_path, storage,
+                                           retention_days):
+    events = make_events()
+    datafile_name = str(tmp_path / 'query.json')
+    write_store(datafile_name, events, storage,
+                retention_days=retention_days)
+    rand = random.Random(2)
+    first, last = events[0][0], events[-1][0]
+    windows = [(None, None, None), (first, last, None),
+               (last + 1, None, None), (None, first - 1, None),
+               (events[10][0], events[10][0], None)]
+    for _ in range(40):
+        (since, until) = sorted(rand.randint(first - 3600, last + 3600)
+                                for _ in range(2))
+        freqs = set(rand.sample(FREQS, 2)) if rand.random() < 0.5 else None
+        windows.append((since, until, freqs))
+        windows.append((since, None, freqs))
+    for since, until, freqs in windows:
+        expected = naive(events, since, until, freqs)
+        found = ModemStore.query(datafile_name, since, until, freqs)
+        assert found == expected
+        assert list(found) == sorted(found)
+        assert list(ModemStore.iter_events(
+            datafile_name, since, until, freqs)) == list(expected.items())
@@ -0,0 +1,23 @@
+""" ModemSvg's charts """
+import math
+import re
+import ModemSvg
+
+
+def chart_titles(counts):
+    traces = {'Correctable': [
+        [f'2020-09-01T00:{minute:02d}:00Z' for minute in range(len(counts))],
+        [477000000 + 6000000 * i for i in range(len(counts))],
+        [math.sqrt(count) for count in counts],
+        [''] * len(counts)]}
+    return re.findall(r'<title>([^<]*)</title></circle>',
+                      ModemSvg.error_chart(traces))
+
+
+def test_tooltips_raw_counts():
+    assert sorted(chart_titles([3, 120, 7])) == ['120', '3', '7']
+
+
+def test_tooltips_normalized():
+    # display_merged -N share makes each a fraction of the errors
+    assert sorted(chart_titles([0.25, 0.7, 0.05])) == ['0.05', '0.25', '0.7']
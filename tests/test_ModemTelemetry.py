@@ -0,0 +1,69 @@
+""" ModemTelemetry records round trip """
+import os
+import pytest
+
+pytest.importorskip('pytimeparse')
+import ModemParse  # noqa: E402
+import ModemTelemetry  # noqa: E402
+from conftest import PAGES_DIR  # noqa: E402
+
+
+def downstream(name):
+    with open(os.path.join(PAGES_DIR, name), 'rb') as f:
+        return ModemParse.parse_status(f.read()).downstream
+
+
+def test_round_trip(tmp_path):
+    datafile_name = str(tmp_path / 'ModemData.json')
+    polls = {1600000000 + 300 * i: downstream(name)
+             for i, name in enumerate(('cm1150v-normal.htm',
+                                       'cm1150v-partial-lock.htm',
+                                       'cm1150v-no-ofdm.htm'))}
+    writer = ModemTelemetry.TelemetryWriter(datafile_name)
+    for poll_time, channels in polls.items():
+        writer.append(poll_time, channels)
+    writer.close()
+
+    freqs = ModemTelemetry.load_freqs(datafile_name)
+    records = list(ModemTelemetry.iter_telemetry(datafile_name))
+    # unlocked channels are left out
+    written = [(poll_time, chan) for poll_time, channels in polls.items()
+               for chan in channels if chan.status == 'Locked']
+    assert len(records) == len(written)
+    for record, (poll_time, chan) in zip(records, written):
+        assert (record[0], freqs[record[1]], record[2], record[5],
+                record[6]) == (poll_time, chan.frequency, chan.channel_id,
+                               chan.correctable, chan.uncorrectable)
+        assert record[3] == pytest.approx(chan.power, abs=1e-4)
+        assert record[4] == pytest.approx(chan.snr, abs=1e-4)
+
+    # a time range is just those polls
+    middle = sorted(polls)[1]
+    assert {record[0] for record in ModemTelemetry.iter_telemetry(
+        datafile_name, middle, middle)} == {middle}
+
+
+def test_partial_record_dropped(tmp_path):
+    datafile_name = str(tmp_path / 'ModemData.json')
+    writer = ModemTelemetry.TelemetryWriter(datafile_name)
+    writer.append(1600000000, downstream('cm1150v-normal.htm'))
+    writer.close()
+    with open(ModemTelemetry.telemetry_name(datafile_name), 'ab') as f:
+        f.write(b'\0' * (ModemTelemetry.RECORD.size // 2))
+    ModemTelemetry.TelemetryWriter(datafile_name).close()
+    assert len(list(ModemTelemetry.iter_telemetry(datafile_name))) == 32
+
+
+def test_numpy_matches(tmp_path):
+    np = pytest.importorskip('numpy')
+    datafile_name = str(tmp_path / 'ModemData.json')
+    writer = ModemTelemetry.TelemetryWriter(datafile_name)
+    for i in range(3):
+        writer.append(1600000000 + 300 * i,
+                      downstream('cm1150v-partial-lock.htm'))
+    writer.close()
+    records = ModemTelemetry.read_telemetry(datafile_name, 1600000300)
+    assert records.tolist() == list(ModemTelemetry.iter_telemetry(
+        datafile_name, 1600000300))
+    assert np.all(records['time'] >= 1600000300)
+    assert len(records) == 2 * 24
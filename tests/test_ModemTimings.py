@@ -0,0 +1,44 @@
+""" ModemTimings histograms and the stats file """
+import json
+import pytest
+import ModemTimings
+
+
+def test_histogram():
+    histogram = ModemTimings.Histogram(ModemTimings.COUNT_BUCKETS)
+    for value in (0, 1, 1, 3, 50, 7000000):
+        histogram.observe(value)
+    assert dict(histogram.cumulative()) == {
+        0: 1, 1: 3, 2: 3, 5: 4, 10: 4, 100: 5, 1000: 5, 10000: 5, 100000: 5,
+        1000000: 5, ModemTimings.INF: 6}
+    assert histogram.summary() == {'count': 6, 'sum': 7000055, 'p50': 3,
+                                   'p95': 7000000, 'max': 7000000}
+
+
+def test_fetch_stats_timed(tmp_path, page_session):
+    pytest.importorskip('pytimeparse')
+    import ModemCheck
+
+    stats_name = str(tmp_path / 'stats.jsonl')
+    timings = ModemTimings.Timings(stats_name)
+    state = ModemCheck.ModemState()
+    state.session = page_session('cm1150v-normal.htm')
+    for _ in range(2):
+        ModemCheck.fetch_stats('password', state=state, timings=timings,
+                               datafile_name=str(tmp_path / 'Data.json'))
+
+    with open(stats_name) as f:
+        records = [json.loads(line) for line in f]
+    assert len(records) == 2
+    for record in records:
+        assert record['op'] == 'fetch_stats'
+        assert {'fetch', 'parse'} <= set(record['seconds'])
+        assert record['counts']['bytes_fetched'] == len(state.session.page)
+
+    summary = timings.summary()['fetch_stats']['modem']
+    assert summary['seconds']['parse']['count'] == 2
+    lines = timings.prometheus()
+    assert ('modem_run_count_count{op="fetch_stats",modem="modem",'
+            'count="bytes_fetched"} 2') in lines
+    assert ('modem_phase_seconds_bucket{op="fetch_stats",modem="modem",'
+            'phase="parse",le="+Inf"} 2') in lines
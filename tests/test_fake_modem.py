@@ -0,0 +1,14 @@
+""" The bench's simulated modem """
+import fake_modem
+
+
+def test_churn_keeps_channels_apart():
+    modem = fake_modem.SimModem(channels=8, seed=1, churn_chance=0.5)
+    moved = 0
+    for _ in range(200):
+        freqs = [chan['freq'] for chan in modem.channels]
+        modem.advance()
+        moved += sum(chan['freq'] != freq
+                     for chan, freq in zip(modem.channels, freqs))
+        assert len({chan['freq'] for chan in modem.channels}) == 8
+    assert moved